@@ -0,0 +1,122 @@
+import hashlib
+import threading
+
+from telebot import TeleBot
+from telebot.apihelper import ApiTelegramException
+
+import db
+from outbox import retry_after
+
+# Админ-панель как одно сообщение, которое редактируется на месте. Для каждого чата запоминаются id сообщения
+# панели, открытая страница, отрисованный текст с клавиатурой и версия данных, по которой он построен.
+# Версию (counters.admin_view) поднимают триггеры на изменения пользователей и очереди заявок (миграция 4):
+# пока она не изменилась, панель не перерисовывается, а если текст и клавиатура совпали с уже показанными,
+# не отправляется и правка. refresh() после действий админа откладывается на DEBOUNCE секунд,
+# так что серия подтверждений даёт одну перерисовку
+
+DEBOUNCE = 0.5
+NOT_MODIFIED = 'message is not modified'
+
+
+class View:
+    __slots__ = ('message_id', 'page', 'version', 'content', 'fingerprint', 'timer')
+
+    def __init__(self):
+        self.message_id = None
+        self.page = (0, 0, None)
+        self.version = None
+        self.content = None
+        self.fingerprint = None
+        self.timer = None
+
+
+def data_version():
+    return db.fetchone("SELECT value FROM counters WHERE name = 'admin_view'")[0]
+
+
+class AdminView:
+    def __init__(self, bot, outbox, render, debounce=DEBOUNCE):
+        self.bot = bot
+        self.outbox = outbox
+        self.render = render  # render(users_after, queue_after, users_before) -> (текст, клавиатура)
+        self.debounce = debounce
+        self.views = {}
+        self.lock = threading.Lock()
+        self.renders = 0
+        self.edits = 0
+        self.skipped = 0
+
+    def _view(self, chat_id):
+        view = self.views.get(chat_id)
+        if view is None:
+            view = self.views[chat_id] = View()
+        return view
+
+    def open(self, chat_id, users_after=0, queue_after=0, users_before=None, message_id=None):
+        # Переход на страницу; message_id — сообщение с нажатой кнопкой, панель займёт его место
+        with self.lock:
+            view = self._view(chat_id)
+            view.page = (users_after, queue_after, users_before)
+            if message_id is not None and message_id != view.message_id:
+                view.message_id = message_id
+                view.fingerprint = None
+        return self.outbox.submit(chat_id, self.show, chat_id, key='admin_panel')
+
+    def refresh(self, chat_id):
+        with self.lock:
+            view = self._view(chat_id)
+            if view.timer is not None:
+                return
+            view.timer = threading.Timer(self.debounce, self._flush, (chat_id,))
+            view.timer.daemon = True
+            view.timer.start()
+
+    def refresh_shown(self, chat_id):
+        # refresh только для уже показанной панели: фоновые задачи (просрочка заявок) не присылают новую
+        with self.lock:
+            view = self.views.get(chat_id)
+            if view is None or view.message_id is None:
+                return
+        self.refresh(chat_id)
+
+    def _flush(self, chat_id):
+        with self.lock:
+            self.views[chat_id].timer = None
+        self.outbox.submit(chat_id, self.show, chat_id, key='admin_panel')
+
+    def show(self, chat_id):
+        # Выполняется в потоке outbox; задания одного чата идут по очереди
+        version = data_version()
+        with self.lock:
+            view = self._view(chat_id)
+            page, message_id, content = view.page, view.message_id, view.content
+            stale = content is None or view.version != version or content[0] != page
+        if stale:
+            text, keyboard = self.render(*page)
+            content = (page, text, keyboard, hashlib.sha1((text + keyboard.to_json()).encode()).digest())
+            self.renders += 1
+        fingerprint = content[3]
+        with self.lock:
+            view.version, view.content = version, content
+            if message_id is not None and view.fingerprint == fingerprint:
+                self.skipped += 1
+                return None
+        _, text, keyboard, _ = content
+        message = None
+        if message_id is not None:
+            try:
+                message = TeleBot.edit_message_text(self.bot, text, chat_id=chat_id, message_id=message_id,
+                                                    reply_markup=keyboard)
+                self.edits += 1
+            except ApiTelegramException as e:
+                if retry_after(e) is not None:
+                    raise  # 429: очередь повторит отправку сама
+                if NOT_MODIFIED not in e.description:
+                    message_id = None
+        if message_id is None:
+            # Сообщения панели ещё нет или его нельзя изменить — отправляем новое
+            message = TeleBot.send_message(self.bot, chat_id, text, reply_markup=keyboard)
+            message_id = message.message_id
+        with self.lock:
+            view.message_id, view.fingerprint = message_id, fingerprint
+        return message
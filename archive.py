@@ -0,0 +1,124 @@
+import hashlib
+import logging
+import mmap
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from telebot import TeleBot, apihelper
+from telebot.apihelper import ApiHTTPException
+
+import db
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Архив скриншотов по заявкам: файл лежит в ARCHIVE_DIR под своим sha256 (screenshots/ab/abcdef...),
+# одинаковое содержимое хранится один раз, а request_screenshots связывает его с заявками.
+# Файл скачивается кусками по CHUNK байт сразу на диск с подсчётом хеша и появляется под своим именем
+# только после fsync, поэтому строка в базе всегда указывает на целый файл. Скачивание идёт в фоне,
+# одновременно не больше MAX_DOWNLOADS файлов — память на загрузки ограничена MAX_DOWNLOADS * CHUNK.
+# Повторная отправка (например, доказательства по спорной покупке) читает файл через mmap
+
+ARCHIVE_DIR = 'screenshots'
+CHUNK = 64 * 1024
+MAX_DOWNLOADS = 4
+DOWNLOAD_TIMEOUT = 60
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def path(digest):
+    return os.path.join(ARCHIVE_DIR, digest[:2], digest)
+
+
+def store(bot, file_id):
+    # Скачивает файл Telegram в архив; возвращает (sha256, размер)
+    file_info = bot.get_file(file_id)
+    url = (apihelper.FILE_URL or "https://api.telegram.org/file/bot{0}/{1}").format(bot.token, file_info.file_path)
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    fd, part = tempfile.mkstemp(dir=ARCHIVE_DIR, suffix='.part')
+    try:
+        sha256, size = hashlib.sha256(), 0
+        with metrics.API_SECONDS.time('downloadFile'), os.fdopen(fd, 'wb') as out, \
+                apihelper._get_req_session().get(url, stream=True, timeout=DOWNLOAD_TIMEOUT,
+                                                 proxies=apihelper.proxy) as response:
+            if response.status_code != 200:
+                raise ApiHTTPException('Download file', response)
+            for chunk in response.iter_content(CHUNK):
+                sha256.update(chunk)
+                out.write(chunk)
+                size += len(chunk)
+            out.flush()
+            os.fsync(out.fileno())
+        digest = sha256.hexdigest()
+        target = path(digest)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        if os.path.exists(target):
+            os.remove(part)  # такой файл уже есть
+        else:
+            os.replace(part, target)
+    except BaseException:
+        if os.path.exists(part):
+            os.remove(part)
+        raise
+    return digest, size
+
+
+def seen(file_unique_id):
+    # Был ли этот файл Telegram уже в архиве (в любом процессе)
+    return db.fetchone("SELECT 1 FROM request_screenshots WHERE file_unique_id = ? LIMIT 1",
+                       (file_unique_id,)) is not None
+
+
+def archive(bot, photo, request_id, kind):
+    # Сохраняет фото (PhotoSize) и привязывает к заявке; тот же файл Telegram повторно не скачивается
+    row = db.fetchone("SELECT sha256 FROM request_screenshots WHERE file_unique_id = ? LIMIT 1",
+                      (photo.file_unique_id,))
+    if row is not None:
+        digest = row[0]
+    else:
+        digest, size = store(bot, photo.file_id)
+        db.execute("INSERT OR IGNORE INTO screenshots (sha256, size, created_at) VALUES (?, ?, ?)",
+                   (digest, size, time.time()))
+    db.execute("INSERT OR IGNORE INTO request_screenshots (request_id, sha256, kind, file_unique_id, created_at) "
+               "VALUES (?, ?, ?, ?, ?)", (request_id, digest, kind, photo.file_unique_id, time.time()))
+    return digest
+
+
+def _archive_logged(bot, photo, request_id, kind):
+    try:
+        return archive(bot, photo, request_id, kind)
+    except Exception:
+        metrics.ERRORS.inc('archive')
+        logger.exception("Не удалось сохранить скриншот заявки %s", request_id)
+
+
+def archive_async(bot, photo, request_id, kind):
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(MAX_DOWNLOADS, thread_name_prefix='archive')
+    return _executor.submit(_archive_logged, bot, photo, request_id, kind)
+
+
+def screenshots(request_id):
+    # [(sha256, вид)] скриншотов заявки в порядке поступления
+    return db.fetchall("SELECT sha256, kind FROM request_screenshots WHERE request_id = ? ORDER BY created_at",
+                       (request_id,))
+
+
+@contextmanager
+def open_screenshot(digest):
+    with open(path(digest), 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        yield data
+
+
+def send(bot, chat_id, digest, caption=None):
+    # Отправляет файл из архива заново (в обход file_id), вызывать в потоке очереди отправки
+    with open_screenshot(digest) as data:
+        return TeleBot.send_photo(bot, chat_id, data, caption=caption)
@@ -0,0 +1,70 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import aiosqlite
+
+import db
+
+# Асинхронный вариант db.py: одно соединение aiosqlite на процесс.
+# Все запросы идут через замок, иначе одиночный запрос одной корутины
+# мог бы попасть внутрь чужой открытой транзакции на том же соединении
+
+_conn = None
+_lock = asyncio.Lock()
+# Первые запросы пачки апдейтов приходят одновременно: соединение открывает одна корутина,
+# остальные ждут его, а не открывают каждая своё (их PRAGMA упирались бы друг в друга до busy_timeout)
+_connect_lock = asyncio.Lock()
+
+
+async def get_connection():
+    global _conn
+    if _conn is None:
+        async with _connect_lock:
+            if _conn is None:
+                conn = await aiosqlite.connect(db.DB_PATH, isolation_level=None, cached_statements=db.STATEMENT_CACHE_SIZE)
+                for pragma in db.PRAGMAS:
+                    await conn.execute(pragma)
+                _conn = conn
+    return _conn
+
+
+async def close_connection():
+    global _conn
+    if _conn is not None:
+        await _conn.close()
+        _conn = None
+
+
+async def execute(sql, params=()):
+    conn = await get_connection()
+    async with _lock:
+        cursor = await conn.execute(sql, params)
+        await cursor.close()
+        return cursor
+
+
+async def fetchone(sql, params=()):
+    conn = await get_connection()
+    async with _lock:
+        async with conn.execute(sql, params) as cursor:
+            return await cursor.fetchone()
+
+
+async def fetchall(sql, params=()):
+    conn = await get_connection()
+    async with _lock:
+        async with conn.execute(sql, params) as cursor:
+            return await cursor.fetchall()
+
+
+@asynccontextmanager
+async def transaction():
+    conn = await get_connection()
+    async with _lock:
+        await conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            await conn.execute("ROLLBACK")
+            raise
+        await conn.execute("COMMIT")
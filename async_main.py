@@ -0,0 +1,578 @@
+import asyncio
+import sys
+import weakref
+
+from telebot.async_telebot import AsyncTeleBot
+from telebot.types import InlineKeyboardMarkup, InlineKeyboardButton
+
+import async_db
+import dispatch
+import ledger
+import media
+import money
+import schema
+import states
+
+try:
+    import cnf
+except ImportError:  # Как в main.py: без cnf.py модуль импортируется, для запуска нужен токен
+    cnf = None
+
+# Асинхронный вариант main.py: те же сценарии, но все разговоры живут в одном event loop
+TOKEN = getattr(cnf, 'token', '')
+bot = AsyncTeleBot(TOKEN, validate_token=bool(TOKEN))
+ADMIN_ID = 6336204836
+
+# AsyncTeleBot не умеет register_next_step_handler. Следующий шаг, как в main.py, хранится в conversation_state
+# через states.py (в пуле потоков, как run_ledger): переживает перезапуск, брошенные диалоги удаляются по TTL.
+# Функции шагов — в своём реестре STEPS, их имена совпадают с шагами main.py
+STEPS = {}
+# AsyncTeleBot обрабатывает пачку апдейтов параллельно и сообщения раньше кнопок,
+# поэтому апдейты одного пользователя прогоняем по одному под его замком
+_user_locks = weakref.WeakValueDictionary()
+
+
+def step(func):
+    STEPS[func.__name__] = func
+    return func
+
+
+async def register_next_step_handler(message, callback, *args):
+    await asyncio.to_thread(states.set_step, message.chat.id, callback, *args)
+
+
+async def sweep_steps():
+    # Как задача steps в maintenance.py
+    while True:
+        await asyncio.sleep(states.SWEEP_INTERVAL)
+        await asyncio.to_thread(states.sweep)
+
+
+def user_lock(user_id):
+    lock = _user_locks.get(user_id)
+    if lock is None:
+        lock = _user_locks[user_id] = asyncio.Lock()
+    return lock
+
+
+async def _process_user_updates(user_id, updates):
+    async with user_lock(user_id):
+        for update in updates:
+            await AsyncTeleBot.process_new_updates(bot, [update])
+
+
+async def process_new_updates(updates):
+    by_user = {}
+    for update in updates:
+        by_user.setdefault(dispatch.update_user_id(update), []).append(update)
+    await asyncio.gather(*(_process_user_updates(user_id, items) for user_id, items in by_user.items()))
+
+
+bot.process_new_updates = process_new_updates
+
+
+async def get_or_register_user(user_id, user_name):
+    user = await async_db.fetchone("SELECT * FROM users WHERE id=?", (user_id,))
+    if user is None:
+        await async_db.execute("INSERT OR IGNORE INTO users (id, name, balance, gold) VALUES (?, ?, ?, ?)",
+                               (user_id, user_name, 0, 0))
+        user = (user_id, user_name, 0, 0)
+    return user
+
+
+async def run_ledger(operation, *args, **kwargs):
+    # Изменения баланса и голды — те же функции ledger.py, что и в main.py (SQL, проводки, сброс кеша users):
+    # они выполняются в пуле потоков со своими соединениями db.py и не блокируют event loop
+    return await asyncio.to_thread(operation, *args, **kwargs)
+
+
+async def create_request(user_id, request_type, amount, details='', sale_amount=None):
+    cursor = await async_db.execute(ledger.INSERT_REQUEST, (user_id, request_type, amount, details, sale_amount, None, None))
+    return cursor.lastrowid
+
+
+async def get_request(request_id):
+    # (user_id, request_type, amount, sale_amount, phone, payout) по первичному ключу
+    return await async_db.fetchone("SELECT user_id, request_type, amount, sale_amount, phone, payout FROM requests WHERE id = ?",
+                                   (request_id,))
+
+
+def callback_request_id(data, prefix):
+    # Новые кнопки несут только id заявки, старые — «prefix_пользователь_заявка[_сумма]»
+    values = data[len(prefix):].split('_')
+    return int(values[1] if len(values) > 1 else values[0])
+
+
+async def skin_sale_request(call, request_id):
+    # Как в main.py: кнопки «Купил скин» и «Отменить вывод» по заявке на продажу голды
+    # может нажать её владелец или админ, остальные нажатия игнорируются
+    request = await get_request(request_id)
+    if request is None or request[1] != 'sell_gold' or call.from_user.id not in (request[0], ADMIN_ID):
+        return None
+    return request
+
+
+async def main_menu(chat_id, is_admin=False):
+    keyboard = InlineKeyboardMarkup()
+    keyboard.row(InlineKeyboardButton("Продать голду 💰", callback_data='sell'))
+    keyboard.row(InlineKeyboardButton("Купить голду 🛒", callback_data='buy'))
+    keyboard.row(InlineKeyboardButton("Профиль 👤", callback_data='profile'))
+    if is_admin:
+        keyboard.row(InlineKeyboardButton("Админ панель ⚙️", callback_data='admin_panel'))
+
+    await bot.send_message(chat_id, "Выберите действие:", reply_markup=keyboard)
+
+
+def back_to_main_menu():
+    return InlineKeyboardButton("В главное меню 🔙", callback_data='back')
+
+
+USERS_PER_PAGE = 10
+QUEUE_PER_PAGE = 10  # Сколько заявок (пополнения и продажи вместе) показывается на одной странице
+
+
+async def admin_panel(chat_id, users_after=0, queue_after=0, users_before=None):
+    # Постраничный вывод по ключу, как в main.render_admin_panel: курсоры пользователей и очереди заявок
+    # передаются в callback_data кнопок
+    if users_before is None:
+        users_list = await async_db.fetchall("SELECT id, name, balance, gold FROM users WHERE id > ? ORDER BY id LIMIT ?",
+                                             (users_after, USERS_PER_PAGE + 1))
+        has_next = len(users_list) > USERS_PER_PAGE
+        users_list = users_list[:USERS_PER_PAGE]
+        has_prev = bool(users_list) and await async_db.fetchone("SELECT 1 FROM users WHERE id < ? LIMIT 1",
+                                                                (users_list[0][0],)) is not None
+    else:
+        users_list = await async_db.fetchall("SELECT id, name, balance, gold FROM users WHERE id < ? ORDER BY id DESC LIMIT ?",
+                                             (users_before, USERS_PER_PAGE + 1))
+        has_prev = len(users_list) > USERS_PER_PAGE
+        users_list = users_list[:USERS_PER_PAGE][::-1]
+        has_next = True
+    if users_list:
+        users_after = users_list[0][0] - 1
+    user_text = "\n".join(
+        [f"ID: {user[0]}, Ник: @{user[1]}, Баланс: {money.rub(user[2])}, Голда: {user[3]}" for user in users_list])
+    total_users = (await async_db.fetchone("SELECT value FROM counters WHERE name = 'users'"))[0]
+
+    keyboard = InlineKeyboardMarkup()
+    if has_prev:
+        keyboard.row(InlineKeyboardButton("Предыдущие 10 👈", callback_data=f'prev_{users_list[0][0]}_{queue_after}'))
+    if has_next and users_list:
+        keyboard.row(InlineKeyboardButton("Следующие 10 👉", callback_data=f'next_{users_list[-1][0]}_{queue_after}'))
+    keyboard.row(InlineKeyboardButton("Изменить баланс/голду 🔧", callback_data='change_balance_gold'))
+
+    # Заявки на пополнение и продажу голды одной очередью по id, не больше QUEUE_PER_PAGE строк
+    pending = []
+    for request_type in ('deposit_gold', 'sell_gold'):
+        pending += await async_db.fetchall("SELECT id, user_id, request_type, amount FROM requests "
+                                           "WHERE status = 'pending' AND request_type = ? AND id > ? ORDER BY id LIMIT ?",
+                                           (request_type, queue_after, QUEUE_PER_PAGE + 1))
+    pending.sort()
+    for request_id, user_id, request_type, amount in pending[:QUEUE_PER_PAGE]:
+        if request_type == 'deposit_gold':
+            keyboard.row(
+                InlineKeyboardButton(f"Подтвердить пополнение {amount} голды для @{user_id} ✅",
+                                     callback_data=f'confirm_deposit_gold_{request_id}'),
+                InlineKeyboardButton(f"Отклонить пополнение {amount} голды для @{user_id} ❌",
+                                     callback_data=f'reject_deposit_gold_{request_id}')
+            )
+        else:
+            keyboard.row(
+                InlineKeyboardButton(f"Подтвердить продажу {amount} голды от @{user_id} ✅",
+                                     callback_data=f'confirm_sale_{request_id}'),
+                InlineKeyboardButton(f"Отклонить продажу {amount} голды от @{user_id} ❌",
+                                     callback_data=f'reject_sale_{request_id}')
+            )
+    if queue_after > 0:
+        keyboard.row(InlineKeyboardButton("К началу очереди ⏮", callback_data=f'queue_{users_after}_0'))
+    if len(pending) > QUEUE_PER_PAGE:
+        keyboard.row(InlineKeyboardButton("Следующие заявки 👉",
+                                          callback_data=f'queue_{users_after}_{pending[QUEUE_PER_PAGE - 1][0]}'))
+
+    keyboard.add(back_to_main_menu())
+    await bot.send_message(chat_id, f"Пользователи (всего: {total_users}):\n{user_text}", reply_markup=keyboard)
+
+
+async def no_access(call):
+    await bot.answer_callback_query(call.id, "У вас нет доступа к этой функции.", show_alert=True)
+
+
+@bot.callback_query_handler(func=lambda call: True)
+async def callback_query(call):
+    try:
+        await _callback_query(call)
+    except Exception as e:
+        await bot.send_message(call.message.chat.id, f"Произошла ошибка: {str(e)}")
+        await main_menu(call.message.chat.id, call.from_user.id == ADMIN_ID)
+
+
+async def _callback_query(call):
+    user = await get_or_register_user(call.from_user.id, call.from_user.username)
+    keyboard = InlineKeyboardMarkup().add(back_to_main_menu())
+    chat_id = call.message.chat.id
+    is_admin = call.from_user.id == ADMIN_ID
+
+    if call.data == "back":
+        await main_menu(chat_id, is_admin)
+    elif call.data == "sell":
+        await bot.edit_message_text(chat_id=chat_id, message_id=call.message.message_id,
+                                    text="Введите количество голды для продажи:", reply_markup=keyboard)
+        await register_next_step_handler(call.message, sell_gold)
+    elif call.data == "buy":
+        await bot.edit_message_text(chat_id=chat_id, message_id=call.message.message_id,
+                                    text="Введите количество голды для покупки:", reply_markup=keyboard)
+        await register_next_step_handler(call.message, buy_gold)
+    elif call.data == "profile":
+        profile_keyboard = InlineKeyboardMarkup()
+        profile_keyboard.row(InlineKeyboardButton("Вывести голду 💸", callback_data='withdraw_gold'))
+        profile_keyboard.row(InlineKeyboardButton("Вывести деньги 💳", callback_data='withdraw_money'))
+        profile_keyboard.row(InlineKeyboardButton("Пополнить баланс 🔄", callback_data='deposit'))
+        profile_keyboard.add(back_to_main_menu())
+        await bot.answer_callback_query(call.id, "Профиль пользователя")
+        await bot.edit_message_text(chat_id=chat_id, message_id=call.message.message_id,
+                                    text=f"Профиль:\nID: {user[0]}\nИмя: @{user[1]}\nБаланс: {money.rub(user[2])}\nГолда: {user[3]}",
+                                    reply_markup=profile_keyboard)
+    elif call.data == "withdraw_gold":
+        await bot.edit_message_text(chat_id=chat_id, message_id=call.message.message_id,
+                                    text="Введите количество голды для вывода (не менее 100):")
+        await register_next_step_handler(call.message, initiate_withdrawal_gold)
+    elif call.data == "withdraw_money":
+        await bot.edit_message_text(chat_id=chat_id, message_id=call.message.message_id,
+                                    text="Введите сумму и номер телефона для вывода (через пробел, сумма не менее 100):")
+        await register_next_step_handler(call.message, initiate_withdrawal_money)
+    elif call.data == "deposit":
+        await bot.send_message(chat_id,
+                               "Для пополнения баланса, пожалуйста, переведите средства на следующий ЮMoney кошелек:\n\n**41001234567890**\n\nПосле перевода отправьте скриншот платежа.")
+        await register_next_step_handler(call.message, handle_deposit_screenshot)
+    elif call.data == "admin_panel":
+        if is_admin:
+            await admin_panel(chat_id)
+        else:
+            await bot.answer_callback_query(call.id, "У вас нет доступа к админ-панели.", show_alert=True)
+    elif call.data.startswith(('next_', 'prev_', 'queue_')):
+        cursors = call.data.split('_')[1:]
+        if not is_admin:
+            await bot.answer_callback_query(call.id, "У вас нет доступа к админ-панели.", show_alert=True)
+        elif len(cursors) != 2:
+            # Кнопки со старым номером страницы: показываем начало
+            await admin_panel(chat_id)
+        elif call.data.startswith('prev_'):
+            await admin_panel(chat_id, queue_after=int(cursors[1]), users_before=int(cursors[0]))
+        else:
+            await admin_panel(chat_id, int(cursors[0]), int(cursors[1]))
+    elif call.data == "change_balance_gold":
+        if is_admin:
+            await bot.edit_message_text(chat_id=chat_id, message_id=call.message.message_id,
+                                        text="Введите ID пользователя, затем новое значение баланса и голды (через пробел):",
+                                        reply_markup=keyboard)
+            await register_next_step_handler(call.message, handle_balance_gold_change)
+        else:
+            await no_access(call)
+    elif call.data.startswith("handle_request_"):
+        request_id, action = call.data.split('_')[2:]
+        if not is_admin:
+            await no_access(call)
+        elif action == 'accept':
+            await handle_accept_request(request_id, call)
+        elif action == 'reject':
+            await handle_reject_request(request_id, call)
+    elif call.data.startswith("buy_skin_"):
+        request_id = callback_request_id(call.data, "buy_skin_")
+        request = await skin_sale_request(call, request_id)
+        if request is None:
+            return
+        buyer_id, sale_amount = request[0], request[3]
+        if await run_ledger(ledger.credit, buyer_id, balance=sale_amount, request_id=request_id, kind='sale') is None:
+            await bot.send_message(chat_id, f"Заявка {request_id} уже обработана.")
+            return
+        await bot.send_message(buyer_id, f"Покупка скина подтверждена. На ваш баланс зачислено {money.rub(sale_amount)}.")
+        await bot.send_message(ADMIN_ID, "Покупка подтверждена, баланс обновлён.")
+        await admin_panel(ADMIN_ID)
+    elif call.data.startswith("finalize_purchase_"):
+        if not is_admin:
+            await no_access(call)
+            return
+        request_id = callback_request_id(call.data, "finalize_purchase_")
+        request = await get_request(request_id)
+        if request is None:
+            return
+        buyer_id, sale_amount = request[0], request[3]
+        if await run_ledger(ledger.credit, buyer_id, balance=sale_amount, request_id=request_id, kind='sale') is None:
+            await bot.send_message(chat_id, f"Заявка {request_id} уже обработана.")
+            return
+        await bot.send_message(buyer_id, f"Покупка скина подтверждена. На ваш баланс зачислено {money.rub(sale_amount)}.")
+        await bot.send_message(chat_id, "Покупка подтверждена, баланс обновлён.")
+        await admin_panel(chat_id)
+    elif call.data.startswith("cancel_skin_sale_"):
+        request_id = callback_request_id(call.data, "cancel_skin_sale_")
+        request = await skin_sale_request(call, request_id)
+        if request is None:
+            return
+        if not await run_ledger(ledger.close, request_id, 'cancelled'):
+            await bot.send_message(chat_id, f"Заявка {request_id} уже обработана.")
+            return
+        await bot.send_message(request[0], "Продажа скина отменена.")
+        await bot.send_message(ADMIN_ID, "Продажа скина отменена.")
+        await admin_panel(ADMIN_ID)
+    elif call.data.startswith("confirm_sale_"):
+        request_id = call.data.split('_')[2]
+        if is_admin:
+            await bot.send_message(chat_id, "Отправьте скриншот скина.")
+            await register_next_step_handler(call.message, handle_admin_screenshot, request_id)
+        else:
+            await no_access(call)
+    elif call.data.startswith(("reject_sale_", "reject_deposit_gold_", "dispute_purchase_")):
+        request_id = call.data.rsplit('_', 1)[1]
+        if is_admin:
+            status = 'disputed' if call.data.startswith("dispute_purchase_") else 'rejected'
+            if not await run_ledger(ledger.close, request_id, status):
+                await bot.send_message(chat_id, f"Заявка {request_id} уже обработана.")
+                return
+            await bot.send_message(chat_id, "Покупка оспорена." if status == 'disputed' else "Заявка отклонена.")
+            await admin_panel(chat_id)
+        else:
+            await no_access(call)
+    elif call.data.startswith("confirm_purchase_"):
+        request_id = callback_request_id(call.data, "confirm_purchase_")
+        request = await get_request(request_id)
+        if request is None:
+            return
+        await bot.send_message(chat_id, "Отправьте скриншот купленного скина.")
+        await register_next_step_handler(call.message, handle_buyer_screenshot, request[0], request_id, request[3])
+    elif call.data.startswith("confirm_deposit_gold_"):
+        request_id = call.data.split('_')[3]
+        if is_admin:
+            await bot.send_message(chat_id, "Введите количество голды для зачисления:")
+            await register_next_step_handler(call.message, finalize_deposit_gold, request_id)
+        else:
+            await no_access(call)
+
+
+@step
+async def handle_balance_gold_change(message):
+    try:
+        user_id, new_balance, new_gold = message.text.split()
+        await run_ledger(ledger.set_balance, int(user_id), balance=money.kopecks(new_balance), gold=int(new_gold))
+        await bot.send_message(message.chat.id, f"Баланс и голда для пользователя с ID {user_id} обновлены.")
+    except ValueError:
+        await bot.send_message(message.chat.id,
+                               "Неверный формат ввода. Пожалуйста, введите ID пользователя, новый баланс и голду через пробел.")
+    await main_menu(message.chat.id, message.from_user.id == ADMIN_ID)
+
+
+@step
+async def buy_gold(message):
+    try:
+        amount = int(message.text)
+        result = await run_ledger(ledger.buy_gold, message.from_user.id, amount, money.buy_price(amount))
+        if result:
+            new_balance, new_gold = result
+            await bot.send_message(message.chat.id,
+                                   f"Покупка успешна! Ваш новый баланс: {money.rub(new_balance)}, голда: {new_gold}")
+        else:
+            await bot.send_message(message.chat.id, "Недостаточно средств для покупки.")
+    except ValueError:
+        await bot.send_message(message.chat.id, "Введите корректное число.")
+    await main_menu(message.chat.id, message.from_user.id == ADMIN_ID)
+
+
+@step
+async def initiate_withdrawal_gold(message):
+    try:
+        amount = int(message.text)
+        if amount < 100:
+            await bot.send_message(message.chat.id, "Минимальная сумма для вывода 100 голды.")
+            return
+        payout = money.gold_payout(amount)
+        result = await run_ledger(ledger.withdraw_gold, message.from_user.id, amount, payout)
+        if result:
+            request_id, user_name = result
+            withdrawal_info = f"Пользователь @{user_name} запрашивает вывод {amount} голды, сумма: {money.rub(payout)}"
+            await bot.send_message(message.from_user.id, "Пожалуйста, отправьте скриншот подтверждения платежа.")
+            await register_next_step_handler(message, handle_screenshot, withdrawal_info, request_id)
+        else:
+            await bot.send_message(message.chat.id, "Недостаточно голды на балансе.")
+    except ValueError:
+        await bot.send_message(message.chat.id, "Введите корректное число для вывода.")
+
+
+@step
+async def initiate_withdrawal_money(message):
+    try:
+        amount, phone = message.text.split()
+        amount = money.kopecks(amount)
+        if amount < 100 * money.KOPECKS:
+            await bot.send_message(message.chat.id, "Минимальная сумма для вывода 100 рублей.")
+            return
+        result = await run_ledger(ledger.withdraw_money, message.from_user.id, amount, phone)
+        if result:
+            request_id, user_name = result
+            await bot.send_message(ADMIN_ID, f"Пользователь @{user_name} запрашивает вывод {money.rub(amount)} руб на номер {phone}",
+                                   reply_markup=request_keyboard(request_id))
+            await bot.send_message(message.chat.id, "Заявка на вывод отправлена администратору.")
+        else:
+            await bot.send_message(message.chat.id, "Недостаточно средств на балансе.")
+    except ValueError:
+        await bot.send_message(message.chat.id, "Введите корректные данные для вывода (сумма и номер телефона через пробел).")
+
+
+def request_keyboard(request_id):
+    return InlineKeyboardMarkup().row(
+        InlineKeyboardButton("Выведено ✅", callback_data=f'handle_request_{request_id}_accept'),
+        InlineKeyboardButton("Отменить вывод ❌", callback_data=f'handle_request_{request_id}_reject'))
+
+
+@step
+async def sell_gold(message):
+    try:
+        amount = int(message.text)
+        await get_or_register_user(message.from_user.id, message.from_user.username)
+        sale_amount = money.sale_amount(amount)
+        request_id = await create_request(message.from_user.id, 'sell_gold', amount, sale_amount=sale_amount)
+        await bot.send_message(message.chat.id, f"Вы продаете {amount} голды. Покупатель должен купить скин за {money.rub(sale_amount)}. Отправьте админу скриншот выставленного скина.")
+        await register_next_step_handler(message, handle_skin_sale, request_id, sale_amount, amount)
+    except ValueError:
+        await bot.send_message(message.chat.id, "Введите корректное число голды для продажи.")
+
+
+@step
+async def handle_skin_sale(message, request_id, sale_amount, amount):
+    if message.content_type != 'photo':
+        await bot.send_message(message.chat.id, "Пожалуйста, отправьте скриншот скина.")
+        await register_next_step_handler(message, handle_skin_sale, request_id, sale_amount, amount)
+        return
+    sale_info = f"Пользователь @{message.from_user.username} продает {amount} голды. Сумма продажи: {money.rub(sale_amount)}"
+    await bot.send_photo(ADMIN_ID, media.largest_photo(message).file_id, caption=sale_info, reply_markup=InlineKeyboardMarkup().row(
+        InlineKeyboardButton("Подтвердить продажу ✅", callback_data=f'confirm_sale_{request_id}'),
+        InlineKeyboardButton("Отклонить продажу ❌", callback_data=f'reject_sale_{request_id}')
+    ))
+    await bot.send_message(message.chat.id, "Заявка на продажу голды отправлена администратору.")
+
+
+async def handle_accept_request(request_id, call):
+    # Только из pending (ledger.accept): по отклонённой или просроченной заявке списанное уже вернулось
+    request = await run_ledger(ledger.accept, request_id)
+    if request is None:
+        await bot.send_message(call.message.chat.id, f"Заявка {request_id} уже обработана.")
+        return
+    user_id, request_type = request[:2]
+    if request_type == 'withdraw_gold':
+        await bot.send_message(user_id, "Ваша заявка на вывод голды успешно обработана.")
+    elif request_type == 'withdraw_money':
+        await bot.send_message(user_id, "Ваша заявка на вывод денег успешно обработана.")
+    await admin_panel(call.message.chat.id)
+
+
+async def handle_reject_request(request_id, call):
+    # Списанное по заявке на вывод возвращается в той же транзакции (ledger.reject)
+    request = await run_ledger(ledger.reject, request_id)
+    if request is None:
+        await bot.send_message(call.message.chat.id, f"Заявка {request_id} уже обработана.")
+        return
+    user_id, request_type = request
+    if request_type == 'withdraw_gold':
+        await bot.send_message(user_id, "Ваша заявка на вывод голды отклонена.")
+    elif request_type == 'withdraw_money':
+        await bot.send_message(user_id, "Ваша заявка на вывод денег отклонена.")
+    await admin_panel(call.message.chat.id)
+
+
+@step
+async def handle_admin_screenshot(message, request_id):
+    if message.content_type != 'photo':
+        await bot.send_message(message.chat.id, "Пожалуйста, отправьте скриншот скина.")
+        await register_next_step_handler(message, handle_admin_screenshot, request_id)
+        return
+    request = await get_request(request_id)
+    if request:
+        user_id = request[0]
+        await bot.send_photo(user_id, media.largest_photo(message).file_id, caption="Проверьте, пожалуйста, этот скин. Если он соответствует заявке, нажмите 'Купил скин'.")
+        await bot.send_message(user_id, "Скин готов к покупке", reply_markup=InlineKeyboardMarkup().row(
+            InlineKeyboardButton("Купил скин ✅", callback_data=f'confirm_purchase_{request_id}'),
+            InlineKeyboardButton("Отменить покупку ❌", callback_data=f'cancel_purchase_{request_id}')))
+
+
+@step
+async def handle_buyer_screenshot(message, buyer_id, request_id, sale_amount):
+    if message.content_type != 'photo':
+        await bot.send_message(message.chat.id, "Пожалуйста, отправьте скриншот купленного скина.")
+        await register_next_step_handler(message, handle_buyer_screenshot, buyer_id, request_id, sale_amount)
+        return
+    await bot.send_photo(ADMIN_ID, media.largest_photo(message).file_id, caption=f"Покупатель @{message.from_user.username} подтвердил покупку скина за {money.rub(sale_amount)}.", reply_markup=InlineKeyboardMarkup().row(
+        InlineKeyboardButton("Подтвердить покупку ✅", callback_data=f'finalize_purchase_{request_id}'),
+        InlineKeyboardButton("Отклонить покупку ❌", callback_data=f'dispute_purchase_{request_id}')
+    ))
+
+
+@step
+async def handle_deposit_screenshot(message):
+    if message.content_type != 'photo':
+        await bot.send_message(message.chat.id, "Пожалуйста, отправьте скриншот платежа.")
+        await register_next_step_handler(message, handle_deposit_screenshot)
+        return
+    await bot.send_photo(ADMIN_ID, media.largest_photo(message).file_id,
+                         caption=f"Пользователь @{message.from_user.username} хочет пополнить баланс. Пожалуйста, подтвердите сумму.")
+    await bot.send_message(message.chat.id, "Скриншот отправлен администратору. Ожидайте подтверждения.")
+
+
+@step
+async def handle_screenshot(message, withdrawal_info, request_id):
+    if message.content_type != 'photo':
+        await bot.send_message(message.chat.id, "Пожалуйста, отправьте скриншот.")
+        await register_next_step_handler(message, handle_screenshot, withdrawal_info, request_id)
+        return
+    await bot.send_photo(ADMIN_ID, media.largest_photo(message).file_id, caption=withdrawal_info, reply_markup=request_keyboard(request_id))
+    await bot.send_message(message.chat.id, "Заявка на вывод отправлена администратору.")
+
+
+@step
+async def finalize_deposit_gold(message, request_id):
+    try:
+        amount = int(message.text)
+    except ValueError:
+        await bot.send_message(message.chat.id, "Введите корректное число голды для зачисления.")
+        return
+    request = await async_db.fetchone("SELECT user_id FROM requests WHERE id = ?", (request_id,))
+    await async_db.execute("UPDATE requests SET amount = ?, details = ? WHERE id = ? AND status = 'pending'",
+                           (amount, f"Зачислено {amount} голды", request_id))
+    if request is None or await run_ledger(ledger.credit, request[0], gold=amount, request_id=request_id, kind='deposit_gold') is None:
+        await bot.send_message(message.chat.id, f"Заявка {request_id} уже обработана.")
+        return
+    await bot.send_message(request[0], f"Ваш баланс голды пополнен на {amount}.")
+    await bot.send_message(message.chat.id, f"Пополнение на {amount} голды подтверждено.")
+    await admin_panel(message.chat.id)
+
+
+@bot.message_handler(commands=['start'])
+async def start_message(message):
+    try:
+        await asyncio.to_thread(states.clear, message.chat.id)
+        await bot.send_message(message.chat.id, "Добро пожаловать в бот для торговли голдой StandOff 2!")
+        await main_menu(message.chat.id, message.from_user.id == ADMIN_ID)
+    except Exception as e:
+        await bot.send_message(message.chat.id, f"Ошибка при старте: {str(e)}")
+
+
+# Продолжение диалога регистрируется после /start, как в main.py: команда сбрасывает незавершённый диалог
+@bot.message_handler(content_types=['text', 'photo'])
+async def next_step(message):
+    step = await asyncio.to_thread(states.pop_step, message.chat.id, STEPS)
+    if step is None:
+        return
+    callback, args = step
+    await callback(message, *args)
+
+
+async def main():
+    schema.migrate()
+    sweeper = asyncio.create_task(sweep_steps())
+    try:
+        await bot.infinity_polling()
+    finally:
+        sweeper.cancel()
+        await async_db.close_connection()
+
+
+if __name__ == '__main__':
+    if not TOKEN:
+        sys.exit("Не задан token в cnf.py")
+    asyncio.run(main())
@@ -0,0 +1,75 @@
+# Время отрисовки админ-панели при росте таблиц users/requests.
+# «до» — прежние запросы: полный просмотр requests и COUNT(*) по users (индекс отключён через NOT INDEXED),
+# «после» — те же выборки по индексу (status, request_type) и счётчику пользователей,
+# «панель» — полный render_admin_panel из main.py вместе с клавиатурой.
+# Запуск: python benchmarks/bench_admin_panel.py [макс. заявок] [макс. пользователей]
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import db
+from fake_telegram import FakeTelegram, load_main
+
+OLD_QUERIES = (
+    ("SELECT id, name, balance, gold FROM users LIMIT ? OFFSET ?", (10, 0)),
+    ("SELECT COUNT(*) FROM users", ()),
+    ("SELECT id, user_id, amount FROM requests NOT INDEXED WHERE request_type = 'deposit_gold' AND status = 'pending'", ()),
+    ("SELECT id, user_id, amount, details FROM requests NOT INDEXED WHERE request_type = 'sell_gold' AND status = 'pending'", ()),
+)
+NEW_QUERIES = (
+    ("SELECT id, name, balance, gold FROM users LIMIT ? OFFSET ?", (10, 0)),
+    ("SELECT value FROM counters WHERE name = 'users'", ()),
+    ("SELECT id, user_id, amount FROM requests WHERE request_type = 'deposit_gold' AND status = 'pending'", ()),
+    ("SELECT id, user_id, amount, details FROM requests WHERE request_type = 'sell_gold' AND status = 'pending'", ()),
+)
+PENDING = 20
+RUNS = 20
+
+
+def fill(users_from, users_to, requests_from, requests_to):
+    rnd = random.Random(requests_to)
+    with db.transaction() as conn:
+        conn.executemany("INSERT INTO users (id, name, balance, gold) VALUES (?, ?, 0, 0)",
+                         ((i, f'user{i}') for i in range(users_from, users_to)))
+        conn.executemany("INSERT INTO requests (user_id, request_type, amount, status, details) VALUES (?, ?, ?, ?, '')",
+                         ((rnd.randrange(users_to), rnd.choice(('sell_gold', 'deposit_gold', 'withdraw_gold')),
+                           rnd.randrange(100, 1000), 'completed') for _ in range(requests_from, requests_to)))
+        conn.execute("UPDATE requests SET status = 'completed' WHERE status = 'pending'")
+        conn.executemany("INSERT INTO requests (user_id, request_type, amount, status, details) VALUES (?, ?, 100, 'pending', '')",
+                         ((i, kind) for i in range(PENDING) for kind in ('sell_gold', 'deposit_gold')))
+    db.execute("ANALYZE")
+
+
+def timed(fn):
+    start = time.perf_counter()
+    for _ in range(RUNS):
+        fn()
+    return (time.perf_counter() - start) / RUNS * 1000
+
+
+def main():
+    max_requests = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    max_users = int(sys.argv[2]) if len(sys.argv) > 2 else 100_000
+    with tempfile.TemporaryDirectory() as tmp:
+        fake = FakeTelegram(latency=0).start().install()
+        bot_main = load_main(os.path.join(tmp, 'users.db'))
+        users = requests = 0
+        print(f"{'заявок':>10} {'польз.':>8} {'до, мс':>10} {'после, мс':>10} {'панель, мс':>11}")
+        for step in (100, 10, 1):
+            next_users, next_requests = max_users // step, max_requests // step
+            fill(users, next_users, requests, next_requests)
+            users, requests = next_users, next_requests
+            old = timed(lambda: [db.fetchall(sql, params) for sql, params in OLD_QUERIES])
+            new = timed(lambda: [db.fetchall(sql, params) for sql, params in NEW_QUERIES])
+            panel = timed(lambda: bot_main.render_admin_panel())
+            print(f"{requests:>10} {users:>8} {old:>10.2f} {new:>10.2f} {panel:>11.2f}")
+        fake.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+# Обновление админ-панели после серии действий админа: прежняя схема (каждое действие заново строит панель
+# и, так как last_update_id не id сообщения, шлёт новое сообщение) против admin_view.AdminView.
+# Админ подряд отклоняет N заявок на продажу, затем ещё N раз обновляет панель без изменений данных.
+# Запуск: python benchmarks/bench_admin_view.py [заявок] [пользователей]
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from telebot import TeleBot, types
+
+import db
+from fake_telegram import FakeTelegram, load_main, unlimited
+
+
+def seed(requests, users):
+    with db.transaction() as conn:
+        conn.executemany("INSERT OR IGNORE INTO users (id, name, balance, gold) VALUES (?, ?, 0, 0)",
+                         ((i, f'user{i}') for i in range(1, users + 1)))
+        conn.executemany("INSERT INTO requests (user_id, request_type, amount, status, details) VALUES (?, 'sell_gold', 100, 'pending', '')",
+                         ((i % users + 1,) for i in range(requests)))
+    return [row[0] for row in db.fetchall("SELECT id FROM requests WHERE status = 'pending' ORDER BY id DESC LIMIT ?",
+                                          (requests,))]
+
+
+def api_calls(fake, admin_id):
+    return sum(1 for entry in fake.sent if entry[2] == admin_id and entry[1] in ('sendMessage', 'editMessageText')
+               and entry[3].get('text', '').startswith('Пользователи'))
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+    users = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    with tempfile.TemporaryDirectory() as tmp:
+        fake = FakeTelegram(latency=0.02).start().install()
+        bot_main = load_main(os.path.join(tmp, 'users.db'))
+        unlimited(bot_main.outbox)
+        bot, admin_id, panel = bot_main.bot, bot_main.ADMIN_ID, bot_main.panel
+
+        print(f"{'схема':<12} {'действия, с':>12} {'отрисовок':>10} {'панелей':>8} {'повторы: отрисовок':>19} {'панелей':>8}")
+
+        ids = seed(requests, users)
+        fake.sent.clear()
+        start = time.perf_counter()
+        for request_id in ids:
+            bot_main.update_request_status(request_id, 'rejected')
+            TeleBot.send_message(bot, admin_id, "Заявка на продажу отклонена.")
+            text, keyboard = bot_main.render_admin_panel()
+            TeleBot.send_message(bot, admin_id, text, reply_markup=keyboard)
+        elapsed, sent = time.perf_counter() - start, api_calls(fake, admin_id)
+        for _ in range(requests):
+            text, keyboard = bot_main.render_admin_panel()
+            TeleBot.send_message(bot, admin_id, text, reply_markup=keyboard)
+        print(f"{'прежняя':<12} {elapsed:>12.2f} {requests:>10} {sent:>8} {requests:>19} {api_calls(fake, admin_id) - sent:>8}")
+
+        ids = seed(requests, users)
+        bot_main.admin_panel(admin_id).result()
+        fake.sent.clear()
+        panel.renders = 0
+        start = time.perf_counter()
+        for request_id in ids:
+            update = types.Update.de_json(fake.callback_update(admin_id, f'reject_sale_{request_id}'))
+            TeleBot.process_new_updates(bot, [update])
+        elapsed = time.perf_counter() - start
+        time.sleep(panel.debounce * 2)
+        bot_main.outbox.join()
+        renders, sent = panel.renders, api_calls(fake, admin_id)
+        for _ in range(requests):
+            panel.refresh(admin_id)
+            time.sleep(panel.debounce * 1.5)
+        bot_main.outbox.join()
+        print(f"{'AdminView':<12} {elapsed:>12.2f} {renders:>10} {sent:>8} {panel.renders - renders:>19} "
+              f"{api_calls(fake, admin_id) - sent:>8}")
+        fake.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+# Архив скриншотов: N одновременных скриншотов по S МБ. Прежний способ (bot.download_file — весь файл в памяти,
+# по потоку на скриншот) против archive.py (кусками на диск, не больше MAX_DOWNLOADS загрузок сразу).
+# Считается пик RSS процесса, время, сколько файлов легло на диск (одинаковое содержимое — один файл),
+# и повторная отправка из архива через mmap.
+# Запуск: python benchmarks/bench_archive.py [--screenshots 64] [--size-mb 8]
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from telebot import types
+
+import fake_telegram
+from fake_telegram import FakeTelegram, load_main, unlimited
+
+
+def peak_rss_mb():
+    scale = 1 if sys.platform == 'darwin' else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 2 ** 20
+
+
+def photos(fake, count):
+    return [types.PhotoSize.de_json(fake.message_update(1_000_000 + i, photo=True)['message']['photo'][-1])
+            for i in range(count)]
+
+
+def run(mode, args):
+    fake_telegram.PHOTO_BYTES = b'\xff\xd8\xff' + b'\x00' * (args.size_mb * 2 ** 20)
+    with tempfile.TemporaryDirectory() as tmp:
+        fake = FakeTelegram(latency=0.001, file_latency=0.01).start().install()
+        bot_main = load_main(os.path.join(tmp, 'users.db'))
+        unlimited(bot_main.outbox)
+        import archive
+        bot = bot_main.bot
+        shots = photos(fake, args.screenshots)
+        rss_before = peak_rss_mb()
+        start = time.perf_counter()
+        if mode == 'download_file':
+            def download(photo):
+                data = bot.download_file(bot.get_file(photo.file_id).file_path)
+                time.sleep(0.05)  # обработка, пока байты в памяти
+                return len(data)
+            threads = [threading.Thread(target=download, args=(photo,)) for photo in shots]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            stored = '-'
+        else:
+            futures = [archive.archive_async(bot, photo, request_id, 'sale') for request_id, photo in enumerate(shots, 1)]
+            for future in futures:
+                future.result()
+            stored = sum(len(files) for _, _, files in os.walk(archive.ARCHIVE_DIR))
+        elapsed = time.perf_counter() - start
+        resend = ''
+        if mode == 'archive':
+            start = time.perf_counter()
+            for digest, _ in archive.screenshots(1) * args.resend:
+                bot_main.outbox.submit(1, archive.send, bot, 1, digest)
+            bot_main.outbox.join()
+            resend = f"{(time.perf_counter() - start) / args.resend * 1000:.1f}"
+        fake.stop()
+    print(f"{mode:<14} {elapsed:>8.2f} {peak_rss_mb() - rss_before:>12.0f} {stored:>8} {resend:>16}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--screenshots', type=int, default=64)
+    parser.add_argument('--size-mb', type=int, default=8)
+    parser.add_argument('--resend', type=int, default=10, help='сколько раз отправить скриншот из архива')
+    parser.add_argument('--single', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        run(args.single, args)
+        return
+    print(f"скриншотов: {args.screenshots} по {args.size_mb} МБ (одинаковое содержимое)", flush=True)
+    print(f"{'способ':<14} {'время, с':>8} {'пик RSS, МБ':>12} {'файлов':>8} {'отправка, мс':>16}", flush=True)
+    # Пик RSS считается на процесс, поэтому каждый способ — в своём процессе
+    for mode in ('download_file', 'archive'):
+        subprocess.run([sys.executable, os.path.abspath(__file__), '--single', mode,
+                        '--screenshots', str(args.screenshots), '--size-mb', str(args.size_mb),
+                        '--resend', str(args.resend)], check=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+# Сравнение асинхронного движка (async_main.py) с потоковым main.py на заглушке Bot API (aiohttp).
+# Каждый пользователь нажимает «Пополнить баланс» и отправляет скриншот; меряем
+# время сценария от получения апдейтов до ответа «Скриншот отправлен администратору».
+# Запуск: python benchmarks/bench_async.py [пользователей] [потоков для main.py]
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from telebot import types
+
+import dispatch
+from fake_telegram import AioFakeTelegram, load_main, percentile, unlimited
+
+DONE_TEXT = 'Скриншот отправлен'
+
+
+class FlowTimer:
+    def __init__(self, fake, users):
+        self.users = set(users)
+        self.started = {}
+        self.latencies = []
+        self.done = threading.Event()
+        self.lock = threading.Lock()
+        fake.listeners.append(self.on_sent)
+
+    def on_sent(self, method, chat_id, params):
+        if method == 'sendMessage' and chat_id in self.users and params.get('text', '').startswith(DONE_TEXT):
+            with self.lock:
+                self.latencies.append(time.perf_counter() - self.started[chat_id])
+                if len(self.latencies) == len(self.users):
+                    self.done.set()
+
+    def report(self, name, elapsed):
+        print(f"{name:<22} {len(self.users) / elapsed:>8.1f} сценариев/сек  "
+              f"p50 {percentile(self.latencies, 50) * 1000:>7.1f} мс  p99 {percentile(self.latencies, 99) * 1000:>7.1f} мс  "
+              f"завершено: {len(self.latencies)}/{len(self.users)}")
+
+
+def make_updates(fake, users):
+    updates = [fake.callback_update(user_id, 'deposit') for user_id in users]
+    updates += [fake.message_update(user_id, photo=True) for user_id in users]
+    return [types.Update.de_json(raw) for raw in updates]
+
+
+def run_threaded(fake, users, workers):
+    main = load_main(os.environ['BENCH_DB'])
+    unlimited(main.outbox)
+    timer = FlowTimer(fake, users)
+    pool = dispatch.KeyedWorkerPool(lambda update: main.bot.__class__.process_new_updates(main.bot, [update]), workers)
+    start = time.perf_counter()
+    for update in make_updates(fake, users):
+        timer.started.setdefault(dispatch.update_user_id(update), time.perf_counter())
+        pool.put(dispatch.update_user_id(update), update)
+    timer.done.wait(600)
+    timer.report(f'main.py, {workers} потоков', time.perf_counter() - start)
+    pool.stop()
+    fake.listeners.remove(timer.on_sent)
+
+
+async def run_async(fake, users):
+    async_main = load_main(os.environ['BENCH_DB'], 'async_main')
+    async_main.schema.migrate()
+    timer = FlowTimer(fake, users)
+    updates = make_updates(fake, users)
+    start = time.perf_counter()
+    for user_id in users:
+        timer.started[user_id] = time.perf_counter()
+    # Как при polling: пачки по 100 апдейтов, каждая в своей задаче
+    await asyncio.gather(*(async_main.bot.process_new_updates(updates[i:i + 100]) for i in range(0, len(updates), 100)))
+    await asyncio.get_running_loop().run_in_executor(None, timer.done.wait, 600)
+    timer.report('async_main.py', time.perf_counter() - start)
+    fake.listeners.remove(timer.on_sent)
+    await async_main.bot.close_session()
+    await async_main.async_db.close_connection()
+
+
+def main():
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['BENCH_DB'] = os.path.join(tmp, 'users.db')
+        fake = AioFakeTelegram().start().install()
+        run_threaded(fake, list(range(1_000_000, 1_000_000 + users)), workers)
+        asyncio.run(run_async(fake, list(range(2_000_000, 2_000_000 + users))))
+        fake.stop()
+
+
+if __name__ == '__main__':
+    main()
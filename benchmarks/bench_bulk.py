@@ -0,0 +1,91 @@
+# Массовая обработка заявок против подтверждения по одной кнопке. В очереди N заявок на вывод денег
+# от U пользователей; админ либо нажимает «Выведено» у каждой, либо один раз «Подтвердить все».
+# Считается время обработки нажатий, время до доставки всех уведомлений, SQL-запросы, вызовы API
+# и перерисовки админ-панели.
+# Запуск: python benchmarks/bench_bulk.py [--requests 300] [--users 200] [--telegram-limits]
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from telebot import TeleBot, types
+
+import db
+import metrics
+from fake_telegram import FakeTelegram, load_main, unlimited
+
+FIRST_USER_ID = 1_000_000
+
+
+def seed(requests, users):
+    with db.transaction() as conn:
+        conn.executemany("INSERT OR IGNORE INTO users (id, name, balance, gold) VALUES (?, ?, 0, 0)",
+                         ((FIRST_USER_ID + i, f'user{i}') for i in range(users)))
+        conn.executemany("INSERT INTO requests (user_id, request_type, amount, status, details, phone) "
+                         "VALUES (?, 'withdraw_money', 10000, 'pending', '', '+79990000000')",
+                         ((FIRST_USER_ID + i % users,) for i in range(requests)))
+    return [row[0] for row in db.fetchall("SELECT id FROM requests WHERE status = 'pending' "
+                                          "AND request_type = 'withdraw_money' ORDER BY id")]
+
+
+def db_statements():
+    with metrics._lock:
+        return sum(series[-1] for series in metrics.DB_SECONDS.values.values())
+
+
+def run(name, fake, bot_main, data):
+    bot, admin_id, panel = bot_main.bot, bot_main.ADMIN_ID, bot_main.panel
+    fake.sent.clear()
+    panel.renders = 0
+    statements = db_statements()
+    start = time.perf_counter()
+    for callback_data in data:
+        update = types.Update.de_json(fake.callback_update(admin_id, callback_data))
+        TeleBot.process_new_updates(bot, [update])
+    handled = time.perf_counter() - start
+    bot_main.outbox.join()
+    time.sleep(panel.debounce * 2)
+    bot_main.outbox.join()
+    delivered = time.perf_counter() - start - panel.debounce * 2
+    statements = db_statements() - statements
+    notified = sum(1 for entry in fake.sent if entry[2] != admin_id)
+    left = db.fetchone("SELECT COUNT(*) FROM requests WHERE status = 'pending'")[0]
+    print(f"{name:<12} {len(data):>8} {handled:>12.3f} {delivered:>12.2f} {statements:>6} "
+          f"{len(fake.sent):>6} {notified:>12} {panel.renders:>10} {left:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=300)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0.02, help='задержка ответа заглушки API, с')
+    parser.add_argument('--telegram-limits', action='store_true', help='лимиты Telegram в заглушке и очереди')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        fake = FakeTelegram(latency=args.latency).start().install()
+        bot_main = load_main(os.path.join(tmp, 'users.db'))
+        if args.telegram_limits:
+            fake.limit()
+        else:
+            unlimited(bot_main.outbox)
+        bot_main.admin_panel(bot_main.ADMIN_ID).result()
+        bulk_index = [entry[0] for entry in bot_main.BULK_TYPES].index('withdraw_money')
+
+        print(f"заявок: {args.requests}, пользователей: {args.users}, "
+              f"лимиты Telegram: {'да' if args.telegram_limits else 'нет'}")
+        print(f"{'схема':<12} {'нажатий':>8} {'обработка, с':>12} {'доставка, с':>12} {'SQL':>6} "
+              f"{'API':>6} {'уведомлений':>12} {'отрисовок':>10} {'осталось':>8}")
+        ids = seed(args.requests, args.users)
+        run('по одной', fake, bot_main, [f'handle_request_{request_id}_accept' for request_id in ids])
+        ids = seed(args.requests, args.users)
+        run('разом', fake, bot_main, [f'bulk_accept_{bulk_index}_{ids[-1]}'])
+        fake.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+# Масштабирование по процессам: сценарий bench_e2e.py (все шаги пользователя и ответы админа) против бота,
+# запущенного как в cluster.py — ведущий процесс с polling раскладывает апдейты по процессам обработки.
+# Для сравнения 0 процессов — обычный запуск main.py (пул потоков в одном процессе).
+# Рост пропускной способности с числом процессов виден только на машине с несколькими ядрами:
+# заглушка Bot API и ведущий процесс работают в процессе теста и тоже занимают ядро.
+# Запуск: python benchmarks/bench_cluster.py [--processes 0 1 2 4] [--users 200] [--concurrency 50]
+import argparse
+import functools
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import cluster
+import dispatch
+from bench_e2e import LoadTest
+from fake_telegram import FakeTelegram, load_main, percentile, unlimited
+
+
+def setup_worker(api_url, db_path):
+    # Выполняется в процессе обработки до импорта main: та же заглушка API и база, без лимитов отправки
+    from telebot import apihelper
+    apihelper.API_URL = api_url + '/bot{0}/{1}'
+    apihelper.FILE_URL = api_url + '/file/bot{0}/{1}'
+    unlimited(load_main(db_path).outbox)
+
+
+def wait_workers(fake, processes):
+    # Процессы готовы, когда каждый ответил на /start своего пользователя (id i попадает в процесс i)
+    fake.push(*(fake.message_update(user_id, '/start') for user_id in range(1, processes + 1)))
+    while any(not fake.sent_to(user_id) for user_id in range(1, processes + 1)):
+        time.sleep(0.05)
+
+
+def run(processes, args):
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'users.db')
+        fake = FakeTelegram(latency=args.latency, file_latency=args.latency).start().install()
+        bot_main = load_main(db_path)
+        unlimited(bot_main.outbox)
+        bot = bot_main.bot
+        workers = None
+        if processes:
+            workers = cluster.Cluster(processes, args.workers, setup=functools.partial(setup_worker, fake.url, db_path))
+            workers.start().attach(bot, bot_main.register_users)
+        else:
+            dispatch.attach(bot, args.workers, bot_main.register_users)
+        poller = threading.Thread(target=bot.polling, kwargs={'non_stop': True, 'interval': 0, 'timeout': 5,
+                                                               'long_polling_timeout': 1}, daemon=True)
+        poller.start()
+        wait_workers(fake, max(processes, 1))
+
+        test = LoadTest(fake, bot_main.ADMIN_ID, args.users, args.concurrency)
+        fake.listeners.append(test.on_sent)
+        start = time.perf_counter()
+        test.start()
+        finished = test.done.wait(args.timeout)
+        elapsed = time.perf_counter() - start
+        if workers is not None:
+            workers.stop()
+        bot.stop_polling()
+        poller.join(5)
+        fake.stop()
+    flows = len(test.flow_seconds)
+    print(f"{processes or 'потоки':>9} {flows:>6}/{args.users:<6} {elapsed:>8.2f} {test.pushed / elapsed:>12.1f} "
+          f"{flows / elapsed:>10.1f} {percentile(test.flow_seconds, 50) * 1000:>10.0f} "
+          f"{percentile(test.flow_seconds, 95) * 1000:>10.0f}" + ('' if finished else '  не завершён'))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--processes', type=int, nargs='+', default=[0, 1, 2, 4],
+                        help='число процессов обработки для каждого прогона, 0 — без cluster.py')
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--workers', type=int, default=8, help='потоков обработки в каждом процессе')
+    parser.add_argument('--latency', type=float, default=0.01, help='задержка ответа заглушки Bot API, с')
+    parser.add_argument('--timeout', type=float, default=600)
+    parser.add_argument('--single', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single is not None:
+        run(args.single, args)
+        return
+    print(f"ядер: {os.cpu_count()}, пользователей: {args.users}, одновременно: {args.concurrency}, "
+          f"потоков в процессе: {args.workers}")
+    print(f"{'процессов':>9} {'сценариев':>13} {'время, с':>8} {'апдейтов/сек':>12} {'сценариев/с':>10} "
+          f"{'p50, мс':>10} {'p95, мс':>10}")
+    # Каждый прогон в отдельном процессе: main.py импортируется один раз на интерпретатор
+    for processes in args.processes:
+        subprocess.run([sys.executable, os.path.abspath(__file__), '--single', str(processes),
+                        '--users', str(args.users), '--concurrency', str(args.concurrency),
+                        '--workers', str(args.workers), '--latency', str(args.latency),
+                        '--timeout', str(args.timeout)], check=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+# Сравнение старого подхода (connect/close на каждый вызов) с долгоживущими соединениями из db.py
+# Запуск: python benchmarks/bench_db.py [кол-во операций]
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db
+
+SCHEMA = '''CREATE TABLE IF NOT EXISTS users
+            (id INTEGER PRIMARY KEY, name TEXT, balance REAL, gold INTEGER)'''
+
+
+def per_call(path, user_id):
+    conn = sqlite3.connect(path)
+    try:
+        c = conn.cursor()
+        c.execute("SELECT * FROM users WHERE id=?", (user_id,))
+        user = c.fetchone()
+        c.execute("UPDATE users SET gold = ? WHERE id = ?", (user[3] + 1, user_id))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def pooled(user_id):
+    user = db.fetchone("SELECT * FROM users WHERE id=?", (user_id,))
+    db.execute("UPDATE users SET gold = ? WHERE id = ?", (user[3] + 1, user_id))
+
+
+def run(name, fn, ops):
+    start = time.perf_counter()
+    for i in range(ops):
+        fn(i % 1000)
+    elapsed = time.perf_counter() - start
+    print(f"{name:<10} {ops / elapsed:>10.0f} ops/sec")
+
+
+def main():
+    ops = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    with tempfile.TemporaryDirectory() as tmp:
+        per_call_path = os.path.join(tmp, 'per_call.db')
+        db.DB_PATH = os.path.join(tmp, 'pooled.db')
+        for path in (per_call_path, db.DB_PATH):
+            conn = sqlite3.connect(path)
+            conn.execute(SCHEMA)
+            conn.executemany("INSERT INTO users VALUES (?, ?, 0, 0)", ((i, f'user{i}') for i in range(1000)))
+            conn.commit()
+            conn.close()
+
+        run('per-call', lambda user_id: per_call(per_call_path, user_id), ops)
+        run('pooled', pooled, ops)
+        db.close_connection()
+
+
+if __name__ == '__main__':
+    main()
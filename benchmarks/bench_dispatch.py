@@ -0,0 +1,63 @@
+# Нагрузочный тест пула обработки апдейтов против заглушки Bot API.
+# Каждый пользователь нажимает «Пополнить баланс» и отправляет скриншот, сравниваем 1 поток и N потоков.
+# Запуск: python benchmarks/bench_dispatch.py [пользователей] [потоков]
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from telebot import types
+
+import dispatch
+from fake_telegram import FakeTelegram, load_main, percentile, unlimited
+
+
+def run(main, fake, users, workers):
+    latencies = []
+
+    def handler(item):
+        queued_at, update = item
+        main.bot.__class__.process_new_updates(main.bot, [update])
+        latencies.append(time.perf_counter() - queued_at)
+
+    pool = dispatch.KeyedWorkerPool(handler, workers)
+    base = 10_000_000 * workers
+    updates = []
+    for user_id in range(base, base + users):
+        updates.append(fake.callback_update(user_id, 'deposit'))
+        updates.append(fake.message_update(user_id, photo=True))
+
+    start = time.perf_counter()
+    for raw in updates:
+        update = types.Update.de_json(raw)
+        pool.put(dispatch.update_user_id(update), (time.perf_counter(), update))
+    pool.join()
+    elapsed = time.perf_counter() - start
+    pool.stop()
+    main.outbox.join()
+
+    confirmed = sum(1 for _, method, chat_id, params in fake.sent
+                    if method == 'sendMessage' and chat_id is not None and chat_id >= base
+                    and params.get('text', '').startswith('Скриншот отправлен'))
+    print(f"потоков: {workers:>3}  {len(updates) / elapsed:>8.1f} апдейтов/сек  "
+          f"p50 {percentile(latencies, 50) * 1000:>7.1f} мс  p99 {percentile(latencies, 99) * 1000:>7.1f} мс  "
+          f"завершённых сценариев: {confirmed}/{users}")
+
+
+def main():
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    with tempfile.TemporaryDirectory() as tmp:
+        fake = FakeTelegram().start().install()
+        bot_main = load_main(os.path.join(tmp, 'users.db'))
+        unlimited(bot_main.outbox)
+        for count in sorted({1, workers}):
+            run(bot_main, fake, users, count)
+        fake.stop()
+
+
+if __name__ == '__main__':
+    main()
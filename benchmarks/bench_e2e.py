@@ -0,0 +1,306 @@
+# Сквозной нагрузочный тест: main.py работает как в бою (polling, пул обработки, очередь отправки)
+# против заглушки Bot API. Каждый пользователь проходит один и тот же сценарий: /start, пополнение баланса
+# скриншотом, покупка голды, продажа голды со скриншотом скина, вывод денег и вывод голды. Админ реагирует
+# на присланные ему заявки так, как нажимал бы кнопки: зачисляет баланс, подтверждает продажу скриншотом,
+# отмечает выводы выполненными. Следующий шаг пользователь отправляет, только получив ответ на предыдущий.
+#
+# Считается: пропускная способность (апдейтов и сценариев в секунду), p50/p95/p99 задержки каждого шага
+# (от отправки апдейта до ответа бота), SQL-запросы и вызовы API на сценарий, прирост памяти.
+# Сценарий детерминирован, поэтому результат можно сохранить (--save) и сравнить с ним следующий прогон
+# (--baseline).
+# Запуск: python benchmarks/bench_e2e.py [--users 200] [--concurrency 50] [--workers 8] [--save base.json]
+import argparse
+import gc
+import json
+import os
+import re
+import resource
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import dispatch
+import metrics
+from fake_telegram import FakeTelegram, load_main, percentile, unlimited
+
+# Шаг сценария: (название, что отправляет пользователь, чьё сообщение ждём, начало текста ответа).
+# Отправка None — шаг выполняет админ, пользователь только ждёт результата
+FLOW = (
+    ('start', ('text', '/start'), 'user', 'Выберите действие'),
+    ('deposit', ('callback', 'deposit'), 'user', 'Для пополнения баланса'),
+    ('deposit_screenshot', ('photo', None), 'user', 'Скриншот отправлен администратору'),
+    ('deposit_approved', None, 'admin', 'Баланс и голда для пользователя с ID {user_id} обновлены'),
+    ('buy', ('callback', 'buy'), 'user', 'Введите количество голды для покупки'),
+    ('buy_amount', ('text', '100'), 'user', 'Покупка успешна'),
+    ('sell', ('callback', 'sell'), 'user', 'Введите количество голды для продажи'),
+    ('sell_amount', ('text', '50'), 'user', 'Вы продаете'),
+    ('sell_screenshot', ('photo', None), 'user', 'Заявка на продажу голды отправлена'),
+    ('sell_approved', None, 'user', 'Скин готов к покупке'),
+    ('withdraw_money', ('callback', 'withdraw_money'), 'user', 'Введите сумму и номер телефона'),
+    ('withdraw_money_amount', ('text', '100 +79990000000'), 'user', 'Заявка на вывод отправлена'),
+    ('withdraw_money_approved', None, 'user', 'Ваша заявка на вывод денег успешно обработана'),
+    ('withdraw_gold', ('callback', 'withdraw_gold'), 'user', 'Введите количество голды для вывода'),
+    ('withdraw_gold_amount', ('text', '100'), 'user', 'Пожалуйста, отправьте скриншот подтверждения'),
+    ('withdraw_gold_screenshot', ('photo', None), 'user', 'Заявка на вывод отправлена'),
+    ('withdraw_gold_approved', None, 'user', 'Ваша заявка на вывод голды успешно обработана'),
+)
+REPLY_METHODS = ('sendMessage', 'sendPhoto', 'editMessageText')
+FIRST_USER_ID = 1_000_000
+
+_user_in_text = re.compile(r'(?:@user|с ID )(\d+)')
+_confirm_sale = re.compile(r'^confirm_sale_\d+$')
+_accept_request = re.compile(r'^handle_request_\d+_accept$')
+
+
+def reply_text(params):
+    return params.get('text') or params.get('caption') or ''
+
+
+def buttons(params):
+    markup = params.get('reply_markup')
+    if not markup:
+        return []
+    if isinstance(markup, str):
+        markup = json.loads(markup)
+    return [button.get('callback_data', '') for row in markup.get('inline_keyboard', []) for button in row]
+
+
+class LoadTest:
+    def __init__(self, fake, admin_id, users, concurrency):
+        self.fake = fake
+        self.admin_id = admin_id
+        self.waiting = list(range(FIRST_USER_ID + users - 1, FIRST_USER_ID - 1, -1))
+        self.concurrency = concurrency
+        self.steps = {}  # user_id -> [номер шага, время отправки, время начала сценария]
+        self.latencies = {name: [] for name, *_ in FLOW}
+        self.flow_seconds = []
+        self.pushed = 0
+        self.handled = set()  # заявки, которые админ уже обработал
+        self.lock = threading.Lock()
+        self.done = threading.Event()
+
+    def update(self, user_id, kind, value):
+        if kind == 'callback':
+            return self.fake.callback_update(user_id, value)
+        return self.fake.message_update(user_id, value, photo=kind == 'photo')
+
+    def push(self, *updates):
+        self.pushed += len(updates)
+        self.fake.push(*updates)
+
+    def start(self):
+        with self.lock:
+            for _ in range(min(self.concurrency, len(self.waiting))):
+                self._begin(self.waiting.pop())
+
+    def _begin(self, user_id):
+        now = time.perf_counter()
+        self.steps[user_id] = [0, now, now]
+        self._send(user_id)
+
+    def _send(self, user_id):
+        send = FLOW[self.steps[user_id][0]][1]
+        if send is not None:
+            self.push(self.update(user_id, *send))
+
+    def on_sent(self, method, chat_id, params):
+        if method not in REPLY_METHODS:
+            return
+        text = reply_text(params)
+        with self.lock:
+            if chat_id == self.admin_id:
+                match = _user_in_text.search(text)
+                if match is None:
+                    return
+                user_id = int(match.group(1))
+                self._admin(user_id, text, buttons(params))
+            else:
+                user_id = chat_id
+            self._advance(user_id, 'admin' if chat_id == self.admin_id else 'user', text)
+
+    def _admin(self, user_id, text, data):
+        # Админ сразу нажимает кнопку подтверждения; время шага ожидания отсчитывается от нажатия
+        if user_id not in self.steps:
+            return
+        if 'хочет пополнить баланс' in text and ('deposit', user_id) not in self.handled:
+            self.handled.add(('deposit', user_id))
+            self.steps[user_id][1] = time.perf_counter()
+            self.push(self.fake.callback_update(self.admin_id, 'change_balance_gold'),
+                      self.fake.message_update(self.admin_id, f'{user_id} 1000 0'))
+        for callback_data in data:
+            if (_confirm_sale.match(callback_data) or _accept_request.match(callback_data)) \
+                    and callback_data not in self.handled:
+                self.handled.add(callback_data)
+                self.steps[user_id][1] = time.perf_counter()
+                updates = [self.fake.callback_update(self.admin_id, callback_data)]
+                if callback_data.startswith('confirm_sale_'):
+                    updates.append(self.fake.message_update(self.admin_id, photo=True))
+                self.push(*updates)
+
+    def _advance(self, user_id, chat, text):
+        state = self.steps.get(user_id)
+        if state is None:
+            return
+        name, _, expected_chat, prefix = FLOW[state[0]]
+        if chat != expected_chat or not text.startswith(prefix.format(user_id=user_id)):
+            return
+        now = time.perf_counter()
+        self.latencies[name].append(now - state[1])
+        state[0] += 1
+        state[1] = now
+        if state[0] < len(FLOW):
+            self._send(user_id)
+            return
+        self.flow_seconds.append(now - state[2])
+        del self.steps[user_id]
+        if self.waiting:
+            self._begin(self.waiting.pop())
+        elif not self.steps:
+            self.done.set()
+
+    def stuck(self):
+        with self.lock:
+            counts = {}
+            for step, *_ in self.steps.values():
+                counts[FLOW[step][0]] = counts.get(FLOW[step][0], 0) + 1
+            return counts
+
+
+def rss_bytes():
+    # Текущий RSS из /proc, где его нет — пиковый из getrusage
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        scale = 1 if sys.platform == 'darwin' else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+def db_statements():
+    with metrics._lock:
+        return {values[0]: series[-1] for values, series in metrics.DB_SECONDS.values.items()}
+
+
+def run(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        fake = FakeTelegram(latency=args.latency, file_latency=args.latency).start().install()
+        if args.telegram_limits:
+            fake.limit()
+        bot_main = load_main(os.path.join(tmp, 'users.db'))
+        if not args.telegram_limits:
+            unlimited(bot_main.outbox)
+        bot = bot_main.bot
+        dispatch.attach(bot, args.workers, bot_main.register_users)
+        poller = threading.Thread(target=bot.polling, kwargs={'non_stop': True, 'interval': 0, 'timeout': 5,
+                                                               'long_polling_timeout': 1}, daemon=True)
+        poller.start()
+
+        test = LoadTest(fake, bot_main.ADMIN_ID, args.users, args.concurrency)
+        fake.listeners.append(test.on_sent)
+        gc.collect()
+        if args.tracemalloc:
+            tracemalloc.start()
+        rss_before, statements_before = rss_bytes(), db_statements()
+        start = time.perf_counter()
+        test.start()
+        finished = test.done.wait(args.timeout)
+        elapsed = time.perf_counter() - start
+        bot_main.outbox.join()
+        gc.collect()
+        rss_after, statements_after = rss_bytes(), db_statements()
+        heap = tracemalloc.get_traced_memory()[0] if args.tracemalloc else None
+        if args.tracemalloc:
+            tracemalloc.stop()
+        with fake.sent_lock:
+            api_calls = len(fake.sent)
+        bot.stop_polling()
+        poller.join(5)
+        fake.stop()
+
+    flows = len(test.flow_seconds)
+    statements = {op: count - statements_before.get(op, 0) for op, count in statements_after.items()}
+    return {
+        'settings': {'users': args.users, 'concurrency': args.concurrency, 'workers': args.workers,
+                     'latency': args.latency, 'telegram_limits': args.telegram_limits},
+        'completed': flows,
+        'stuck': {} if finished else test.stuck(),
+        'seconds': elapsed,
+        'updates_per_second': test.pushed / elapsed,
+        'flows_per_second': flows / elapsed,
+        'flow_ms': {p: percentile(test.flow_seconds, p) * 1000 for p in (50, 95, 99)},
+        'steps_ms': {name: {p: percentile(values, p) * 1000 for p in (50, 95, 99)}
+                     for name, values in test.latencies.items()},
+        'db_per_flow': {op: count / max(flows, 1) for op, count in sorted(statements.items()) if count},
+        'api_per_flow': api_calls / max(flows, 1),
+        'rss_growth_kb_per_user': (rss_after - rss_before) / 1024 / args.users,
+        'heap_kb_per_user': heap / 1024 / args.users if heap is not None else None,
+    }
+
+
+def delta(value, base):
+    if base is None or not base:
+        return ''
+    return f' ({(value - base) / base:+.0%})'
+
+
+def report(result, baseline=None):
+    base = baseline or {}
+    settings = result['settings']
+    print(f"пользователей: {settings['users']}, одновременно: {settings['concurrency']}, "
+          f"потоков: {settings['workers']}, задержка API: {settings['latency'] * 1000:.0f} мс, "
+          f"лимиты Telegram: {'да' if settings['telegram_limits'] else 'нет'}")
+    print(f"завершено сценариев: {result['completed']}/{settings['users']} за {result['seconds']:.2f} с")
+    if result['stuck']:
+        print(f"не завершены (на каком шаге): {result['stuck']}")
+    for key, title in (('updates_per_second', 'апдейтов/сек'), ('flows_per_second', 'сценариев/сек')):
+        print(f"{title:<16} {result[key]:>10.1f}{delta(result[key], base.get(key))}")
+
+    print(f"\n{'шаг':<26} {'p50, мс':>9} {'p95, мс':>9} {'p99, мс':>9}")
+    rows = [('весь сценарий', result['flow_ms'], base.get('flow_ms', {}))]
+    rows += [(name, values, base.get('steps_ms', {}).get(name, {})) for name, values in result['steps_ms'].items()]
+    for name, values, base_values in rows:
+        print(f"{name:<26}" + ''.join(f" {values[p]:>9.1f}" for p in values))
+        if base_values:
+            print(f"{'  база':<26}" + ''.join(f" {base_values[p]:>9.1f}" for p in base_values))
+
+    print(f"\nSQL-запросов на сценарий: {sum(result['db_per_flow'].values()):.1f}"
+          f"{delta(sum(result['db_per_flow'].values()), sum(base.get('db_per_flow', {}).values()))}  "
+          + ', '.join(f"{op} {count:.1f}" for op, count in result['db_per_flow'].items()))
+    print(f"вызовов API на сценарий: {result['api_per_flow']:.1f}{delta(result['api_per_flow'], base.get('api_per_flow'))}")
+    print(f"прирост RSS на пользователя: {result['rss_growth_kb_per_user']:.1f} КБ")
+    if result['heap_kb_per_user'] is not None:
+        print(f"прирост кучи Python на пользователя: {result['heap_kb_per_user']:.1f} КБ")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=50, help='сколько сценариев идут одновременно')
+    parser.add_argument('--workers', type=int, default=8, help='потоков в пуле обработки апдейтов')
+    parser.add_argument('--latency', type=float, default=0.01, help='задержка ответа заглушки Bot API, с')
+    parser.add_argument('--telegram-limits', action='store_true',
+                        help='оставить лимиты очереди отправки и включить 429 в заглушке')
+    parser.add_argument('--tracemalloc', action='store_true', help='мерить прирост кучи (замедляет прогон)')
+    parser.add_argument('--timeout', type=float, default=600)
+    parser.add_argument('--save', help='сохранить результат в JSON')
+    parser.add_argument('--baseline', help='сравнить с сохранённым результатом')
+    args = parser.parse_args()
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    result = run(args)
+    report(result, baseline)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
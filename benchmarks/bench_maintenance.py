@@ -0,0 +1,90 @@
+# Обслуживание базы (maintenance.py) на накопленной истории: N заявок за последние 90 дней, из них доля
+# --pending так и осталась незакрытой. До и после задач обслуживания меряются запросы, которые бот выполняет
+# на каждое открытие панели: очередь заявок админа, сводка массовой обработки, число ожидающих заявок (метрика),
+# а также размер requests и файла базы. Для задач — время и число обработанных строк.
+# Запуск: python benchmarks/bench_maintenance.py [--requests 500000] [--pending 0.1]
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import db
+import maintenance
+from fake_telegram import load_main
+
+DAY = 24 * 60 * 60
+TYPES = ('withdraw_gold', 'withdraw_money', 'sell_gold', 'deposit_gold')
+CLOSED = ('completed', 'completed', 'rejected', 'cancelled')
+
+
+def seed(requests, users, pending, batch=50000):
+    rng = random.Random(1)
+    now = time.time()
+    with db.transaction() as conn:
+        conn.executemany("INSERT INTO users (id, name, balance, gold) VALUES (?, ?, 0, 0)",
+                         ((i, f'user{i}') for i in range(1, users + 1)))
+    for start in range(0, requests, batch):
+        rows = []
+        for _ in range(start, min(requests, start + batch)):
+            status = 'pending' if rng.random() < pending else rng.choice(CLOSED)
+            rows.append((rng.randint(1, users), rng.choice(TYPES), rng.randint(100, 10000), status,
+                         'x' * rng.randint(20, 80), now - rng.random() * 90 * DAY))
+        with db.transaction() as conn:
+            conn.executemany("INSERT INTO requests (user_id, request_type, amount, status, details, updated_at) "
+                             "VALUES (?, ?, ?, ?, ?, ?)", rows)
+    db.execute("ANALYZE")
+
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def file_mb(path):
+    db.fetchall("PRAGMA wal_checkpoint(TRUNCATE)")
+    return os.path.getsize(path) / 2 ** 20
+
+
+def measure(title, bot_main, db_path, repeat):
+    pending_count = lambda: db.fetchone("SELECT COUNT(*) FROM requests WHERE status = 'pending'")
+    print(f"{title:<8} {timed(bot_main.render_admin_panel, repeat):>12.2f} {timed(bot_main.render_bulk, repeat):>12.2f} "
+          f"{timed(pending_count, repeat):>10.2f} {db.fetchone('SELECT COUNT(*) FROM requests')[0]:>10} "
+          f"{db.fetchone('SELECT COUNT(*) FROM requests WHERE status = ?', ('pending',))[0]:>9} "
+          f"{file_mb(db_path):>9.1f}", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=500000)
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--pending', type=float, default=0.1, help='доля заявок, оставшихся незакрытыми')
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'users.db')
+        bot_main = load_main(db_path)
+        seed(args.requests, args.users, args.pending)
+        print(f"заявок: {args.requests}, незакрытых: {args.pending:.0%}, срок заявки: "
+              f"{maintenance.REQUEST_TTL // DAY} дн., в архив через {maintenance.ARCHIVE_AFTER // DAY} дн.")
+        print(f"{'':<8} {'панель, мс':>12} {'сводка, мс':>12} {'метрика, мс':>10} {'в requests':>10} "
+              f"{'pending':>9} {'база, МБ':>9}")
+        measure('до', bot_main, db_path, args.repeat)
+        print(f"{'задача':<10} {'время, с':>9} {'строк':>9}")
+        for name, job in maintenance.jobs():
+            start = time.perf_counter()
+            rows = maintenance.run_job(name, job)
+            print(f"{name:<10} {time.perf_counter() - start:>9.2f} {rows or 0:>9}", flush=True)
+        measure('после', bot_main, db_path, args.repeat)
+        db.close_connection()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+# Отправка через очередь outbox.Outbox против прямых вызовов Bot API при лимитах, как у Telegram
+# (заглушка отвечает 429 сверх 30 сообщений в секунду на бота и ~1 в секунду на чат).
+# Нагрузка: ответы пользователям по 3 сообщения подряд и подтверждения покупок админом
+# (сообщение покупателю, сообщение админу, обновление админ-панели).
+# Запуск: python benchmarks/bench_outbox.py [действий пользователей] [подтверждений] [потоков-обработчиков]
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from telebot import TeleBot
+
+from fake_telegram import FakeTelegram, load_main, percentile
+
+
+def workload(user_actions, approvals, admin_id):
+    actions = [('user', 1000 + i) for i in range(user_actions)]
+    step = max(1, user_actions // max(1, approvals))
+    for i in range(approvals):
+        actions.insert(min(len(actions), i * (step + 1)), ('approve', 2000 + i))
+    return actions
+
+
+def run(actions, handler, threads):
+    lock = threading.Lock()
+    items = iter(actions)
+
+    def worker():
+        while True:
+            with lock:
+                action = next(items, None)
+            if action is None:
+                return
+            handler(*action)
+
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+
+
+def main():
+    user_actions = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    approvals = int(sys.argv[2]) if len(sys.argv) > 2 else 30
+    threads = int(sys.argv[3]) if len(sys.argv) > 3 else 8
+    with tempfile.TemporaryDirectory() as tmp:
+        fake = FakeTelegram(latency=0.02).start().install().limit()
+        bot_main = load_main(os.path.join(tmp, 'users.db'))
+        bot, admin_id, outbox = bot_main.bot, bot_main.ADMIN_ID, bot_main.outbox
+        actions = workload(user_actions, approvals, admin_id)
+
+        def direct(kind, chat_id):
+            lost = 0
+            calls = [(TeleBot.send_message, (bot, chat_id, 'ответ')) for _ in range(3)] if kind == 'user' else [
+                (TeleBot.send_message, (bot, chat_id, 'Покупка подтверждена')),
+                (TeleBot.send_message, (bot, admin_id, 'Покупка подтверждена, баланс обновлён.')),
+                (bot_main.panel.show, (admin_id,))]
+            for fn, args in calls:
+                start = time.perf_counter()
+                try:
+                    fn(*args)
+                except Exception:
+                    lost += 1
+                    continue
+                if args[0] == admin_id or args[1] == admin_id:
+                    admin_latency.append(time.perf_counter() - start)
+            with counters_lock:
+                counters['lost'] += lost
+
+        def queued(kind, chat_id):
+            start = time.perf_counter()
+            if kind == 'user':
+                futures = [bot.send_message(chat_id, 'ответ') for _ in range(3)]
+            else:
+                futures = [bot.send_message(chat_id, 'Покупка подтверждена')]
+                for future in (bot.send_message(admin_id, 'Покупка подтверждена, баланс обновлён.'),
+                               bot_main.admin_panel(admin_id)):
+                    future.add_done_callback(lambda f: admin_latency.append(time.perf_counter() - start))
+                    futures.append(future)
+            for future in futures:
+                future.add_done_callback(count_lost)
+
+        def count_lost(future):
+            if future.exception() is not None:
+                with counters_lock:
+                    counters['lost'] += 1
+
+        print(f"действий: {len(actions)}, потоков-обработчиков: {threads}")
+        print(f"{'режим':<10} {'время, с':>9} {'доставлено':>11} {'потеряно':>9} {'429':>5} {'сообщ./с':>9} "
+              f"{'админ p50, мс':>14} {'p99, мс':>8} {'панелей':>8}")
+        for name, handler in (('напрямую', direct), ('очередь', queued)):
+            counters, counters_lock, admin_latency = {'lost': 0}, threading.Lock(), []
+            fake.sent.clear()
+            fake.rejected = 0
+            fake.limit()
+            start = time.perf_counter()
+            run(actions, handler, threads)
+            if handler is queued:
+                outbox.join()
+            elapsed = time.perf_counter() - start
+            delivered = len(fake.sent)
+            panels = sum(1 for entry in fake.sent if entry[1] in ('editMessageText', 'sendMessage')
+                         and entry[3].get('text', '').startswith('Пользователи'))
+            print(f"{name:<10} {elapsed:>9.2f} {delivered:>11} {counters['lost']:>9} {fake.rejected:>5} "
+                  f"{delivered / elapsed:>9.1f} {percentile(admin_latency, 50) * 1000:>14.0f} "
+                  f"{percentile(admin_latency, 99) * 1000:>8.0f} {panels:>8}")
+            time.sleep(3)  # ведра заглушки наполняются заново
+        print(f"повторов после 429: {outbox.retried}, слито обновлений панели: {outbox.coalesced}")
+        fake.stop()
+
+
+if __name__ == '__main__':
+    main()
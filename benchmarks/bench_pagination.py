@@ -0,0 +1,52 @@
+# Стоимость страницы N админ-панели: LIMIT/OFFSET против курсора по id.
+# Запуск: python benchmarks/bench_pagination.py [пользователей] [заявок в очереди]
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import db
+from fake_telegram import FakeTelegram, load_main
+
+RUNS = 50
+
+
+def timed(fn):
+    start = time.perf_counter()
+    for _ in range(RUNS):
+        fn()
+    return (time.perf_counter() - start) / RUNS * 1000
+
+
+def main():
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    pending = int(sys.argv[2]) if len(sys.argv) > 2 else 100_000
+    with tempfile.TemporaryDirectory() as tmp:
+        fake = FakeTelegram(latency=0).start().install()
+        bot_main = load_main(os.path.join(tmp, 'users.db'))
+        with db.transaction() as conn:
+            conn.executemany("INSERT INTO users (id, name, balance, gold) VALUES (?, ?, 0, 0)",
+                             ((i, f'user{i}') for i in range(1, users + 1)))
+            conn.executemany("INSERT INTO requests (user_id, request_type, amount, status, details) VALUES (?, ?, 100, 'pending', '')",
+                             ((i % users + 1, ('sell_gold', 'deposit_gold')[i % 2]) for i in range(pending)))
+        db.execute("ANALYZE")
+
+        per_page = bot_main.USERS_PER_PAGE
+        print(f"{'страница':>9} {'OFFSET, мс':>11} {'курсор, мс':>11} {'панель, мс':>11}")
+        for page in (0, 10, 1000, users // per_page // 2, users // per_page - 1):
+            cursor = page * per_page  # id пользователей идут подряд с 1
+            offset = timed(lambda: db.fetchall("SELECT id, name, balance, gold FROM users LIMIT ? OFFSET ?",
+                                               (per_page, page * per_page)))
+            keyset = timed(lambda: db.fetchall("SELECT id, name, balance, gold FROM users WHERE id > ? ORDER BY id LIMIT ?",
+                                               (cursor, per_page + 1)))
+            queue_cursor = min(cursor, pending - 1)
+            panel = timed(lambda: bot_main.render_admin_panel(cursor, queue_cursor))
+            print(f"{page:>9} {offset:>11.3f} {keyset:>11.3f} {panel:>11.3f}")
+        fake.stop()
+
+
+if __name__ == '__main__':
+    main()
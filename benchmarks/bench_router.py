@@ -0,0 +1,102 @@
+# Стоимость выбора обработчика кнопки: старая цепочка if/elif (с обязательным get_or_register_user)
+# против таблицы маршрутов router.Router (пользователь загружается только для маршрутов с user=True).
+# Запуск: python benchmarks/bench_router.py [повторов]
+import os
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_telegram import load_main
+
+SAMPLES = ['back', 'sell', 'buy', 'profile', 'withdraw_gold', 'withdraw_money', 'deposit', 'admin_panel',
+           'next_10_0', 'prev_11_0', 'queue_0_25', 'change_balance_gold', 'handle_request_42_accept',
+           'buy_skin_7_42_160.0', 'cancel_skin_sale_7_42', 'confirm_sale_42', 'reject_sale_42',
+           'finalize_purchase_7_42_160.0', 'dispute_purchase_42', 'confirm_purchase_7_42_160.0',
+           'confirm_deposit_gold_42', 'reject_deposit_gold_42']
+
+
+def old_match(data):
+    # Порядок проверок как в прежнем callback_query
+    if data == "back":
+        return 0
+    elif data == "sell":
+        return 1
+    elif data == "buy":
+        return 2
+    elif data == "profile":
+        return 3
+    elif data == "withdraw_gold":
+        return 4
+    elif data == "withdraw_money":
+        return 5
+    elif data == "deposit":
+        return 6
+    elif data == "admin_panel":
+        return 7
+    elif data.startswith(('next_', 'prev_', 'queue_')):
+        return data.split('_')
+    elif data == "change_balance_gold":
+        return 9
+    elif data.startswith("handle_request_"):
+        return data.split('_')[2:]
+    elif data.startswith("buy_skin_"):
+        return data.split('_')[2:]
+    elif data.startswith("cancel_skin_sale_"):
+        return data.split('_')[3:]
+    elif data.startswith("confirm_sale_"):
+        return data.split('_')[2]
+    elif data.startswith("reject_sale_"):
+        return data.split('_')[2]
+    elif data.startswith("finalize_purchase_"):
+        return data.split('_')[2:]
+    elif data.startswith("dispute_purchase_"):
+        return data.split('_')[2]
+    elif data.startswith("confirm_purchase_"):
+        return data.split('_')[2:]
+    elif data.startswith("confirm_deposit_gold_"):
+        return data.split('_')[3]
+    elif data.startswith("reject_deposit_gold_"):
+        return data.split('_')[3]
+
+
+def per_call_us(fn, runs):
+    start = time.perf_counter()
+    for _ in range(runs):
+        fn()
+    return (time.perf_counter() - start) / runs * 1e6
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    with tempfile.TemporaryDirectory() as tmp:
+        bot_main = load_main(os.path.join(tmp, 'users.db'))
+        router = bot_main.router
+        call = SimpleNamespace(from_user=SimpleNamespace(id=7, username='user7'))
+        bot_main.get_or_register_user(7, 'user7')
+
+        def old(data):
+            bot_main.get_or_register_user(call.from_user.id, call.from_user.username)
+            old_match(data)
+
+        def new(data):
+            route, args = router.resolve(data)
+            if route.user:
+                router.load_user(call)
+
+        print(f"{'callback_data':<30} {'if/elif, мкс':>13} {'без БД, мкс':>12} {'router, мкс':>12}")
+        totals = [0, 0, 0]
+        for data in SAMPLES:
+            row = (per_call_us(lambda: old(data), runs), per_call_us(lambda: old_match(data), runs),
+                   per_call_us(lambda: new(data), runs))
+            totals = [total + value for total, value in zip(totals, row)]
+            print(f"{data:<30} {row[0]:>13.2f} {row[1]:>12.2f} {row[2]:>12.2f}")
+        print(f"{'в среднем':<30} " + ' '.join(f"{total / len(SAMPLES):>{width}.2f}"
+                                               for total, width in zip(totals, (13, 12, 12))))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+# Холодный старт: время от запуска процесса python до первого ответа бота на /start (polling против заглушки
+# Bot API), отдельно — время импорта main.py и число запросов к базе, сделанных при импорте.
+# Прогоны: новая база (миграции с нуля), готовая база текущей версии и готовая база, в которую в это время
+# пишет другой процесс одной долгой транзакцией (например, dump.py import). Первый ответ в этом случае всё равно
+# ждёт конца записи — регистрация пользователя пишет в базу, — но импорт не должен. Нижняя граница — запуск
+# интерпретатора с import telebot. Каждый прогон — в новом процессе, в таблице медиана по --runs прогонам.
+# Запуск: python benchmarks/bench_startup.py [--runs 10]
+import argparse
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_telegram import FakeTelegram, percentile
+
+SCENARIOS = (
+    ('import telebot', 'telebot'),
+    ('новая база', 'fresh'),
+    ('готовая база', 'ready'),
+    ('идёт запись', 'busy'),
+)
+
+
+def child(args):
+    # Процесс бота: импорт main.py, затем polling до первого ответа (процесс завершает родитель)
+    start = time.perf_counter()
+    if args.single == 'telebot':
+        import telebot  # noqa: F401
+        print(f"{(time.perf_counter() - start) * 1000:.1f} 0", flush=True)
+        return
+    from fake_telegram import load_main
+    bot_main = load_main(args.db)
+    import db
+    import dispatch
+    import metrics
+    from telebot import apihelper
+    imported = time.perf_counter()
+    with metrics._lock:
+        queries = sum(series[-1] for series in metrics.DB_SECONDS.values.values())
+    print(f"{(imported - start) * 1000:.1f} {queries}", flush=True)
+    apihelper.API_URL = args.url + '/bot{0}/{1}'
+    apihelper.FILE_URL = args.url + '/file/bot{0}/{1}'
+    dispatch.attach(bot_main.bot, bot_main.WORKERS, bot_main.register_users)
+    bot_main.bot.polling(non_stop=True, interval=0, timeout=5, long_polling_timeout=1)
+    db.close_connection()
+
+
+def prepare(db_path):
+    # Готовая база текущей версии: один раз импортируем main.py в отдельном процессе
+    subprocess.run([sys.executable, '-c', f"import sys; sys.path[:0] = {sys.path[:2]!r}; "
+                    f"from fake_telegram import load_main; import db; load_main({db_path!r}); "
+                    f"db.fetchone('SELECT 1')"], check=True)
+
+
+def hold_write_lock(db_path, seconds, started):
+    conn = sqlite3.connect(db_path, isolation_level=None, timeout=30)
+    conn.execute("BEGIN IMMEDIATE")
+    conn.execute("UPDATE counters SET value = value WHERE name = 'users'")
+    started.set()
+    time.sleep(seconds)
+    conn.execute("COMMIT")
+    conn.close()
+
+
+def run_once(scenario, fake, tmp, number, args):
+    db_path = os.path.join(tmp, f'{scenario}-{number}.db')
+    if scenario in ('ready', 'busy'):
+        prepare(db_path)
+    writer = None
+    if scenario == 'busy':
+        started = threading.Event()
+        writer = threading.Thread(target=hold_write_lock, args=(db_path, args.busy_seconds, started), daemon=True)
+        writer.start()
+        started.wait()
+    user_id = number + 1
+    if scenario != 'telebot':
+        fake.push(fake.message_update(user_id, '/start'))
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--single', scenario, '--url', fake.url,
+                                '--db', db_path], stdout=subprocess.PIPE, text=True)
+    import_ms, queries = process.stdout.readline().split()
+    if scenario == 'telebot':
+        elapsed = time.perf_counter() - start
+    else:
+        while not fake.sent_to(user_id):
+            if time.perf_counter() - start > args.timeout:
+                break
+            time.sleep(0.001)
+        elapsed = time.perf_counter() - start
+    process.terminate()
+    process.wait()
+    if writer is not None:
+        writer.join()
+    return float(import_ms), int(queries), elapsed * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--busy-seconds', type=float, default=3, help='сколько пишет другой процесс в прогоне «идёт запись»')
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--single', help=argparse.SUPPRESS)
+    parser.add_argument('--url', help=argparse.SUPPRESS)
+    parser.add_argument('--db', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        child(args)
+        return
+    print(f"прогонов: {args.runs}")
+    print(f"{'запуск':<16} {'импорт, мс':>11} {'запросов к базе':>16} {'до ответа, мс':>14} {'p95, мс':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        fake = FakeTelegram(latency=0, file_latency=0)
+        fake.server.handle_error = lambda request, address: None  # обрыв соединения при завершении процесса бота
+        fake.start()
+        for index, (title, scenario) in enumerate(SCENARIOS):
+            # У каждого прогона свой пользователь, чтобы ответ одного прогона не засчитался другому
+            results = [run_once(scenario, fake, tmp, index * 1000 + number, args) for number in range(args.runs)]
+            imports, queries, totals = zip(*results)
+            print(f"{title:<16} {percentile(imports, 50):>11.0f} {max(queries):>16} "
+                  f"{percentile(totals, 50):>14.0f} {percentile(totals, 95):>9.0f}", flush=True)
+        fake.stop()
+
+
+if __name__ == '__main__':
+    main()
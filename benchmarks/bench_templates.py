@@ -0,0 +1,94 @@
+# Стоимость подготовки ответа без сети: главное меню и профиль так, как их собирал main.py раньше
+# (новая InlineKeyboardMarkup и её сериализация при каждой отправке, текст f-строкой), и через templates.py
+# (клавиатура собрана и сериализована один раз, текст — готовый шаблон). reply_markup сериализуется так же,
+# как в telebot при отправке (apihelper._convert_markup). Отдельно — строка очереди админ-панели
+# (кнопки с данными заявки) и выбор языка пользователя.
+# Запуск: python benchmarks/bench_templates.py [--repeat 20000]
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from telebot import apihelper
+from telebot.types import InlineKeyboardButton, InlineKeyboardMarkup
+
+import money
+import templates
+
+templates.keyboard('main_menu', ['sell'], ['buy'], ['profile'])
+templates.keyboard('profile', ['withdraw_gold'], ['withdraw_money'], ['deposit'], ['back'])
+
+BALANCE, GOLD, AMOUNT = 123456, 500, 1500
+
+
+def inline_menu():
+    keyboard = InlineKeyboardMarkup()
+    keyboard.row(InlineKeyboardButton("Продать голду 💰", callback_data='sell'))
+    keyboard.row(InlineKeyboardButton("Купить голду 🛒", callback_data='buy'))
+    keyboard.row(InlineKeyboardButton("Профиль 👤", callback_data='profile'))
+    return "Выберите действие:", apihelper._convert_markup(keyboard)
+
+
+def template_menu():
+    loc = templates.locale('ru')
+    return loc.text('choose_action'), apihelper._convert_markup(loc.keyboard('main_menu'))
+
+
+def inline_profile():
+    keyboard = InlineKeyboardMarkup()
+    keyboard.row(InlineKeyboardButton("Вывести голду 💸", callback_data='withdraw_gold'))
+    keyboard.row(InlineKeyboardButton("Вывести деньги 💳", callback_data='withdraw_money'))
+    keyboard.row(InlineKeyboardButton("Пополнить баланс 🔄", callback_data='deposit'))
+    keyboard.add(InlineKeyboardButton("В главное меню 🔙", callback_data='back'))
+    text = f"Профиль:\nID: 42\nИмя: @user42\nБаланс: {money.rub(BALANCE)}\nГолда: {GOLD}"
+    return text, apihelper._convert_markup(keyboard)
+
+
+def template_profile():
+    loc = templates.locale('ru')
+    text = loc.text('profile', id=42, name='user42', balance=money.rub(BALANCE), gold=GOLD)
+    return text, apihelper._convert_markup(loc.keyboard('profile'))
+
+
+def inline_row():
+    return (InlineKeyboardButton(f"Подтвердить продажу {AMOUNT} голды от @42 ✅", callback_data='confirm_sale_7'),
+            InlineKeyboardButton(f"Отклонить продажу {AMOUNT} голды от @42 ❌", callback_data='reject_sale_7'))
+
+
+def template_row():
+    loc = templates.locale()
+    return (loc.button('confirm_sale_row', 'confirm_sale_7', amount=AMOUNT, user_id=42),
+            loc.button('reject_sale_row', 'reject_sale_7', amount=AMOUNT, user_id=42))
+
+
+def timed(fn, repeat):
+    fn()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=20000)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    templates.locale('ru')
+    print(f"загрузка locales/ru.json: {(time.perf_counter() - start) * 1000:.2f} мс (один раз на процесс)")
+    assert inline_menu() == template_menu() and inline_profile() == template_profile()
+    assert [b.to_dict() for b in inline_row()] == [b.to_dict() for b in template_row()]
+    print(f"{'ответ':<22} {'f-строка и сборка, мкс':>24} {'templates, мкс':>15} {'ускорение':>10}")
+    for title, inline, template in (('главное меню', inline_menu, template_menu),
+                                    ('профиль', inline_profile, template_profile),
+                                    ('строка очереди панели', inline_row, template_row)):
+        before, after = timed(inline, args.repeat), timed(template, args.repeat)
+        print(f"{title:<22} {before:>24.2f} {after:>15.2f} {before / after:>9.1f}x", flush=True)
+    print(f"выбор языка по language_code: {timed(lambda: templates.locale('en-US'), args.repeat):.3f} мкс")
+
+
+if __name__ == '__main__':
+    main()
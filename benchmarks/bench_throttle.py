@@ -0,0 +1,108 @@
+# Спам кнопками: --spammers пользователей жмут «Продать голду» по --clicks раз подряд, часть нажатий приходит
+# повторно с тем же id callback_query (--redeliver), обычные пользователи в это время отправляют /start.
+# Апдейты идут пачками по 100, как из getUpdates, через dispatch.attach с throttle.Throttle и без него.
+# Считается время обработки, SQL-запросы, вызовы API, отброшенные апдейты по причинам и получили ли ответ
+# все обычные пользователи; отдельно — стоимость Throttle.filter на апдейт.
+# Запуск: python benchmarks/bench_throttle.py [--users 200] [--spammers 20] [--clicks 50]
+import argparse
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from telebot import types
+
+import dispatch
+import metrics
+from fake_telegram import FakeTelegram, load_main, unlimited
+from throttle import Throttle
+
+FIRST_SPAMMER = 1_000_000
+BATCH = 100
+
+
+def make_updates(fake, args):
+    rng = random.Random(1)
+    updates = [fake.message_update(user_id, '/start') for user_id in range(1, args.users + 1)]
+    for spammer in range(FIRST_SPAMMER, FIRST_SPAMMER + args.spammers):
+        for _ in range(args.clicks):
+            update = fake.callback_update(spammer, 'sell')
+            updates.append(update)
+            if rng.random() < args.redeliver:
+                updates.append(dict(update, update_id=fake.next_update_id()))
+    rng.shuffle(updates)
+    return [types.Update.de_json(update) for update in updates]
+
+
+def db_statements():
+    with metrics._lock:
+        return sum(series[-1] for series in metrics.DB_SECONDS.values.values())
+
+
+def run(mode, args):
+    with tempfile.TemporaryDirectory() as tmp:
+        fake = FakeTelegram(latency=0.001).start().install()
+        bot_main = load_main(os.path.join(tmp, 'users.db'))
+        unlimited(bot_main.outbox)
+        bot = bot_main.bot
+        updates = make_updates(fake, args)
+        throttle = Throttle(bot_main.USER_LIMIT, bot_main.CALLBACK_LIMIT) if mode == 'throttle' else None
+        pool = dispatch.attach(bot, args.workers, bot_main.register_users, throttle)
+        statements = db_statements()
+        start = time.perf_counter()
+        for index in range(0, len(updates), BATCH):
+            bot.process_new_updates(updates[index:index + BATCH])
+        pool.join()
+        bot_main.outbox.join()
+        elapsed = time.perf_counter() - start
+        statements = db_statements() - statements
+        answered = sum(1 for user_id in range(1, args.users + 1) if fake.sent_to(user_id))
+        with metrics._lock:
+            dropped = dict(metrics.UPDATES_DROPPED.values)
+        fake.stop()
+    drops = ', '.join(f"{reason[0]} {count}" for reason, count in sorted(dropped.items())) or '-'
+    print(f"{mode:<10} {len(updates):>8} {elapsed:>9.2f} {statements:>8} {len(fake.sent):>8} "
+          f"{answered:>6}/{args.users:<6} {drops}", flush=True)
+
+
+def filter_cost(args):
+    fake = FakeTelegram()
+    updates = make_updates(fake, args)
+    throttle = Throttle()
+    start = time.perf_counter()
+    for index in range(0, len(updates), BATCH):
+        throttle.filter(updates[index:index + BATCH])
+    return (time.perf_counter() - start) / len(updates) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--spammers', type=int, default=20)
+    parser.add_argument('--clicks', type=int, default=50)
+    parser.add_argument('--redeliver', type=float, default=0.2, help='доля нажатий, доставленных повторно')
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--single', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        run(args.single, args)
+        return
+    print(f"пользователей: {args.users}, спамеров: {args.spammers} по {args.clicks} нажатий, "
+          f"повторных доставок: {args.redeliver:.0%}")
+    print(f"{'режим':<10} {'апдейтов':>8} {'время, с':>9} {'SQL':>8} {'API':>8} {'ответ получили':>13}  отброшено")
+    # Каждый режим в отдельном процессе: main.py импортируется один раз на интерпретатор
+    for mode in ('без', 'throttle'):
+        subprocess.run([sys.executable, os.path.abspath(__file__), '--single', mode, '--users', str(args.users),
+                        '--spammers', str(args.spammers), '--clicks', str(args.clicks),
+                        '--redeliver', str(args.redeliver), '--workers', str(args.workers)], check=True)
+    print(f"Throttle.filter: {filter_cost(args):.2f} мкс на апдейт")
+
+
+if __name__ == '__main__':
+    main()
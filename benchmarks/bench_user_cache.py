@@ -0,0 +1,75 @@
+# Сколько чтений таблицы users приходится на одно взаимодействие без кеша users.py и с ним.
+# Сценарий пользователя: дважды открыть профиль, продать голду (кнопка, количество, скриншот скина),
+# вернуться в меню через /start и ещё раз открыть профиль.
+# Запуск: python benchmarks/bench_user_cache.py [пользователей]
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from telebot import TeleBot, types
+
+import db
+import users
+from fake_telegram import FakeTelegram, load_main, unlimited
+
+user_reads = 0
+
+
+def count_user_reads(statement):
+    global user_reads
+    if statement.lstrip().upper().startswith('SELECT') and ' FROM USERS' in statement.upper():
+        user_reads += 1
+
+
+def traced(get_connection):
+    def get_traced_connection():
+        conn = get_connection()
+        conn.set_trace_callback(count_user_reads)
+        return conn
+    return get_traced_connection
+
+
+def flow(fake, user_id):
+    return [fake.callback_update(user_id, 'profile'), fake.callback_update(user_id, 'profile'),
+            fake.callback_update(user_id, 'sell'), fake.message_update(user_id, '100'),
+            fake.message_update(user_id, photo=True),
+            fake.message_update(user_id, '/start'), fake.callback_update(user_id, 'profile')]
+
+
+def run(bot_main, fake, user_ids, cache_size):
+    global user_reads
+    users.CACHE_SIZE = cache_size
+    users.clear()
+    users.hits = users.misses = 0
+    updates = [types.Update.de_json(raw) for user_id in user_ids for raw in flow(fake, user_id)]
+    bot_main.register_users(updates)
+    user_reads = 0
+    start = time.perf_counter()
+    for update in updates:
+        TeleBot.process_new_updates(bot_main.bot, [update])
+    elapsed = time.perf_counter() - start
+    name = 'без кеша' if not cache_size else f'кеш {cache_size}'
+    print(f"{name:<12} {user_reads:>10} {user_reads / len(user_ids):>14.2f} {users.hit_ratio():>8.0%} {elapsed:>8.2f}")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    with tempfile.TemporaryDirectory() as tmp:
+        fake = FakeTelegram(latency=0).start().install()
+        bot_main = load_main(os.path.join(tmp, 'users.db'))
+        unlimited(bot_main.outbox)
+        db.get_connection = traced(db.get_connection)
+        cache_size = users.CACHE_SIZE
+        print(f"{'режим':<12} {'SELECT users':>10} {'на пользователя':>14} {'попадания':>8} {'время, с':>8}")
+        run(bot_main, fake, range(1_000_000, 1_000_000 + count), 0)
+        run(bot_main, fake, range(2_000_000, 2_000_000 + count), cache_size)
+        bot_main.outbox.join()
+        fake.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+# Задержка от приёма апдейта вебхуком до send_message на заглушке Bot API.
+# Новые пользователи параллельно покупают голду (кнопка «Купить» и ввод количества);
+# сравниваем регистрацию каждого пользователя в обработчике и общей записью на пачку апдейтов.
+# Запуск: python benchmarks/bench_webhook.py [пользователей] [потоков]
+import http.client
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import dispatch
+import webhook
+from fake_telegram import FakeTelegram, load_main, percentile, unlimited
+
+
+def run(main, fake, users, workers, on_batch):
+    received = {}
+    latencies = []
+    done = threading.Event()
+    lock = threading.Lock()
+
+    def on_sent(method, chat_id, params):
+        if method == 'sendMessage' and chat_id in received and params.get('text', '').startswith(('Покупка', 'Недостаточно')):
+            with lock:
+                latencies.append(time.perf_counter() - received.pop(chat_id))
+                if len(latencies) == len(users):
+                    done.set()
+
+    fake.listeners.append(on_sent)
+    pool = dispatch.KeyedWorkerPool(lambda update: type(main.bot).process_new_updates(main.bot, [update]), workers)
+    updates = webhook.UpdateQueue(pool, on_batch)
+    server = webhook.WebhookServer(('127.0.0.1', 0), updates.put)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address[:2]
+
+    def post(payload):
+        conn = http.client.HTTPConnection(host, port)
+        conn.request('POST', '/webhook', json.dumps(payload), {'Content-Type': 'application/json'})
+        conn.getresponse().read()
+        conn.close()
+
+    def user_flow(user_id):
+        post(fake.callback_update(user_id, 'buy'))
+        received[user_id] = time.perf_counter()
+        post(fake.message_update(user_id, '1'))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(32) as executor:
+        list(executor.map(user_flow, users))
+    done.wait(600)
+    elapsed = time.perf_counter() - start
+    name = 'запись пачкой' if on_batch else 'без пачек'
+    print(f"{name:<14} {len(users) / elapsed:>8.1f} покупок/сек  "
+          f"p50 {percentile(latencies, 50) * 1000:>7.1f} мс  p99 {percentile(latencies, 99) * 1000:>7.1f} мс  "
+          f"завершено: {len(latencies)}/{len(users)}")
+    server.shutdown()
+    server.server_close()
+    updates.stop()
+    pool.stop()
+    fake.listeners.remove(on_sent)
+
+
+def main():
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    with tempfile.TemporaryDirectory() as tmp:
+        fake = FakeTelegram(latency=0.005).start().install()
+        bot_main = load_main(os.path.join(tmp, 'users.db'))
+        unlimited(bot_main.outbox)
+        for base, on_batch in ((1_000_000, None), (2_000_000, bot_main.register_users)):
+            run(bot_main, fake, list(range(base, base + users)), workers, on_batch)
+        fake.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,332 @@
+# Локальная заглушка Telegram Bot API для нагрузочных тестов.
+# Отвечает на методы, которыми пользуется бот, с настраиваемой задержкой,
+# отдаёт апдейты через getUpdates и запоминает всё, что бот отправил.
+import collections
+import itertools
+import json
+import math
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+PHOTO_BYTES = b'\xff\xd8\xff' + b'\x00' * 64 * 1024
+LIMITED_METHODS = ('sendMessage', 'sendPhoto', 'editMessageText', 'editMessageReplyMarkup')
+
+_multipart_field = re.compile(rb'name="([^"]+)"\r\n\r\n([^\r]*)\r\n')
+
+
+class FakeTelegram:
+    def __init__(self, latency=0.02, file_latency=0.05, host='127.0.0.1', port=0):
+        self._init_state(latency, file_latency)
+        self.server = ThreadingHTTPServer((host, port), self._handler_class())
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def _init_state(self, latency, file_latency):
+        self.latency = latency
+        self.file_latency = file_latency
+        self.updates = []
+        self.updates_cond = threading.Condition()
+        self.sent = []
+        self.sent_lock = threading.Lock()
+        self.listeners = []
+        self._message_ids = itertools.count(1)
+        self._update_ids = itertools.count(1)
+        self.limits = None
+        self.limits_lock = threading.Lock()
+        self.rejected = 0
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def install(self):
+        # Перенаправляет telebot на этот сервер
+        from telebot import apihelper
+        apihelper.API_URL = self.url + '/bot{0}/{1}'
+        apihelper.FILE_URL = self.url + '/file/bot{0}/{1}'
+        return self
+
+    # Апдейты
+
+    def next_update_id(self):
+        return next(self._update_ids)
+
+    def message_update(self, user_id, text=None, photo=False, username=None):
+        message = {'message_id': next(self._message_ids), 'date': int(time.time()),
+                   'chat': {'id': user_id, 'type': 'private'},
+                   'from': {'id': user_id, 'is_bot': False, 'first_name': 'user', 'username': username or f'user{user_id}'}}
+        if photo:
+            message['photo'] = [{'file_id': f'photo-{user_id}-{message["message_id"]}',
+                                 'file_unique_id': f'unique-{user_id}-{message["message_id"]}',
+                                 'width': 640, 'height': 480}]
+        else:
+            message['text'] = text
+            if text and text.startswith('/'):
+                message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+        return {'update_id': self.next_update_id(), 'message': message}
+
+    def callback_update(self, user_id, data, username=None):
+        message = {'message_id': next(self._message_ids), 'date': int(time.time()),
+                   'chat': {'id': user_id, 'type': 'private'}, 'text': 'menu'}
+        return {'update_id': self.next_update_id(),
+                'callback_query': {'id': str(next(self._message_ids)), 'chat_instance': str(user_id), 'data': data,
+                                   'message': message,
+                                   'from': {'id': user_id, 'is_bot': False, 'first_name': 'user',
+                                            'username': username or f'user{user_id}'}}}
+
+    def push(self, *updates):
+        with self.updates_cond:
+            self.updates.extend(updates)
+            self.updates_cond.notify_all()
+
+    def take_updates(self, offset, timeout):
+        deadline = time.monotonic() + timeout
+        with self.updates_cond:
+            self.updates = [u for u in self.updates if u['update_id'] >= offset]
+            while not self.updates and time.monotonic() < deadline:
+                self.updates_cond.wait(deadline - time.monotonic())
+            return list(self.updates[:100])
+
+    def sent_to(self, chat_id):
+        with self.sent_lock:
+            return [entry for entry in self.sent if entry[2] == chat_id]
+
+    # Лимиты как у Telegram: не больше global_rate сообщений за любую секунду на весь бот
+    # и ведро на чат (chat_burst сообщений подряд, дальше chat_rate в секунду). Сверх лимита — 429 с retry_after
+
+    def limit(self, global_rate=30, chat_rate=1, chat_burst=3):
+        self.limits = (global_rate, chat_rate, chat_burst)
+        self._recent = collections.deque()
+        self._chat_buckets = {}
+        return self
+
+    def throttle(self, method, params):
+        if self.limits is None or method not in LIMITED_METHODS:
+            return None
+        global_rate, chat_rate, chat_burst = self.limits
+        chat_id = params.get('chat_id')
+        now = time.monotonic()
+        with self.limits_lock:
+            while self._recent and self._recent[0] <= now - 1:
+                self._recent.popleft()
+            tokens, stamp = self._chat_buckets.get(chat_id, (chat_burst, now))
+            tokens = min(chat_burst, tokens + (now - stamp) * chat_rate)
+            if tokens < 1:
+                wait = (1 - tokens) / chat_rate
+            elif len(self._recent) >= global_rate:
+                wait = self._recent[0] + 1 - now
+            else:
+                self._recent.append(now)
+                self._chat_buckets[chat_id] = (tokens - 1, now)
+                return None
+            self._chat_buckets[chat_id] = (tokens, now)
+            self.rejected += 1
+            return max(1, math.ceil(wait))
+
+    def too_many_requests(self, retry_after):
+        return 429, {'ok': False, 'error_code': 429, 'description': f'Too Many Requests: retry after {retry_after}',
+                     'parameters': {'retry_after': retry_after}}
+
+    # Методы API
+
+    def call(self, method, params):
+        if method == 'getUpdates':
+            return self.take_updates(int(params.get('offset', 0) or 0), float(params.get('timeout', 0) or 0))
+        time.sleep(self.latency)
+        return self.result(method, params)
+
+    def result(self, method, params):
+        chat_id = params.get('chat_id')
+        chat_id = int(chat_id) if chat_id not in (None, '') else None
+        with self.sent_lock:
+            self.sent.append((time.perf_counter(), method, chat_id, params))
+        for listener in self.listeners:
+            listener(method, chat_id, params)
+        if method == 'getMe':
+            return {'id': 1, 'is_bot': True, 'first_name': 'bot', 'username': 'bot'}
+        if method == 'getFile':
+            return {'file_id': params.get('file_id'), 'file_unique_id': 'u' + str(params.get('file_id')),
+                    'file_size': len(PHOTO_BYTES), 'file_path': f'photos/{params.get("file_id")}.jpg'}
+        if method in ('sendMessage', 'sendPhoto', 'editMessageText', 'editMessageReplyMarkup'):
+            message = {'message_id': int(params.get('message_id') or next(self._message_ids)), 'date': int(time.time()),
+                       'chat': {'id': chat_id or 0, 'type': 'private'}}
+            if 'text' in params:
+                message['text'] = params['text']
+            return message
+        return True
+
+    def _handler_class(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def _params(self):
+                url = urlparse(self.path)
+                params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length) if length else b''
+                content_type = self.headers.get('Content-Type', '')
+                if content_type.startswith('application/x-www-form-urlencoded'):
+                    params.update({k: v[-1] for k, v in parse_qs(body.decode()).items()})
+                elif content_type.startswith('application/json') and body:
+                    params.update(json.loads(body))
+                elif content_type.startswith('multipart/form-data'):
+                    for name, value in _multipart_field.findall(body):
+                        params[name.decode()] = value.decode(errors='replace')
+                return url.path, params
+
+            def _reply(self, status, payload, content_type='application/json'):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _handle(self):
+                path, params = self._params()
+                if path.startswith('/file/'):
+                    time.sleep(fake.file_latency)
+                    self._reply(200, PHOTO_BYTES, 'image/jpeg')
+                    return
+                method = path.rsplit('/', 1)[-1]
+                status, payload = fake.respond(method, params)
+                self._reply(status, json.dumps(payload).encode())
+
+            do_GET = _handle
+            do_POST = _handle
+
+        return Handler
+
+    def respond(self, method, params):
+        retry_after = self.throttle(method, params)
+        if retry_after is not None:
+            return self.too_many_requests(retry_after)
+        return 200, {'ok': True, 'result': self.call(method, params)}
+
+
+class AioFakeTelegram(FakeTelegram):
+    # Тот же API на aiohttp: сервер крутится в своём event loop в отдельном потоке,
+    # задержка ответа не занимает поток, так что выдерживает тысячи одновременных запросов
+
+    def __init__(self, latency=0.02, file_latency=0.05, host='127.0.0.1', port=0):
+        self._init_state(latency, file_latency)
+        self.host, self.port = host, port
+        self.loop = None
+        self.runner = None
+        self.thread = threading.Thread(target=self._serve, daemon=True)
+        self.ready = threading.Event()
+
+    @property
+    def url(self):
+        return f'http://{self.host}:{self.port}'
+
+    def _serve(self):
+        import asyncio
+        from aiohttp import web
+
+        async def handle(request):
+            params = dict(request.query)
+            if request.method == 'POST':
+                params.update({k: v for k, v in (await request.post()).items() if isinstance(v, str)})
+            method = request.match_info['method']
+            if method == 'getUpdates':
+                offset = int(params.get('offset', 0) or 0)
+                result = await self.loop.run_in_executor(None, self.take_updates, offset, float(params.get('timeout', 0) or 0))
+            else:
+                retry_after = self.throttle(method, params)
+                if retry_after is not None:
+                    status, payload = self.too_many_requests(retry_after)
+                    return web.json_response(payload, status=status)
+                await asyncio.sleep(self.latency)
+                result = self.result(method, params)
+            return web.json_response({'ok': True, 'result': result})
+
+        async def handle_file(request):
+            await asyncio.sleep(self.file_latency)
+            return web.Response(body=PHOTO_BYTES, content_type='image/jpeg')
+
+        async def start():
+            app = web.Application(client_max_size=32 * 1024 * 1024)
+            app.router.add_route('*', '/bot{token}/{method}', handle)
+            app.router.add_get('/file/bot{token}/{path:.*}', handle_file)
+            self.runner = web.AppRunner(app, access_log=None)
+            await self.runner.setup()
+            site = web.TCPSite(self.runner, self.host, self.port)
+            await site.start()
+            self.port = site._server.sockets[0].getsockname()[1]
+
+        self.loop = asyncio.new_event_loop()
+        self.loop.run_until_complete(start())
+        self.ready.set()
+        self.loop.run_forever()
+
+    def start(self):
+        self.thread.start()
+        self.ready.wait()
+        return self
+
+    def stop(self):
+        import asyncio
+        asyncio.run_coroutine_threadsafe(self.runner.cleanup(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+    def install(self):
+        from telebot import apihelper, asyncio_helper
+        for helper in (apihelper, asyncio_helper):
+            helper.API_URL = self.url + '/bot{0}/{1}'
+            helper.FILE_URL = self.url + '/file/bot{0}/{1}'
+        return self
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def unlimited(outbox):
+    # Снимает лимиты Telegram в очереди отправки main.py, когда меряется обработка, а не ожидание лимитов
+    import time
+
+    from outbox import TokenBucket
+    outbox.bucket = TokenBucket(1e9, 1e9, time.monotonic())
+    outbox.chat_rate = outbox.chat_burst = 1e9
+    return outbox
+
+
+def load_main(db_path, module='main'):
+    # Импортирует main.py с базой и архивом скриншотов во временном каталоге; если cnf.py нет, подставляет тестовый токен
+    import importlib
+    import os
+    import sys
+    import types
+
+    import archive
+    import db
+    db.DB_PATH = db_path
+    archive.ARCHIVE_DIR = os.path.join(os.path.dirname(db_path), 'screenshots')
+    try:
+        import cnf  # noqa: F401
+    except ImportError:
+        cnf = types.ModuleType('cnf')
+        cnf.token = '123456:bench'
+        sys.modules['cnf'] = cnf
+    return importlib.import_module(module)
@@ -0,0 +1,82 @@
+# Стресс-тест ledger.py: много потоков параллельно покупают и выводят,
+# в конце проверяем, что ни одно изменение баланса не потерялось и остатки сходятся с журналом проводок
+# Запуск: python benchmarks/stress_ledger.py [потоков] [операций на поток]
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db
+import ledger
+import money
+import schema
+
+USERS = 20
+START_BALANCE = 10000 * money.KOPECKS
+START_GOLD = 10000
+
+
+def worker(seed, ops, results):
+    rnd = random.Random(seed)
+    spent = {}
+    for _ in range(ops):
+        user_id = rnd.randrange(USERS)
+        amount = rnd.randrange(1, 300)
+        kind = rnd.choice(('buy', 'withdraw_gold', 'withdraw_money'))
+        balance, gold = spent.get(user_id, (0, 0))
+        if kind == 'buy':
+            if ledger.buy_gold(user_id, amount, money.buy_price(amount)):
+                spent[user_id] = (balance + money.buy_price(amount), gold - amount)
+        elif kind == 'withdraw_gold':
+            if ledger.withdraw_gold(user_id, amount, money.gold_payout(amount)):
+                spent[user_id] = (balance, gold + amount)
+        elif ledger.withdraw_money(user_id, amount, '+70000000000'):
+            spent[user_id] = (balance + amount, gold)
+    results.append(spent)
+    db.close_connection()
+
+
+def main():
+    threads_count = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    ops = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    with tempfile.TemporaryDirectory() as tmp:
+        db.DB_PATH = os.path.join(tmp, 'stress.db')
+        schema.migrate()
+        with db.transaction() as conn:
+            conn.executemany("INSERT INTO users VALUES (?, ?, 0, 0)", ((i, f'user{i}') for i in range(USERS)))
+        for i in range(USERS):
+            ledger.credit(i, balance=START_BALANCE, gold=START_GOLD)
+
+        results = []
+        threads = [threading.Thread(target=worker, args=(seed, ops, results)) for seed in range(threads_count)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        expected = {i: [START_BALANCE, START_GOLD] for i in range(USERS)}
+        for spent in results:
+            for user_id, (balance, gold) in spent.items():
+                expected[user_id][0] -= balance
+                expected[user_id][1] -= gold
+
+        lost = 0
+        for user_id, balance, gold in db.fetchall("SELECT id, balance, gold FROM users"):
+            if balance != expected[user_id][0] or gold != expected[user_id][1] or balance < 0 or gold < 0:
+                lost += 1
+        unbalanced = len(ledger.verify())
+        requests_count = db.fetchone("SELECT COUNT(*) FROM requests")[0]
+        print(f"{threads_count * ops} операций за {elapsed:.2f}с ({threads_count * ops / elapsed:.0f} ops/sec), "
+              f"заявок: {requests_count}, расхождений: {lost}, расхождений с проводками: {unbalanced}")
+        db.close_connection()
+        sys.exit(1 if lost or unbalanced else 0)
+
+
+if __name__ == '__main__':
+    main()
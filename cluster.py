@@ -0,0 +1,156 @@
+import importlib
+import logging
+import multiprocessing
+import time
+
+from telebot import TeleBot
+
+import dispatch
+import users
+from outbox import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Обработка апдейтов в нескольких процессах: python cluster.py вместо python main.py.
+# Ведущий процесс один получает апдейты (long polling), регистрирует отправителей пачкой и раскладывает
+# апдейты по очередям процессов обработки по хешу id пользователя, так что у каждого пользователя
+# свой процесс и порядок его апдейтов сохраняется. Внутри процесса апдейты раздаёт dispatch.KeyedWorkerPool.
+# Общее состояние живёт в users.db (WAL, запись разных процессов сериализует busy_timeout): шаги диалога,
+# заявки, проводки. Кеш пользователей у каждого процесса свой, сброс записи после изменения из чужого
+# процесса (например, админ зачислил баланс) пересылается владельцу через его очередь, как и перерисовка
+# админ-панели после просрочки заявок в ведущем процессе. Общий лимит Telegram на отправку делится поровну
+# между процессами обработки и ведущим процессом (он отправляет уведомления о просрочке)
+
+STOP = None
+PANEL = 'panel'  # (PANEL, id чата) в очереди процесса — перерисовать показанную им админ-панель
+
+
+def owner(key, processes):
+    # hash целого числа не зависит от процесса (в отличие от hash строк), поэтому все процессы считают одинаково
+    return hash(key) % processes
+
+
+def share_rate(outbox, parts):
+    # Доля общего лимита отправки для одного из parts процессов
+    outbox.bucket = TokenBucket(outbox.bucket.rate / parts, max(1, outbox.bucket.capacity / parts), time.monotonic())
+
+
+def worker(index, queues, threads, module='main', setup=None):
+    # Процесс обработки: импортирует бота (обработчики, очередь отправки) и обрабатывает апдейты из своей очереди.
+    # setup() выполняется до импорта — например, чтобы указать другой путь к базе
+    if setup is not None:
+        setup()
+    bot_main = importlib.import_module(module)
+    bot, outbox = bot_main.bot, bot_main.outbox
+    processes = len(queues)
+    share_rate(outbox, processes + 1)
+
+    def forward(user_id):
+        target = owner(user_id, processes)
+        if target != index:
+            queues[target].put(user_id)
+
+    users.on_invalidate = forward
+    pool = dispatch.KeyedWorkerPool(lambda update: TeleBot.process_new_updates(bot, [update]), threads)
+    inbox = queues[index]
+    while True:
+        item = inbox.get()
+        if item is STOP:
+            break
+        if isinstance(item, int):
+            # id пользователя, которого изменил другой процесс
+            users.invalidate(item)
+        elif isinstance(item, tuple) and item[0] == PANEL:
+            bot_main.panel.refresh_shown(item[1])
+        else:
+            pool.put(dispatch.update_user_id(item), item)
+    pool.join()
+    outbox.join()
+
+
+class Cluster:
+    def __init__(self, processes, threads, module='main', setup=None):
+        context = multiprocessing.get_context('spawn')
+        self.queues = [context.Queue() for _ in range(processes)]
+        self.processes = [context.Process(target=worker, args=(index, self.queues, threads, module, setup),
+                                          name=f'bot-worker-{index}', daemon=True)
+                          for index in range(processes)]
+
+    def start(self):
+        for process in self.processes:
+            process.start()
+        return self
+
+    def put(self, update):
+        self.queues[owner(dispatch.update_user_id(update), len(self.queues))].put(update)
+
+    def invalidate(self, user_id):
+        # Сброс записи пользователя, изменённого в ведущем процессе (возврат при просрочке заявки), —
+        # процессу, который держит её в кеше
+        self.queues[owner(user_id, len(self.queues))].put(user_id)
+
+    def refresh_panel(self, chat_id):
+        # Админ-панель показывает процесс, который обрабатывает апдейты админа
+        self.queues[owner(chat_id, len(self.queues))].put((PANEL, chat_id))
+
+    def attach(self, bot, on_batch=None, throttle=None):
+        # Как dispatch.attach, но апдейты уходят в процессы обработки
+        def process_new_updates(updates):
+            for update in updates:
+                # Смещение getUpdates двигает TeleBot.process_new_updates, а он здесь не вызывается
+                bot.last_update_id = max(bot.last_update_id, update.update_id)
+            if throttle is not None:
+                updates = throttle.filter(updates)
+            if on_batch is not None and updates:
+                try:
+                    on_batch(updates)
+                except Exception:
+                    logger.exception("Ошибка при записи пачки апдейтов")
+            for update in updates:
+                self.put(update)
+
+        bot.process_new_updates = process_new_updates
+        return self
+
+    def stop(self):
+        # Процессы доделывают уже полученные апдейты и отправку
+        for q in self.queues:
+            q.put(STOP)
+        for process in self.processes:
+            process.join()
+
+
+def main():
+    # Схема базы обновляется здесь, в ведущем процессе, до запуска процессов обработки
+    import main as bot_main
+    import maintenance
+    import metrics
+    import schema
+
+    schema.migrate()
+    bot = bot_main.bot
+    cluster = Cluster(bot_main.PROCESSES, bot_main.WORKERS).start()
+    users.on_invalidate = cluster.invalidate
+    share_rate(bot_main.outbox, bot_main.PROCESSES + 1)
+
+    def notify_expired(expired):
+        # Уведомления уходят из ведущего процесса, а панель перерисовывает процесс админа
+        bot_main.notify_expired(expired)
+        cluster.refresh_panel(bot_main.ADMIN_ID)
+
+    try:
+        maintenance.start(notify_expired)
+        if bot_main.METRICS_PORT:
+            metrics.instrument_api()
+            metrics.serve(bot_main.METRICS_HOST, bot_main.METRICS_PORT)
+        bot.remove_webhook()
+        cluster.attach(bot, bot_main.register_users, bot_main.throttle)
+        bot.polling(none_stop=True)
+    except Exception as e:
+        print(f"Ошибка в основном цикле: {e}")
+    finally:
+        cluster.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+import metrics
+
+DB_PATH = 'users.db'
+
+# Настройки соединения: WAL позволяет читать параллельно с записью,
+# synchronous=NORMAL в режиме WAL даёт fsync только на чекпоинтах
+PRAGMAS = (
+    "PRAGMA auto_vacuum=INCREMENTAL",  # действует только для новой базы, старую переводит python maintenance.py
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA mmap_size=268435456",
+)
+
+STATEMENT_CACHE_SIZE = 256
+
+# Вызывается один раз на процесс при первом соединении, до первого запроса (main.py ставит сюда schema.migrate):
+# импорт модулей не трогает базу, а проверка схемы не повторяется в каждом потоке
+setup = None
+
+_local = threading.local()
+_kinds = {}
+_setup_done = False
+_setup_lock = threading.Lock()
+
+
+def statement_kind(sql):
+    kind = _kinds.get(sql)
+    if kind is None:
+        kind = _kinds[sql] = sql.split(None, 1)[0].upper()
+    return kind
+
+
+class Connection(sqlite3.Connection):
+    # Время каждого запроса попадает в metrics.DB_SECONDS с меткой SELECT/INSERT/UPDATE/...
+    def execute(self, sql, params=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, params)
+        finally:
+            metrics.DB_SECONDS.observe(time.perf_counter() - start, statement_kind(sql))
+
+    def executemany(self, sql, seq_of_params):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_params)
+        finally:
+            metrics.DB_SECONDS.observe(time.perf_counter() - start, statement_kind(sql))
+
+
+def get_connection():
+    # Одно долгоживущее соединение на поток, кеш страниц и подготовленных запросов не теряется
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        conn = sqlite3.connect(DB_PATH, isolation_level=None, cached_statements=STATEMENT_CACHE_SIZE,
+                               factory=Connection)
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        _local.conn = conn
+        if not _setup_done:
+            _run_setup()
+    return conn
+
+
+def _run_setup():
+    # Остальные потоки ждут на блокировке, пока setup не закончится; его собственные запросы идут
+    # через уже созданное соединение потока и сюда не возвращаются
+    global _setup_done
+    with _setup_lock:
+        if _setup_done:
+            return
+        try:
+            if setup is not None:
+                setup()
+        except BaseException:
+            close_connection()  # следующее обращение к базе попробует ещё раз
+            raise
+        _setup_done = True
+
+
+def close_connection():
+    conn = getattr(_local, 'conn', None)
+    if conn is not None:
+        conn.close()
+        _local.conn = None
+
+
+def execute(sql, params=()):
+    return get_connection().execute(sql, params)
+
+
+def executemany(sql, seq_of_params):
+    return get_connection().executemany(sql, seq_of_params)
+
+
+def fetchone(sql, params=()):
+    return get_connection().execute(sql, params).fetchone()
+
+
+def fetchall(sql, params=()):
+    return get_connection().execute(sql, params).fetchall()
+
+
+@contextmanager
+def transaction():
+    conn = get_connection()
+    if conn.in_transaction:
+        # Вложенная транзакция (например, внутри пакета апдейтов) откатывается отдельно через SAVEPOINT
+        depth = getattr(_local, 'depth', 0) + 1
+        _local.depth = depth
+        savepoint = f"sp{depth}"
+        conn.execute(f"SAVEPOINT {savepoint}")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute(f"ROLLBACK TO {savepoint}")
+            raise
+        finally:
+            conn.execute(f"RELEASE {savepoint}")
+            _local.depth = depth - 1
+        return
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
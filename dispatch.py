@@ -0,0 +1,114 @@
+import logging
+import queue
+import threading
+import weakref
+
+from telebot import TeleBot
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+UPDATE_FIELDS = ('message', 'edited_message', 'callback_query', 'inline_query', 'chosen_inline_result',
+                 'shipping_query', 'pre_checkout_query', 'poll_answer', 'my_chat_member', 'chat_member',
+                 'chat_join_request')
+
+
+def update_event(update):
+    for field in UPDATE_FIELDS:
+        event = getattr(update, field, None)
+        if event is not None:
+            return event
+    return None
+
+
+def update_sender(update):
+    event = update_event(update)
+    if event is None:
+        return None
+    return getattr(event, 'from_user', None) or getattr(event, 'user', None)
+
+
+def update_user_id(update):
+    # Ключ шардирования: все апдейты одного пользователя попадают в один и тот же поток
+    user = update_sender(update)
+    if user is not None:
+        return user.id
+    chat = getattr(update_event(update), 'chat', None)
+    if chat is not None:
+        return chat.id
+    return update.update_id
+
+
+_pools = weakref.WeakSet()
+
+
+class KeyedWorkerPool:
+    # Пул потоков, у каждого своя очередь: разные пользователи обрабатываются параллельно,
+    # а апдейты одного пользователя строго по порядку (важно для шагов диалога из states.py)
+
+    def __init__(self, handler, num_workers=4):
+        self.handler = handler
+        self.queues = [queue.Queue() for _ in range(num_workers)]
+        self.threads = [threading.Thread(target=self._worker, args=(q,), daemon=True) for q in self.queues]
+        for thread in self.threads:
+            thread.start()
+        _pools.add(self)
+
+    def put(self, key, item):
+        self.queues[hash(key) % len(self.queues)].put(item)
+
+    def _worker(self, q):
+        while True:
+            item = q.get()
+            try:
+                if item is None:
+                    return
+                with metrics.UPDATE_SECONDS.time():
+                    metrics.sampler.run(self.handler, item)
+            except Exception:
+                metrics.ERRORS.inc('update')
+                logger.exception("Ошибка при обработке апдейта")
+            finally:
+                q.task_done()
+
+    def depth(self):
+        return sum(q.qsize() for q in self.queues)
+
+    def join(self):
+        for q in self.queues:
+            q.join()
+
+    def stop(self):
+        for q in self.queues:
+            q.put(None)
+        for thread in self.threads:
+            thread.join()
+
+
+metrics.Gauge('bot_update_queue_depth', 'Апдейты в очередях пула обработки',
+              lambda: sum(pool.depth() for pool in list(_pools)))
+
+
+def attach(bot, num_workers=4, on_batch=None, throttle=None):
+    # bot должен быть создан с threaded=False: обработчики выполняются прямо в потоке пула.
+    # throttle (throttle.Throttle) отсеивает апдейты до on_batch, то есть до записи в базу
+    pool = KeyedWorkerPool(lambda update: TeleBot.process_new_updates(bot, [update]), num_workers)
+
+    def process_new_updates(updates):
+        # Смещение getUpdates сдвигается сразу на всю пачку: апдейты уже в очередях пула
+        # или отброшены throttle, и следующий getUpdates не должен получить их снова
+        for update in updates:
+            bot.last_update_id = max(bot.last_update_id, update.update_id)
+        if throttle is not None:
+            updates = throttle.filter(updates)
+        if on_batch is not None and updates:
+            try:
+                on_batch(updates)
+            except Exception:
+                logger.exception("Ошибка при записи пачки апдейтов")
+        for update in updates:
+            pool.put(update_user_id(update), update)
+
+    bot.process_new_updates = process_new_updates
+    return pool
@@ -0,0 +1,168 @@
+import argparse
+import csv
+import json
+import sys
+import time
+from contextlib import nullcontext
+
+import db
+
+# Выгрузка и загрузка users, requests и requests_archive в CSV или JSONL без запуска бота:
+#   python dump.py export users.db users users.csv
+#   python dump.py import users.db requests requests.jsonl
+# Закрытые заявки старше maintenance.ARCHIVE_AFTER лежат в requests_archive и выгружаются отдельно.
+# Время последней смены статуса (updated_at) выгружается вместе с заявкой, чтобы после загрузки
+# отсчёт просрочки и переноса в архив продолжился, а не начался заново; пустое — время загрузки.
+# Вместо файла можно указать «-» (stdout/stdin), формат берётся из расширения или --format.
+# Строки читаются из курсора пачками через fetchmany и пишутся сразу в файл, загрузка идёт пачками
+# через executemany, каждая пачка в своей транзакции, поэтому память не зависит от размера таблицы.
+# Строки с уже существующим id пропускаются. Остатки загруженных пользователей записываются
+# в журнал проводками import, чтобы ledger.verify() сходился
+
+BATCH = 5000
+
+
+def nullable(convert):
+    # Пустая ячейка CSV и null в JSONL — NULL
+    return lambda value: None if value is None or value == '' else convert(value)
+
+
+def text(value):
+    return '' if value is None else str(value)
+
+
+REQUESTS = (('id', int), ('user_id', int), ('request_type', str), ('amount', int), ('status', str),
+            ('details', text), ('sale_amount', nullable(int)), ('phone', nullable(str)),
+            ('payout', nullable(int)), ('updated_at', nullable(float)))
+
+TABLES = {
+    'users': (('id', int), ('name', nullable(str)), ('balance', int), ('gold', int)),
+    'requests': REQUESTS,
+    'requests_archive': REQUESTS,
+}
+
+# Пользователи сначала попадают во временную таблицу пачки: проводки пишутся только для тех, кого ещё нет
+STAGE_USERS = "CREATE TEMP TABLE IF NOT EXISTS import_users (id INTEGER PRIMARY KEY, name TEXT, balance INTEGER, gold INTEGER)"
+OPENING = '''INSERT INTO postings (user_id, asset, amount, balance, kind, contra, request_id, created_at)
+             SELECT id, ?, {0}, {0}, 'import', 'external', NULL, ? FROM temp.import_users
+             WHERE {0} != 0 AND id NOT IN (SELECT id FROM main.users)'''
+
+
+def columns(table):
+    return [name for name, _ in TABLES[table]]
+
+
+def detect_format(path, fmt):
+    if fmt:
+        return fmt
+    if path.endswith('.csv'):
+        return 'csv'
+    if path.endswith('.jsonl'):
+        return 'jsonl'
+    raise SystemExit(f"Не удалось определить формат {path!r}, укажите --format csv или jsonl")
+
+
+def open_file(path, mode):
+    if path == '-':
+        return nullcontext(sys.stdout if 'w' in mode else sys.stdin)
+    return open(path, mode, encoding='utf-8', newline='')
+
+
+def export_rows(table, out, fmt, batch=BATCH):
+    # Возвращает число выгруженных строк
+    names = columns(table)
+    cursor = db.execute(f"SELECT {', '.join(names)} FROM {table} ORDER BY id")
+    if fmt == 'csv':
+        writer = csv.writer(out)
+        writer.writerow(names)
+        write = writer.writerows
+    else:
+        def write(rows):
+            out.writelines(json.dumps(dict(zip(names, row)), ensure_ascii=False) + '\n' for row in rows)
+    total = 0
+    while True:
+        rows = cursor.fetchmany(batch)
+        if not rows:
+            return total
+        write(rows)
+        total += len(rows)
+
+
+def read_rows(table, source, fmt):
+    # Строки файла, приведённые к типам столбцов, по одной
+    names = columns(table)
+    converters = [convert for _, convert in TABLES[table]]
+    if fmt == 'csv':
+        records = csv.DictReader(source)
+    else:
+        records = (json.loads(line) for line in source if line.strip())
+    for record in records:
+        yield tuple(convert(record.get(name)) for name, convert in zip(names, converters))
+
+
+def import_batch(conn, table, rows):
+    # Возвращает число добавленных строк
+    if table != 'users':
+        names = columns(table)
+        return conn.executemany(f"INSERT OR IGNORE INTO {table} ({', '.join(names)}) "
+                                f"VALUES ({', '.join('?' * len(names))})", rows).rowcount
+    conn.execute(STAGE_USERS)
+    conn.execute("DELETE FROM temp.import_users")
+    conn.executemany("INSERT OR IGNORE INTO temp.import_users (id, name, balance, gold) VALUES (?, ?, ?, ?)", rows)
+    now = time.time()
+    conn.execute(OPENING.format('balance'), ('rub', now))
+    conn.execute(OPENING.format('gold'), ('gold', now))
+    return conn.execute("INSERT OR IGNORE INTO users (id, name, balance, gold) "
+                        "SELECT id, name, balance, gold FROM temp.import_users").rowcount
+
+
+def import_rows(table, source, fmt, batch=BATCH):
+    # Возвращает (прочитано строк, добавлено строк)
+    read = added = 0
+    rows = []
+    for row in read_rows(table, source, fmt):
+        rows.append(row)
+        if len(rows) == batch:
+            with db.transaction() as conn:
+                added += import_batch(conn, table, rows)
+            read += len(rows)
+            rows = []
+    if rows:
+        with db.transaction() as conn:
+            added += import_batch(conn, table, rows)
+        read += len(rows)
+    return read, added
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Выгрузка и загрузка users, requests и requests_archive")
+    parser.add_argument('action', choices=('export', 'import'))
+    parser.add_argument('database')
+    parser.add_argument('table', choices=sorted(TABLES))
+    parser.add_argument('path', help="файл .csv или .jsonl, «-» — stdout/stdin")
+    parser.add_argument('--format', choices=('csv', 'jsonl'))
+    parser.add_argument('--batch', type=int, default=BATCH, help="строк в одной пачке")
+    args = parser.parse_args()
+
+    db.DB_PATH = args.database
+    fmt = detect_format(args.path, args.format)
+    if args.action == 'export':
+        with open_file(args.path, 'w') as out:
+            total = export_rows(args.table, out, fmt, args.batch)
+        print(f"выгружено строк: {total}", file=sys.stderr)
+        if args.table == 'requests':
+            archived = db.fetchone("SELECT count(*) FROM requests_archive")[0] if db.fetchone(
+                "SELECT 1 FROM sqlite_master WHERE name = 'requests_archive'") else 0
+            if archived:
+                print(f"ещё {archived} закрытых заявок в requests_archive: "
+                      f"python dump.py export {args.database} requests_archive <файл>", file=sys.stderr)
+    else:
+        import schema
+        schema.migrate()
+        with open_file(args.path, 'r') as source:
+            read, added = import_rows(args.table, source, fmt, args.batch)
+        print(f"прочитано строк: {read}, добавлено: {added}, пропущено: {read - added}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,203 @@
+import time
+
+import db
+import users
+
+# Все изменения баланса и голды делаются одним условным UPDATE прямо в базе,
+# без чтения пользователя и пересчёта в Python, поэтому параллельные нажатия не теряют обновления.
+# После записи запись пользователя сбрасывается из кеша users.
+#
+# Каждое изменение в той же транзакции дописывает проводки в postings: счёт пользователя, актив
+# (rub в копейках или gold), изменение, остаток после него и встречный счёт бота (shop — продажа голды ботом,
+# external — всё, что приходит извне и уходит наружу). users.balance/gold остаются готовым остатком для чтения,
+# а по проводкам восстанавливается история и сверяется остаток (verify)
+
+SHOP = 'shop'
+EXTERNAL = 'external'
+
+BUY_GOLD = ("UPDATE users SET balance = balance - ?, gold = gold + ? "
+            "WHERE id = ? AND balance >= ? RETURNING balance, gold")
+TAKE_GOLD = "UPDATE users SET gold = gold - ? WHERE id = ? AND gold >= ? RETURNING name, balance, gold"
+TAKE_BALANCE = "UPDATE users SET balance = balance - ? WHERE id = ? AND balance >= ? RETURNING name, balance, gold"
+ADD = "UPDATE users SET balance = balance + ?, gold = gold + ? WHERE id = ? RETURNING balance, gold"
+SET = ("UPDATE users SET balance = coalesce(?, balance), gold = coalesce(?, gold) WHERE id = ? "
+       "RETURNING balance, gold")
+INSERT_REQUEST = ("INSERT INTO requests (user_id, request_type, amount, status, details, sale_amount, phone, payout) "
+                  "VALUES (?, ?, ?, 'pending', ?, ?, ?, ?)")
+# Зачисление по заявке закрывает её только из незакрытого статуса: повторное нажатие кнопки
+# или зачисление по уже отклонённой, оспоренной или завершённой заявке ничего не зачисляет
+CLOSE_REQUEST = ("UPDATE requests SET status = ? WHERE id = ? AND status IN ('pending', 'accepted') "
+                 "RETURNING id")
+CLOSE_PENDING = ("UPDATE requests SET status = ? WHERE status = 'pending' AND request_type = ? AND id <= ? "
+                 "RETURNING id, user_id, request_type, amount")
+REJECT = ("UPDATE requests SET status = 'rejected' WHERE id = ? AND status = 'pending' "
+          "RETURNING id, user_id, request_type, amount")
+ACCEPT = ("UPDATE requests SET status = 'accepted' WHERE id = ? AND status = 'pending' "
+          "RETURNING user_id, request_type, amount, sale_amount")
+# Незакрытые заявки: ожидающие админа и продажи, принятые, но не доведённые до покупки скина.
+# Принятый вывод уже выполнен, поэтому не просрочивается
+STALE = "(status = 'pending' OR (status = 'accepted' AND request_type = 'sell_gold')) AND updated_at < ?"
+EXPIRE = (f"UPDATE requests SET status = 'expired' WHERE id IN (SELECT id FROM requests WHERE {STALE} LIMIT ?) "
+          "RETURNING id, user_id, request_type, amount")
+POST = ("INSERT INTO postings (user_id, asset, amount, balance, kind, contra, request_id, created_at) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)")
+
+
+def postings(user_id, kind, balances, rub=0, gold=0, request_id=None, contra=EXTERNAL):
+    # Строки для POST; balances — (баланс, голда) после операции из RETURNING
+    now = time.time()
+    rows = []
+    if rub:
+        rows.append((user_id, 'rub', rub, balances[0], kind, contra, request_id, now))
+    if gold:
+        rows.append((user_id, 'gold', gold, balances[1], kind, contra, request_id, now))
+    return rows
+
+
+def _returning(conn, sql, params):
+    # fetchall доводит запрос до конца, чтобы автокоммит сработал сразу
+    rows = conn.execute(sql, params).fetchall()
+    return rows[0] if rows else None
+
+
+def buy_gold(user_id, amount, price):
+    # Возвращает (баланс, голда) после покупки или None, если не хватает средств
+    if amount <= 0:
+        return None
+    with db.transaction() as conn:
+        result = _returning(conn, BUY_GOLD, (price, amount, user_id, price))
+        if result is not None:
+            conn.executemany(POST, postings(user_id, 'buy_gold', result, rub=-price, gold=amount, contra=SHOP))
+    users.invalidate(user_id)
+    return result
+
+
+def _withdraw(sql, request_type, user_id, amount, phone=None, payout=None):
+    # Списание и заявка на вывод в одной транзакции; возвращает (id заявки, ник) или None
+    if amount <= 0:
+        return None
+    with db.transaction() as conn:
+        user = _returning(conn, sql, (amount, user_id, amount))
+        if user is None:
+            return None
+        request_id = conn.execute(INSERT_REQUEST, (user_id, request_type, amount, '', None, phone, payout)).lastrowid
+        change = {'gold' if request_type == 'withdraw_gold' else 'rub': -amount}
+        conn.executemany(POST, postings(user_id, request_type, user[1:], request_id=request_id, **change))
+    users.invalidate(user_id)
+    return request_id, user[0]
+
+
+def withdraw_gold(user_id, amount, payout):
+    # payout — сколько копеек перевести пользователю за выведенную голду
+    return _withdraw(TAKE_GOLD, 'withdraw_gold', user_id, amount, payout=payout)
+
+
+def withdraw_money(user_id, amount, phone):
+    return _withdraw(TAKE_BALANCE, 'withdraw_money', user_id, amount, phone=phone)
+
+
+def credit(user_id, balance=0, gold=0, request_id=None, status='completed', kind='credit'):
+    # Зачисление на баланс/голду; если передан request_id, заявка сначала закрывается в той же транзакции,
+    # и если она уже закрыта, ничего не зачисляется. Возвращает (баланс, голда) после зачисления или None
+    with db.transaction() as conn:
+        if request_id is not None and _returning(conn, CLOSE_REQUEST, (status, request_id)) is None:
+            return None
+        user = _returning(conn, ADD, (balance, gold, user_id))
+        if user is not None:
+            conn.executemany(POST, postings(user_id, kind, user, rub=balance, gold=gold, request_id=request_id))
+    users.invalidate(user_id)
+    return user
+
+
+def close(request_id, status):
+    # Отклонение, отмена или спор по заявке без движения денег — только из незакрытого статуса.
+    # False, если заявку уже закрыли (зачислили, отклонили, оспорили)
+    return bool(db.fetchall(CLOSE_REQUEST, (status, request_id)))
+
+
+def set_balance(user_id, balance=None, gold=None):
+    # Ручная правка админом: новые значения вместо прежних, разница записывается проводкой adjustment
+    with db.transaction() as conn:
+        before = conn.execute("SELECT balance, gold FROM users WHERE id = ?", (user_id,)).fetchone()
+        after = _returning(conn, SET, (balance, gold, user_id))
+        if after is not None:
+            conn.executemany(POST, postings(user_id, 'adjustment', after,
+                                            rub=after[0] - before[0], gold=after[1] - before[1]))
+    users.invalidate(user_id)
+    return after
+
+
+def _refund(conn, closed, kind):
+    # Возврат голды или денег, списанных при создании заявок на вывод, проводкой kind в транзакции conn.
+    # closed — [(id заявки, id пользователя, тип, сумма)]; возвращает id пользователей, которым что-то вернулось
+    refunded = set()
+    for request_id, user_id, request_type, amount in closed:
+        if request_type not in ('withdraw_gold', 'withdraw_money') or amount <= 0:
+            continue
+        change = {'gold' if request_type == 'withdraw_gold' else 'rub': amount}
+        user = _returning(conn, ADD, (change.get('rub', 0), change.get('gold', 0), user_id))
+        if user is not None:
+            conn.executemany(POST, postings(user_id, kind, user, request_id=request_id, **change))
+            refunded.add(user_id)
+    return refunded
+
+
+def close_pending(request_type, status, max_id):
+    # Массовое подтверждение/отклонение: все pending заявки типа с id <= max_id одним UPDATE в одной транзакции.
+    # Заявки, пришедшие после max_id (админ их ещё не видел) и уже закрытые кнопкой, не затрагиваются.
+    # При отклонении вывода списанное возвращается проводкой rejected в той же транзакции.
+    # Возвращает [(id заявки, id пользователя)] закрытых заявок
+    with db.transaction() as conn:
+        closed = conn.execute(CLOSE_PENDING, (status, request_type, max_id)).fetchall()
+        refunded = _refund(conn, closed, 'rejected') if status == 'rejected' else ()
+    for user_id in refunded:
+        users.invalidate(user_id)
+    return [(request_id, user_id) for request_id, user_id, _, _ in closed]
+
+
+def reject(request_id):
+    # Отклонение одной pending заявки; списанное по выводу возвращается проводкой rejected.
+    # Возвращает (id пользователя, тип) или None, если заявка уже закрыта
+    with db.transaction() as conn:
+        closed = conn.execute(REJECT, (request_id,)).fetchall()
+        refunded = _refund(conn, closed, 'rejected')
+    for user_id in refunded:
+        users.invalidate(user_id)
+    return closed[0][1:3] if closed else None
+
+
+def accept(request_id):
+    # Подтверждение pending заявки. Отклонённую (списанное уже вернулось) или просроченную заявку подтвердить нельзя.
+    # Возвращает (id пользователя, тип, сумма, сумма продажи) или None, если заявка уже закрыта
+    rows = db.fetchall(ACCEPT, (request_id,))
+    return rows[0] if rows else None
+
+
+def expire_stale(before, limit):
+    # Просрочка до limit заявок, статус которых не менялся с before, одной транзакцией. Голда или деньги,
+    # списанные при создании заявки на вывод, возвращаются проводкой expired.
+    # Возвращает [(id заявки, id пользователя, тип, сумма)] просроченных заявок
+    with db.transaction() as conn:
+        expired = conn.execute(EXPIRE, (before, limit)).fetchall()
+        refunded = _refund(conn, expired, 'expired')
+    for user_id in refunded:
+        users.invalidate(user_id)
+    return expired
+
+
+def history(user_id, asset='rub', before_id=None, limit=20):
+    # Проводки пользователя от новых к старым: (id, изменение, остаток, вид, id заявки, время)
+    return db.fetchall("SELECT id, amount, balance, kind, request_id, created_at FROM postings "
+                       "WHERE user_id = ? AND asset = ? AND id < coalesce(?, 9223372036854775807) "
+                       "ORDER BY id DESC LIMIT ?", (user_id, asset, before_id, limit))
+
+
+def verify():
+    # Пользователи, у которых сохранённый остаток расходится с суммой проводок: (id, баланс, голда, по проводкам...)
+    return db.fetchall('''SELECT users.id, users.balance, users.gold, coalesce(p.rub, 0), coalesce(p.gold, 0)
+                          FROM users LEFT JOIN
+                               (SELECT user_id,
+                                       sum(CASE WHEN asset = 'rub' THEN amount ELSE 0 END) AS rub,
+                                       sum(CASE WHEN asset = 'gold' THEN amount ELSE 0 END) AS gold
+                                FROM postings GROUP BY user_id) AS p ON p.user_id = users.id
+                          WHERE users.balance != coalesce(p.rub, 0) OR users.gold != coalesce(p.gold, 0)''')
@@ -1,450 +1,600 @@
-from telebot import TeleBot
-from telebot.types import InlineKeyboardMarkup, InlineKeyboardButton
-import sqlite3
+import logging
+import os
+import sys
+
+from telebot import TeleBot, util
+from telebot.types import InlineKeyboardMarkup
+import archive
+import db
+import dispatch
+import ledger
+import maintenance
+import media
+import metrics
+import money
+from outbox import Outbox
+import schema
+import states
+import templates
+import users
+from admin_view import AdminView
+from router import Router
+from throttle import Throttle
+
+try:
+    import cnf
+except ImportError:  # Без cnf.py модуль импортируется с настройками по умолчанию (бенчмарки, проверки); для запуска нужен токен
+    cnf = None
+
+TOKEN = getattr(cnf, 'token', '')  # Замените на ваш токен
+WORKERS = getattr(cnf, 'workers', 4)  # Количество потоков обработки апдейтов
+PROCESSES = getattr(cnf, 'processes', os.cpu_count() or 1)  # Количество процессов обработки при запуске через cluster.py
+OUTBOX_WORKERS = getattr(cnf, 'outbox_workers', 8)  # Количество потоков отправки сообщений
+# Если задан webhook_url, бот принимает апдейты вебхуком вместо polling
+WEBHOOK_URL = getattr(cnf, 'webhook_url', None)
+WEBHOOK_SECRET = getattr(cnf, 'webhook_secret', None)
+WEBHOOK_HOST = getattr(cnf, 'webhook_host', '0.0.0.0')
+WEBHOOK_PORT = getattr(cnf, 'webhook_port', 8443)
+WEBHOOK_PATH = getattr(cnf, 'webhook_path', '/webhook')
+WEBHOOK_BATCH = getattr(cnf, 'webhook_batch', 100)  # Максимум апдейтов в одной пачке записи
+states.TTL = getattr(cnf, 'state_ttl', states.TTL)  # Сколько секунд ждать ответа пользователя на шаге диалога
+archive.ARCHIVE_DIR = getattr(cnf, 'archive_dir', archive.ARCHIVE_DIR)  # Каталог архива скриншотов по заявкам
+# Через сколько секунд без движения заявка просрочивается (списанное при выводе возвращается)
+maintenance.REQUEST_TTL = getattr(cnf, 'request_ttl', maintenance.REQUEST_TTL)
+# Через сколько секунд после закрытия заявка переносится в requests_archive
+maintenance.ARCHIVE_AFTER = getattr(cnf, 'archive_after', maintenance.ARCHIVE_AFTER)
+# Ограничения частоты апдейтов, (апдейтов, за сколько секунд): от одного пользователя и нажатий одной кнопки
+USER_LIMIT = getattr(cnf, 'user_limit', (20, 10))
+CALLBACK_LIMIT = getattr(cnf, 'callback_limit', (1, 1))
+# Если задан metrics_port, на нём доступны /metrics и /profile/start, /profile/stop (только локально)
+METRICS_HOST = getattr(cnf, 'metrics_host', '127.0.0.1')
+METRICS_PORT = getattr(cnf, 'metrics_port', None)
+# Апдейты раздаёт dispatch.KeyedWorkerPool, поэтому собственный пул потоков TeleBot отключён
+bot = TeleBot(TOKEN, threaded=False, validate_token=bool(TOKEN))
+ADMIN_ID = 6336204836
+# send_message/send_photo/edit_message_text идут через очередь с лимитами Telegram, сообщения админу — первыми
+outbox = Outbox(bot, OUTBOX_WORKERS, priority_chats=(ADMIN_ID,)).attach()
+# Спам и повторные нажатия отсеиваются до записи пачки в базу
+throttle = Throttle(USER_LIMIT, CALLBACK_LIMIT, exempt=(ADMIN_ID,))
 
-import cnf
+def get_or_register_user(user_id, user_name):
+    # Запись users.User из кеша процесса; при промахе — SELECT и регистрация, если пользователя нет
+    return users.get(user_id, user_name)
 
-TOKEN = cnf.token  # Замените на ваш токен
-bot = TeleBot(TOKEN)
-ADMIN_ID = 6336204836
 
-def get_db_connection():
-    conn = sqlite3.connect('users.db')
-    c = conn.cursor()
-    return conn, c
+def register_users(updates):
+    # Регистрирует отправителей всей пачки апдейтов одним запросом, дальше get_or_register_user только читает
+    senders = {}
+    for update in updates:
+        sender = dispatch.update_sender(update)
+        if sender is not None:
+            senders[sender.id] = sender.username
+    if senders:
+        with db.transaction() as conn:
+            conn.executemany("INSERT OR IGNORE INTO users (id, name, balance, gold) VALUES (?, ?, 0, 0)", senders.items())
 
 
-def close_db_connection(conn):
-    conn.close()
+def update_user(user_id, balance=None, gold=None):
+    # balance в копейках; разница с прежними значениями попадает в журнал проводок
+    ledger.set_balance(user_id, balance=balance, gold=gold)
 
 
-def create_tables_if_not_exists():
-    conn, c = get_db_connection()
-    try:
-        c.execute('''CREATE TABLE IF NOT EXISTS users
-                     (id INTEGER PRIMARY KEY, name TEXT, balance REAL, gold INTEGER)''')
-        c.execute('''CREATE TABLE IF NOT EXISTS requests
-                     (id INTEGER PRIMARY KEY AUTOINCREMENT, 
-                      user_id INTEGER, 
-                      request_type TEXT, 
-                      amount REAL, 
-                      status TEXT, 
-                      details TEXT,
-                      FOREIGN KEY(user_id) REFERENCES users(id))''')
-        conn.commit()
-    finally:
-        close_db_connection(conn)
+def create_request(user_id, request_type, amount, details='', sale_amount=None):
+    cursor = db.execute(ledger.INSERT_REQUEST, (user_id, request_type, amount, details, sale_amount, None, None))
+    return cursor.lastrowid
 
 
-def get_or_register_user(user_id, user_name):
-    conn, c = get_db_connection()
-    try:
-        c.execute("SELECT * FROM users WHERE id=?", (user_id,))
-        user = c.fetchone()
-        if user is None:
-            c.execute("INSERT INTO users (id, name, balance, gold) VALUES (?, ?, ?, ?)", (user_id, user_name, 0, 0))
-            conn.commit()
-            user = (user_id, user_name, 0, 0)
-        return user
-    finally:
-        close_db_connection(conn)
+def get_request(request_id):
+    # Данные заявки по первичному ключу: (user_id, request_type, amount, sale_amount, phone, payout)
+    return db.fetchone("SELECT user_id, request_type, amount, sale_amount, phone, payout FROM requests WHERE id = ?",
+                       (request_id,))
 
 
-def update_user(user_id, balance=None, gold=None):
-    conn, c = get_db_connection()
-    try:
-        if balance is not None:
-            c.execute("UPDATE users SET balance = ? WHERE id = ?", (balance, user_id))
-        if gold is not None:
-            c.execute("UPDATE users SET gold = ? WHERE id = ?", (gold, user_id))
-        conn.commit()
-    finally:
-        close_db_connection(conn)
+def get_pending_requests():
+    return db.fetchall("SELECT id, user_id, request_type, amount, details FROM requests WHERE status = 'pending'")
 
 
-def create_request(user_id, request_type, amount, details=''):
-    conn, c = get_db_connection()
-    try:
-        c.execute("INSERT INTO requests (user_id, request_type, amount, status, details) VALUES (?, ?, ?, ?, ?)",
-                  (user_id, request_type, amount, 'pending', details))
-        conn.commit()
-        return c.lastrowid
-    finally:
-        close_db_connection(conn)
+def update_request_status(request_id, status):
+    db.execute("UPDATE requests SET status = ? WHERE id = ?", (status, request_id))
 
 
-def get_pending_requests():
-    conn, c = get_db_connection()
-    try:
-        c.execute("SELECT id, user_id, request_type, amount, details FROM requests WHERE status = 'pending'")
-        return c.fetchall()
-    finally:
-        close_db_connection(conn)
+# Схема проверяется при первом обращении к базе, а не при импорте: импорт main.py не трогает базу
+db.setup = schema.migrate
 
+metrics.Gauge('bot_pending_requests', 'Заявки в статусе pending',
+              lambda: db.fetchone("SELECT COUNT(*) FROM requests WHERE status = 'pending'")[0])
+metrics.Gauge('bot_conversation_steps', 'Незавершённые шаги диалога', states.backlog)
+metrics.Gauge('bot_outbox_pending', 'Сообщения в очереди отправки', lambda: outbox.pending)
+metrics.Gauge('bot_user_cache_hit_ratio', 'Доля попаданий в кеш пользователей', users.hit_ratio)
 
-def update_request_status(request_id, status):
-    conn, c = get_db_connection()
-    try:
-        c.execute("UPDATE requests SET status = ? WHERE id = ?", (status, request_id))
-        conn.commit()
-    finally:
-        close_db_connection(conn)
 
+# Тексты и надписи кнопок — в locales/<язык>.json (templates.py). Пользователю отвечаем на языке его клиента,
+# админу и уведомления другим пользователям — на языке по умолчанию.
+# Постоянные клавиатуры собираются и сериализуются один раз на язык
+templates.keyboard('main_menu', ['sell'], ['buy'], ['profile'])
+templates.keyboard('main_menu_admin', ['sell'], ['buy'], ['profile'], ['admin_panel'])
+templates.keyboard('profile', ['withdraw_gold'], ['withdraw_money'], ['deposit'], ['back'])
+templates.keyboard('back', ['back'])
 
-create_tables_if_not_exists()
 
+def user_locale(event):
+    # Тексты на языке пользователя, приславшего message или callback_query
+    return templates.locale(event.from_user.language_code)
 
-def main_menu(chat_id, is_admin=False):
-    keyboard = InlineKeyboardMarkup()
-    keyboard.row(InlineKeyboardButton("Продать голду 💰", callback_data='sell'))
-    keyboard.row(InlineKeyboardButton("Купить голду 🛒", callback_data='buy'))
-    keyboard.row(InlineKeyboardButton("Профиль 👤", callback_data='profile'))
-    if is_admin:
-        keyboard.row(InlineKeyboardButton("Админ панель ⚙️", callback_data='admin_panel'))
 
-    bot.send_message(chat_id, "Выберите действие:", reply_markup=keyboard)
+def main_menu(chat_id, is_admin=False, loc=None):
+    loc = loc or templates.locale()
+    bot.send_message(chat_id, loc.text('choose_action'),
+                     reply_markup=loc.keyboard('main_menu_admin' if is_admin else 'main_menu'))
 
 
-def back_to_main_menu():
-    return InlineKeyboardButton("В главное меню 🔙", callback_data='back')
+USERS_PER_PAGE = 10
+QUEUE_PER_PAGE = 10  # Сколько заявок (пополнения и продажи вместе) показывается на одной странице
 
 
-def admin_panel(chat_id, page=0):
-    items_per_page = 10
-    conn, c = get_db_connection()
-    try:
-        c.execute("SELECT id, name, balance, gold FROM users LIMIT ? OFFSET ?", (items_per_page, page * items_per_page))
-        users_list = c.fetchall()
-        user_text = "\n".join(
-            [f"ID: {user[0]}, Ник: @{user[1]}, Баланс: {user[2]}, Голда: {user[3]}" for user in users_list])
-
-        keyboard = InlineKeyboardMarkup()
-        if page > 0:
-            keyboard.row(InlineKeyboardButton("Предыдущие 10 👈", callback_data=f'prev_{page}'))
-        c.execute("SELECT COUNT(*) FROM users")
-        total_users = c.fetchone()[0]
-        if (page + 1) * items_per_page < total_users:
-            keyboard.row(InlineKeyboardButton("Следующие 10 👉", callback_data=f'next_{page}'))
-        keyboard.row(InlineKeyboardButton("Изменить баланс/голду 🔧", callback_data='change_balance_gold'))
-
-        # Добавляем обработку заявок на пополнение
-        c.execute("SELECT id, user_id, amount FROM requests WHERE request_type = 'deposit_gold' AND status = 'pending'")
-        pending_deposits = c.fetchall()
-        for deposit in pending_deposits:
+def admin_panel(chat_id, users_after=0, queue_after=0, users_before=None, message_id=None):
+    return panel.open(chat_id, users_after, queue_after, users_before, message_id)
+
+
+def render_admin_panel(users_after=0, queue_after=0, users_before=None):
+    # Постраничный вывод по ключу (id > курсора), а не OFFSET: стоимость страницы не зависит от её номера.
+    # Курсоры пользователей и очереди заявок передаются в callback_data кнопок
+    if users_before is None:
+        users_list = db.fetchall("SELECT id, name, balance, gold FROM users WHERE id > ? ORDER BY id LIMIT ?",
+                                 (users_after, USERS_PER_PAGE + 1))
+        has_next = len(users_list) > USERS_PER_PAGE
+        users_list = users_list[:USERS_PER_PAGE]
+        has_prev = bool(users_list) and db.fetchone("SELECT 1 FROM users WHERE id < ? LIMIT 1", (users_list[0][0],)) is not None
+    else:
+        users_list = db.fetchall("SELECT id, name, balance, gold FROM users WHERE id < ? ORDER BY id DESC LIMIT ?",
+                                 (users_before, USERS_PER_PAGE + 1))
+        has_prev = len(users_list) > USERS_PER_PAGE
+        users_list = users_list[:USERS_PER_PAGE][::-1]
+        has_next = True
+    if users_list:
+        users_after = users_list[0][0] - 1
+    loc = templates.locale()
+    users_row = loc.template('users_row')
+    user_text = "\n".join(
+        [users_row(id=user[0], name=user[1], balance=money.rub(user[2]), gold=user[3]) for user in users_list])
+    total_users = db.fetchone("SELECT value FROM counters WHERE name = 'users'")[0]
+
+    keyboard = InlineKeyboardMarkup()
+    if has_prev:
+        keyboard.row(loc.button('prev_users', f'prev_{users_list[0][0]}_{queue_after}'))
+    if has_next and users_list:
+        keyboard.row(loc.button('next_users', f'next_{users_list[-1][0]}_{queue_after}'))
+    keyboard.row(loc.button('change_balance_gold'))
+    keyboard.row(loc.button('bulk_requests'))
+
+    # Заявки на пополнение и продажу голды одной очередью по id, не больше QUEUE_PER_PAGE строк
+    pending = []
+    for request_type in ('deposit_gold', 'sell_gold'):
+        pending += db.fetchall("SELECT id, user_id, request_type, amount FROM requests "
+                               "WHERE status = 'pending' AND request_type = ? AND id > ? ORDER BY id LIMIT ?",
+                               (request_type, queue_after, QUEUE_PER_PAGE + 1))
+    pending.sort()
+    for request_id, user_id, request_type, amount in pending[:QUEUE_PER_PAGE]:
+        if request_type == 'deposit_gold':
             keyboard.row(
-                InlineKeyboardButton(f"Подтвердить пополнение {deposit[2]} голды для @{deposit[1]} ✅",
-                                     callback_data=f'confirm_deposit_gold_{deposit[0]}'),
-                InlineKeyboardButton(f"Отклонить пополнение {deposit[2]} голды для @{deposit[1]} ❌",
-                                     callback_data=f'reject_deposit_gold_{deposit[0]}')
+                loc.button('confirm_deposit_row', f'confirm_deposit_gold_{request_id}', amount=amount, user_id=user_id),
+                loc.button('reject_deposit_row', f'reject_deposit_gold_{request_id}', amount=amount, user_id=user_id)
             )
-
-        # Продажа голды
-        c.execute(
-            "SELECT id, user_id, amount, details FROM requests WHERE request_type = 'sell_gold' AND status = 'pending'")
-        pending_sales = c.fetchall()
-        for sale in pending_sales:
+        else:
             keyboard.row(
-                InlineKeyboardButton(f"Подтвердить продажу {sale[2]} голды от @{sale[1]} ✅",
-                                     callback_data=f'confirm_sale_{sale[0]}'),
-                InlineKeyboardButton(f"Отклонить продажу {sale[2]} голды от @{sale[1]} ❌",
-                                     callback_data=f'reject_sale_{sale[0]}')
+                loc.button('confirm_sale_row', f'confirm_sale_{request_id}', amount=amount, user_id=user_id),
+                loc.button('reject_sale_row', f'reject_sale_{request_id}', amount=amount, user_id=user_id)
             )
+    if queue_after > 0:
+        keyboard.row(loc.button('queue_start', f'queue_{users_after}_0'))
+    if len(pending) > QUEUE_PER_PAGE:
+        keyboard.row(loc.button('queue_next', f'queue_{users_after}_{pending[QUEUE_PER_PAGE - 1][0]}'))
+
+    keyboard.add(loc.button('back'))
+    return loc.text('users_page', total=total_users, rows=user_text), keyboard
+
+
+# Массовая обработка: (тип заявки, ключ названия, ключ ответа пользователю при подтверждении, при отклонении).
+# Продажу и пополнение голды разом подтвердить нельзя — для них нужен скриншот или сумма от админа
+BULK_TYPES = (
+    ('withdraw_gold', 'bulk_withdraw_gold', 'withdraw_gold_done', 'withdraw_gold_rejected'),
+    ('withdraw_money', 'bulk_withdraw_money', 'withdraw_money_done', 'withdraw_money_rejected'),
+    ('sell_gold', 'bulk_sell_gold', None, 'sell_gold_rejected'),
+    ('deposit_gold', 'bulk_deposit_gold', None, None),
+)
+
+
+def render_bulk():
+    # Кнопки несут id последней заявки на момент отрисовки: заявки, пришедшие позже, админ ещё не видел
+    pending = {row[0]: row[1:] for row in db.fetchall(
+        "SELECT request_type, COUNT(*), max(id) FROM requests WHERE status = 'pending' GROUP BY request_type")}
+    loc = templates.locale()
+    lines = []
+    keyboard = InlineKeyboardMarkup()
+    for index, (request_type, label, accepted, _) in enumerate(BULK_TYPES):
+        if request_type not in pending:
+            continue
+        count, max_id = pending[request_type]
+        label = loc.text(label)
+        lines.append(loc.text('bulk_line', label=label, count=count))
+        row = [loc.button('bulk_reject', f'bulk_reject_{index}_{max_id}', label=label.lower())]
+        if accepted:
+            row.insert(0, loc.button('bulk_accept', f'bulk_accept_{index}_{max_id}', label=label.lower()))
+        keyboard.row(*row)
+    keyboard.row(loc.button('admin_panel'))
+    return loc.text('bulk_summary', lines="\n".join(lines) or loc.text('bulk_empty')), keyboard
+
+
+# Панель редактируется на месте и перерисовывается только при изменении данных (admin_view.py)
+panel = AdminView(bot, outbox, render_admin_panel)
+
+
+def load_callback_user(call):
+    return get_or_register_user(call.from_user.id, call.from_user.username)
+
+
+router = Router(bot, lambda call: call.from_user.id == ADMIN_ID, load_callback_user)
+ADMIN_PANEL_DENIED = templates.locale().text('admin_panel_denied')
+
+
+@router.route('back')
+def on_back(call):
+    main_menu(call.message.chat.id, call.from_user.id == ADMIN_ID, user_locale(call))
+
+
+@router.route('sell')
+def on_sell(call):
+    loc = user_locale(call)
+    bot.edit_message_text(chat_id=call.message.chat.id, message_id=call.message.message_id,
+                          text=loc.text('sell_prompt'), reply_markup=loc.keyboard('back'))
+    states.set_step(call.message.chat.id, sell_gold)
+
+
+@router.route('buy')
+def on_buy(call):
+    loc = user_locale(call)
+    bot.edit_message_text(chat_id=call.message.chat.id, message_id=call.message.message_id,
+                          text=loc.text('buy_prompt'), reply_markup=loc.keyboard('back'))
+    states.set_step(call.message.chat.id, buy_gold)
+
+
+@router.route('profile', user=True)
+def on_profile(call, user):
+    loc = user_locale(call)
+    bot.answer_callback_query(call.id, loc.text('profile_title'))
+    bot.edit_message_text(chat_id=call.message.chat.id, message_id=call.message.message_id,
+                          text=loc.text('profile', id=user.id, name=user.name, balance=money.rub(user.balance),
+                                        gold=user.gold),
+                          reply_markup=loc.keyboard('profile'))
+
+
+@router.route('withdraw_gold')
+def on_withdraw_gold(call):
+    bot.edit_message_text(chat_id=call.message.chat.id, message_id=call.message.message_id,
+                          text=user_locale(call).text('withdraw_gold_prompt'))
+    states.set_step(call.message.chat.id, initiate_withdrawal_gold)
+
+
+@router.route('withdraw_money')
+def on_withdraw_money(call):
+    bot.edit_message_text(chat_id=call.message.chat.id, message_id=call.message.message_id,
+                          text=user_locale(call).text('withdraw_money_prompt'))
+    states.set_step(call.message.chat.id, initiate_withdrawal_money)
+
+
+@router.route('deposit')
+def on_deposit(call):
+    start_deposit(call.message)
+
+
+@router.route('admin_panel', admin=True, denied=ADMIN_PANEL_DENIED)
+def on_admin_panel(call):
+    admin_panel(call.message.chat.id, message_id=call.message.message_id)
+
 
-        keyboard.add(back_to_main_menu())
+@router.route('next_', 'queue_', args=(int, int), admin=True, denied=ADMIN_PANEL_DENIED)
+def on_admin_page(call, user_cursor, queue_cursor):
+    admin_panel(call.message.chat.id, user_cursor, queue_cursor, message_id=call.message.message_id)
 
-        try:
-            # Попытка редактирования сообщения
-            bot.edit_message_text(chat_id=chat_id, message_id=bot.last_update_id, text=f"Пользователи:\n{user_text}",
-                                  reply_markup=keyboard)
-        except Exception as e:
-            # Если редактирование не удалось, отправляем новое сообщение
-            bot.send_message(chat_id, f"Пользователи:\n{user_text}", reply_markup=keyboard)
 
-    finally:
-        close_db_connection(conn)
+@router.route('prev_', args=(int, int), admin=True, denied=ADMIN_PANEL_DENIED)
+def on_admin_prev_page(call, user_cursor, queue_cursor):
+    admin_panel(call.message.chat.id, queue_after=queue_cursor, users_before=user_cursor,
+                message_id=call.message.message_id)
+
+
+@router.route('change_balance_gold', admin=True)
+def on_change_balance_gold(call):
+    loc = user_locale(call)
+    bot.edit_message_text(chat_id=call.message.chat.id, message_id=call.message.message_id,
+                          text=loc.text('change_balance_prompt'), reply_markup=loc.keyboard('back'))
+    states.set_step(call.message.chat.id, handle_balance_gold_change)
+
+
+@router.route('bulk_requests', admin=True, denied=ADMIN_PANEL_DENIED)
+def on_bulk_requests(call):
+    text, keyboard = render_bulk()
+    bot.send_message(call.message.chat.id, text, reply_markup=keyboard)
+
+
+@router.route('bulk_accept_', args=(int, int), admin=True)
+def on_bulk_accept(call, type_index, max_id):
+    handle_bulk(call, type_index, max_id, 'accepted')
+
+
+@router.route('bulk_reject_', args=(int, int), admin=True)
+def on_bulk_reject(call, type_index, max_id):
+    handle_bulk(call, type_index, max_id, 'rejected')
+
+
+@router.route('handle_request_', args=(int, str), admin=True)
+def on_handle_request(call, request_id, action):
+    handle_request(request_id, action, call)
+
+
+def skin_sale_request(call, request_id):
+    # Кнопки «Купил скин» и «Отменить вывод» получает владелец заявки (handle_skin_screenshot):
+    # нажать их может он или админ, нажатия остальных и кнопки с id заявки другого типа игнорируются
+    request = get_request(request_id)
+    if request is None or request[1] != 'sell_gold' or call.from_user.id not in (request[0], ADMIN_ID):
+        return None
+    return request
+
+
+# Кнопки по заявке несут только её id, пользователь и сумма берутся из строки requests
+@router.route('buy_skin_', args=(int,))
+def on_buy_skin(call, request_id):
+    request = skin_sale_request(call, request_id)
+    if request is None:
+        return
+    buyer_id, sale_amount = request[0], request[3]
+    if ledger.credit(buyer_id, balance=sale_amount, request_id=request_id, kind='sale') is None:
+        bot.send_message(call.message.chat.id, user_locale(call).text('request_closed', request_id=request_id))
+        return
+    bot.send_message(buyer_id, templates.locale().text('skin_purchased', amount=money.rub(sale_amount)))
+    bot.send_message(ADMIN_ID, templates.locale().text('skin_purchased_admin'))
+    panel.refresh(ADMIN_ID)  # Обновляем админ панель
+
+
+@router.route('cancel_skin_sale_', args=(int,))
+def on_cancel_skin_sale(call, request_id):
+    request = skin_sale_request(call, request_id)
+    if request is None:
+        return
+    if not ledger.close(request_id, 'cancelled'):
+        bot.send_message(call.message.chat.id, user_locale(call).text('request_closed', request_id=request_id))
+        return
+    bot.send_message(request[0], templates.locale().text('skin_sale_cancelled'))
+    bot.send_message(ADMIN_ID, templates.locale().text('skin_sale_cancelled'))
+    panel.refresh(ADMIN_ID)  # Обновляем админ панель
+
+
+@router.route('confirm_sale_', args=(int,), admin=True)
+def on_confirm_sale(call, request_id):
+    bot.send_message(call.message.chat.id, user_locale(call).text('send_skin_screenshot'))
+    states.set_step(call.message.chat.id, handle_admin_screenshot, request_id)
+
+
+@router.route('reject_sale_', args=(int,), admin=True)
+def on_reject_sale(call, request_id):
+    if not ledger.close(request_id, 'rejected'):
+        bot.send_message(call.message.chat.id, user_locale(call).text('request_closed', request_id=request_id))
+        return
+    bot.send_message(call.message.chat.id, user_locale(call).text('sale_rejected_admin'))
+    panel.refresh(call.message.chat.id)  # Обновляем админ панель
+
+
+@router.route('finalize_purchase_', args=(int,), admin=True)
+def on_finalize_purchase(call, request_id):
+    request = get_request(request_id)
+    if request is None:
+        return
+    buyer_id, sale_amount = request[0], request[3]
+    if ledger.credit(buyer_id, balance=sale_amount, request_id=request_id, kind='sale') is None:
+        bot.send_message(call.message.chat.id, user_locale(call).text('request_closed', request_id=request_id))
+        return
+    bot.send_message(buyer_id, templates.locale().text('skin_purchased', amount=money.rub(sale_amount)))
+    bot.send_message(call.message.chat.id, user_locale(call).text('purchase_confirmed_admin'))
+    panel.refresh(call.message.chat.id)  # Обновляем админ панель
+
+
+@router.route('dispute_purchase_', args=(int,), admin=True)
+def on_dispute_purchase(call, request_id):
+    loc = user_locale(call)
+    if not ledger.close(request_id, 'disputed'):
+        bot.send_message(call.message.chat.id, loc.text('request_closed', request_id=request_id))
+        return
+    bot.send_message(call.message.chat.id, loc.text('purchase_disputed'))
+    # Доказательства по заявке из архива — сами файлы, а не file_id
+    for digest, kind in archive.screenshots(request_id):
+        kind = loc.text('screenshot_' + kind) if 'screenshot_' + kind in loc.texts else kind
+        outbox.submit(call.message.chat.id, archive.send, bot, call.message.chat.id, digest,
+                      caption=loc.text('screenshot_caption', kind=kind, request_id=request_id))
+    panel.refresh(call.message.chat.id)  # Обновляем админ панель
+
+
+@router.route('confirm_purchase_', args=(int,))
+def on_confirm_purchase(call, request_id):
+    request = get_request(request_id)
+    if request is None:
+        return
+    bot.send_message(call.message.chat.id, user_locale(call).text('send_purchase_screenshot'))
+    states.set_step(call.message.chat.id, handle_buyer_screenshot, request[0], request_id, request[3])
+
+
+# Кнопки, отправленные до перехода на id заявки (prefix_пользователь_заявка[_сумма]): id заявки второй
+for prefix, handler, args, admin in (('buy_skin_', on_buy_skin, (int, int, str), False),
+                                     ('cancel_skin_sale_', on_cancel_skin_sale, (int, int), False),
+                                     ('finalize_purchase_', on_finalize_purchase, (int, int, str), True),
+                                     ('confirm_purchase_', on_confirm_purchase, (int, int, str), False)):
+    router.route(prefix, args=args, admin=admin)(lambda call, _, request_id, *rest, handler=handler: handler(call, request_id))
+
+
+@router.route('confirm_deposit_gold_', args=(int,), admin=True)
+def on_confirm_deposit_gold(call, request_id):
+    bot.send_message(call.message.chat.id, user_locale(call).text('deposit_gold_prompt'))
+    states.set_step(call.message.chat.id, finalize_deposit_gold, request_id)
+
+
+@router.route('reject_deposit_gold_', args=(int,), admin=True)
+def on_reject_deposit_gold(call, request_id):
+    if not ledger.close(request_id, 'rejected'):
+        bot.send_message(call.message.chat.id, user_locale(call).text('request_closed', request_id=request_id))
+        return
+    bot.send_message(call.message.chat.id, user_locale(call).text('deposit_gold_rejected_admin'))
+    panel.refresh(call.message.chat.id)  # Обновляем админ панель
 
 
 @bot.callback_query_handler(func=lambda call: True)
 def callback_query(call):
     try:
-        user = get_or_register_user(call.from_user.id, call.from_user.username)
-        keyboard = InlineKeyboardMarkup().add(back_to_main_menu())
-
-        if call.data == "back":
-            main_menu(call.message.chat.id, call.from_user.id == ADMIN_ID)
-        elif call.data == "sell":
-            bot.edit_message_text(chat_id=call.message.chat.id, message_id=call.message.message_id,
-                                  text="Введите количество голды для продажи:", reply_markup=keyboard)
-            bot.register_next_step_handler(call.message, sell_gold)
-        elif call.data == "buy":
-            bot.edit_message_text(chat_id=call.message.chat.id, message_id=call.message.message_id,
-                                  text="Введите количество голды для покупки:", reply_markup=keyboard)
-            bot.register_next_step_handler(call.message, buy_gold)
-        elif call.data == "profile":
-            profile_keyboard = InlineKeyboardMarkup()
-            profile_keyboard.row(InlineKeyboardButton("Вывести голду 💸", callback_data='withdraw_gold'))
-            profile_keyboard.row(InlineKeyboardButton("Вывести деньги 💳", callback_data='withdraw_money'))
-            profile_keyboard.row(InlineKeyboardButton("Пополнить баланс 🔄", callback_data='deposit'))
-            profile_keyboard.add(back_to_main_menu())
-            bot.answer_callback_query(call.id, "Профиль пользователя")
-            bot.edit_message_text(chat_id=call.message.chat.id, message_id=call.message.message_id,
-                                  text=f"Профиль:\nID: {user[0]}\nИмя: @{user[1]}\nБаланс: {user[2]}\nГолда: {user[3]}",
-                                  reply_markup=profile_keyboard)
-        elif call.data == "withdraw_gold":
-            bot.edit_message_text(chat_id=call.message.chat.id, message_id=call.message.message_id,
-                                  text="Введите количество голды для вывода (не менее 100):")
-            bot.register_next_step_handler(call.message, initiate_withdrawal_gold)
-        elif call.data == "withdraw_money":
-            bot.edit_message_text(chat_id=call.message.chat.id, message_id=call.message.message_id,
-                                  text="Введите сумму и номер телефона для вывода (через пробел, сумма не менее 100):")
-            bot.register_next_step_handler(call.message, initiate_withdrawal_money)
-        elif call.data == "deposit":
-            start_deposit(call.message)
-        elif call.data == "admin_panel":
-            if call.from_user.id == ADMIN_ID:
-                admin_panel(call.message.chat.id)
-            else:
-                bot.answer_callback_query(call.id, "У вас нет доступа к админ-панели.", show_alert=True)
-        elif 'next_' in call.data or 'prev_' in call.data:
-            page = int(call.data.split('_')[1]) + (1 if 'next' in call.data else -1)
-            admin_panel(call.message.chat.id, page)
-        elif call.data == "change_balance_gold":
-            if call.from_user.id == ADMIN_ID:
-                bot.edit_message_text(chat_id=call.message.chat.id, message_id=call.message.message_id,
-                                      text="Введите ID пользователя, затем новое значение баланса и голды (через пробел):",
-                                      reply_markup=InlineKeyboardMarkup().add(back_to_main_menu()))
-                bot.register_next_step_handler(call.message, handle_balance_gold_change)
-            else:
-                bot.answer_callback_query(call.id, "У вас нет доступа к этой функции.", show_alert=True)
-        elif call.data.startswith("handle_request_"):
-            request_id, action = call.data.split('_')[2:]
-            if call.from_user.id == ADMIN_ID:
-                handle_request(request_id, action, call)
-            else:
-                bot.answer_callback_query(call.id, "У вас нет доступа к этой функции.", show_alert=True)
-        elif call.data.startswith("buy_skin_"):
-            buyer_id, request_id, sale_amount = call.data.split('_')[2:]
-            update_user(int(buyer_id), balance=float(sale_amount))
-            bot.send_message(int(buyer_id), f"Покупка скина подтверждена. На ваш баланс зачислено {sale_amount:.2f}.")
-            update_request_status(request_id, 'completed')
-            bot.send_message(call.message.chat.id, "Покупка скина подтверждена, баланс обновлён.")
-            admin_panel(call.message.chat.id)  # Обновляем админ панель
-        elif call.data.startswith("cancel_skin_sale_"):
-            seller_id, request_id = call.data.split('_')[3:]
-            bot.send_message(int(seller_id), "Продажа скина отменена.")
-            update_request_status(request_id, 'cancelled')
-            bot.send_message(call.message.chat.id, "Продажа скина отменена.")
-            admin_panel(call.message.chat.id)  # Обновляем админ панель
-        elif call.data.startswith("confirm_sale_"):
-            request_id = call.data.split('_')[2]
-            if call.from_user.id == ADMIN_ID:
-                bot.send_message(call.message.chat.id, "Отправьте скриншот скина.")
-                bot.register_next_step_handler(call.message, lambda msg: handle_admin_screenshot(msg, request_id))
-            else:
-                bot.answer_callback_query(call.id, "У вас нет доступа к этой функции.", show_alert=True)
-        elif call.data.startswith("reject_sale_"):
-            request_id = call.data.split('_')[2]
-            if call.from_user.id == ADMIN_ID:
-                update_request_status(request_id, 'rejected')
-                bot.send_message(call.message.chat.id, "Заявка на продажу отклонена.")
-                admin_panel(call.message.chat.id)  # Обновляем админ панель
-            else:
-                bot.answer_callback_query(call.id, "У вас нет доступа к этой функции.", show_alert=True)
-        elif call.data.startswith("finalize_purchase_"):
-            buyer_id, request_id, sale_amount = call.data.split('_')[2:]
-            if call.from_user.id == ADMIN_ID:
-                update_user(int(buyer_id), balance=float(sale_amount))
-                update_request_status(request_id, 'completed')
-                bot.send_message(int(buyer_id), f"Покупка скина подтверждена. На ваш баланс зачислено {sale_amount:.2f}.")
-                bot.send_message(call.message.chat.id, "Покупка подтверждена, баланс обновлён.")
-                admin_panel(call.message.chat.id)  # Обновляем админ панель
-            else:
-                bot.answer_callback_query(call.id, "У вас нет доступа к этой функции.", show_alert=True)
-
-        elif call.data.startswith("dispute_purchase_"):
-            request_id = call.data.split('_')[2]
-            if call.from_user.id == ADMIN_ID:
-                update_request_status(request_id, 'disputed')
-                bot.send_message(call.message.chat.id, "Покупка оспорена.")
-                admin_panel(call.message.chat.id)  # Обновляем админ панель
-            else:
-                bot.answer_callback_query(call.id, "У вас нет доступа к этой функции.", show_alert=True)
-        elif call.data.startswith("confirm_purchase_"):
-            buyer_id, request_id, sale_amount = call.data.split('_')[2:]
-            bot.send_message(call.message.chat.id, "Отправьте скриншот купленного скина.")
-            bot.register_next_step_handler(call.message, lambda msg: handle_buyer_screenshot(msg, buyer_id, request_id, sale_amount))
-
-        elif call.data.startswith("finalize_purchase_"):
-            buyer_id, request_id, sale_amount = call.data.split('_')[2:]
-            if call.from_user.id == ADMIN_ID:
-                update_user(int(buyer_id), balance=float(sale_amount))
-                update_request_status(request_id, 'completed')
-                bot.send_message(int(buyer_id),
-                                 f"Покупка скина подтверждена. На ваш баланс зачислено {sale_amount:.2f}.")
-                bot.send_message(call.message.chat.id, "Покупка подтверждена, баланс обновлён.")
-                admin_panel(call.message.chat.id)  # Обновляем админ панель
-            else:
-                bot.answer_callback_query(call.id, "У вас нет доступа к этой функции.", show_alert=True)
-
-        elif call.data.startswith("dispute_purchase_"):
-            request_id = call.data.split('_')[2]
-            if call.from_user.id == ADMIN_ID:
-                update_request_status(request_id, 'disputed')
-                bot.send_message(call.message.chat.id, "Покупка оспорена.")
-                admin_panel(call.message.chat.id)  # Обновляем админ панель
-            else:
-                bot.answer_callback_query(call.id, "У вас нет доступа к этой функции.", show_alert=True)
-
-        elif call.data.startswith("confirm_deposit_gold_"):
-            request_id = call.data.split('_')[3]
-            if call.from_user.id == ADMIN_ID:
-                bot.send_message(call.message.chat.id, "Введите количество голды для зачисления:")
-                bot.register_next_step_handler(call.message, lambda msg: finalize_deposit_gold(msg, request_id))
-            else:
-                bot.answer_callback_query(call.id, "У вас нет доступа к этой функции.", show_alert=True)
-
-        elif call.data.startswith("reject_deposit_gold_"):
-            request_id = call.data.split('_')[3]
-            if call.from_user.id == ADMIN_ID:
-                update_request_status(request_id, 'rejected')
-                bot.send_message(call.message.chat.id, "Заявка на пополнение голды отклонена.")
-                admin_panel(call.message.chat.id)  # Обновляем админ панель
-            else:
-                bot.answer_callback_query(call.id, "У вас нет доступа к этой функции.", show_alert=True)
-
+        router.dispatch(call)
     except Exception as e:
-        bot.send_message(call.message.chat.id, f"Произошла ошибка: {str(e)}")
-        main_menu(call.message.chat.id, call.from_user.id == ADMIN_ID)
+        metrics.ERRORS.inc('callback')
+        logging.exception("Ошибка при обработке кнопки %s", call.data)
+        loc = user_locale(call)
+        bot.send_message(call.message.chat.id, loc.text('error', error=e))
+        main_menu(call.message.chat.id, call.from_user.id == ADMIN_ID, loc)
 
 
+@states.step
 def handle_balance_gold_change(message):
+    loc = user_locale(message)
     try:
         user_id, new_balance, new_gold = message.text.split()
         user_id = int(user_id)
-        new_balance = float(new_balance)
+        new_balance = money.kopecks(new_balance)
         new_gold = int(new_gold)
         update_user(user_id, balance=new_balance, gold=new_gold)
-        bot.send_message(message.chat.id, f"Баланс и голда для пользователя с ID {user_id} обновлены.")
+        bot.send_message(message.chat.id, loc.text('balance_updated', user_id=user_id))
     except ValueError:
-        bot.send_message(message.chat.id,
-                         "Неверный формат ввода. Пожалуйста, введите ID пользователя, новый баланс и голду через пробел.")
-    main_menu(message.chat.id, message.from_user.id == ADMIN_ID)
+        bot.send_message(message.chat.id, loc.text('balance_format_error'))
+    main_menu(message.chat.id, message.from_user.id == ADMIN_ID, loc)
 
 
+@states.step
 def buy_gold(message):
+    loc = user_locale(message)
     try:
         amount = int(message.text)
-        user = get_or_register_user(message.from_user.id, message.from_user.username)
-        if user[2] >= amount * 0.7:  # Проверка баланса
-            new_balance = user[2] - amount * 0.7
-            new_gold = user[3] + amount
-            update_user(message.from_user.id, balance=new_balance, gold=new_gold)
-            bot.send_message(message.chat.id,
-                             f"Покупка успешна! Ваш новый баланс: {new_balance:.2f}, голда: {new_gold}")
+        result = ledger.buy_gold(message.from_user.id, amount, money.buy_price(amount))  # Проверка баланса и списание
+        if result:
+            new_balance, new_gold = result
+            bot.send_message(message.chat.id, loc.text('buy_success', balance=money.rub(new_balance), gold=new_gold))
         else:
-            bot.send_message(message.chat.id, "Недостаточно средств для покупки.")
+            bot.send_message(message.chat.id, loc.text('buy_no_funds'))
     except ValueError:
-        bot.send_message(message.chat.id, "Введите корректное число.")
-    main_menu(message.chat.id, message.from_user.id == ADMIN_ID)
+        bot.send_message(message.chat.id, loc.text('invalid_number'))
+    main_menu(message.chat.id, message.from_user.id == ADMIN_ID, loc)
 
 
+@states.step
 def initiate_withdrawal_gold(message):
+    loc = user_locale(message)
     try:
         amount = int(message.text)
         if amount < 100:
-            bot.send_message(message.chat.id, "Минимальная сумма для вывода 100 голды.")
+            bot.send_message(message.chat.id, loc.text('withdraw_gold_min'))
         else:
-            user = get_or_register_user(message.from_user.id, message.from_user.username)
-            if user[3] >= amount:
-                withdrawal_amount = amount / 0.8  # Так как после вычета 20% должно остаться amount голды
-                new_balance = int(withdrawal_amount) + 0.52  # Округление до целого и добавление 52 копеек
-                update_user(message.from_user.id, gold=user[3] - amount)
-                request_id = create_request(message.from_user.id, 'withdraw_gold', amount, f"Сумма: {new_balance:.2f}")
-                withdrawal_info = f"Пользователь @{user[1]} запрашивает вывод {amount} голды, сумма: {new_balance:.2f}"
-
-                bot.send_message(message.from_user.id, "Пожалуйста, отправьте скриншот подтверждения платежа.")
-                bot.register_next_step_handler(message, lambda msg: handle_screenshot(msg, withdrawal_info, request_id, amount))
+            payout = money.gold_payout(amount)
+            result = ledger.withdraw_gold(message.from_user.id, amount, payout)
+            if result:
+                request_id, user_name = result
+                withdrawal_info = templates.locale().text('withdraw_gold_request', name=user_name, amount=amount,
+                                                          payout=money.rub(payout))
+
+                bot.send_message(message.from_user.id, loc.text('withdrawal_screenshot'))
+                states.set_step(message.chat.id, handle_screenshot, withdrawal_info, request_id, amount)
             else:
-                bot.send_message(message.chat.id, "Недостаточно голды на балансе.")
+                bot.send_message(message.chat.id, loc.text('no_gold'))
     except ValueError:
-        bot.send_message(message.chat.id, "Введите корректное число для вывода.")
+        bot.send_message(message.chat.id, loc.text('withdraw_gold_invalid'))
 
 
+@states.step
 def initiate_withdrawal_money(message):
+    loc = user_locale(message)
     try:
         amount, phone = message.text.split()
-        amount = float(amount)
-        if amount < 100:
-            bot.send_message(message.chat.id, "Минимальная сумма для вывода 100 рублей.")
+        amount = money.kopecks(amount)
+        if amount < 100 * money.KOPECKS:
+            bot.send_message(message.chat.id, loc.text('withdraw_money_min'))
         else:
-            user = get_or_register_user(message.from_user.id, message.from_user.username)
-            if user[2] >= amount:
-                update_user(message.from_user.id, balance=user[2] - amount)  # Сразу списываем сумму
-                request_id = create_request(message.from_user.id, 'withdraw_money', amount, f"Номер телефона: {phone}")
-                withdrawal_info = f"Пользователь @{user[1]} запрашивает вывод {amount} руб на номер {phone}"
+            result = ledger.withdraw_money(message.from_user.id, amount, phone)  # Сразу списываем сумму
+            if result:
+                request_id, user_name = result
+                admin = templates.locale()
+                withdrawal_info = admin.text('withdraw_money_request', name=user_name, amount=money.rub(amount),
+                                             phone=phone)
                 bot.send_message(ADMIN_ID, withdrawal_info, reply_markup=InlineKeyboardMarkup().row(
-                    InlineKeyboardButton("Выведено ✅", callback_data=f'handle_request_{request_id}_accept'),
-                    InlineKeyboardButton("Отменить вывод ❌", callback_data=f'handle_request_{request_id}_reject')
+                    admin.button('withdrawn', f'handle_request_{request_id}_accept'),
+                    admin.button('cancel_withdrawal', f'handle_request_{request_id}_reject')
                 ))
-                bot.send_message(message.chat.id, "Заявка на вывод отправлена администратору.")
+                bot.send_message(message.chat.id, loc.text('withdrawal_sent'))
             else:
-                bot.send_message(message.chat.id, "Недостаточно средств на балансе.")
+                bot.send_message(message.chat.id, loc.text('no_money'))
     except ValueError:
-        bot.send_message(message.chat.id, "Введите корректные данные для вывода (сумма и номер телефона через пробел).")
+        bot.send_message(message.chat.id, loc.text('withdraw_money_invalid'))
 
 
+@states.step
 def sell_gold(message):
+    loc = user_locale(message)
     try:
         amount = int(message.text)
         user = get_or_register_user(message.from_user.id, message.from_user.username)
         # Сумма продажи после комиссии
-        sale_amount = amount * 0.8
-        request_id = create_request(message.from_user.id, 'sell_gold', amount, f"Сумма продажи: {sale_amount:.2f}")
-        bot.send_message(message.chat.id, f"Вы продаете {amount} голды. Покупатель должен купить скин за {sale_amount:.2f}. Отправьте админу скриншот выставленного скина.")
-        bot.register_next_step_handler(message, lambda msg: handle_skin_sale(msg, request_id, sale_amount, amount))
+        sale_amount = money.sale_amount(amount)
+        request_id = create_request(message.from_user.id, 'sell_gold', amount, sale_amount=sale_amount)
+        bot.send_message(message.chat.id, loc.text('sell_info', amount=amount, sale_amount=money.rub(sale_amount)))
+        states.set_step(message.chat.id, handle_skin_sale, request_id, sale_amount, amount)
     except ValueError:
-        bot.send_message(message.chat.id, "Введите корректное число голды для продажи.")
+        bot.send_message(message.chat.id, loc.text('sell_invalid'))
 
+@states.step
 def handle_skin_sale(message, request_id, sale_amount, amount):
     if message.content_type == 'photo':
-        file_info = bot.get_file(message.photo[-1].file_id)
-        downloaded_file = bot.download_file(file_info.file_path)
         user = get_or_register_user(message.from_user.id, message.from_user.username)
-        sale_info = f"Пользователь @{user[1]} продает {amount} голды. Сумма продажи: {sale_amount:.2f}"
-        bot.send_photo(ADMIN_ID, downloaded_file, caption=sale_info, reply_markup=InlineKeyboardMarkup().row(
-            InlineKeyboardButton("Подтвердить продажу ✅", callback_data=f'confirm_sale_{request_id}'),
-            InlineKeyboardButton("Отклонить продажу ❌", callback_data=f'reject_sale_{request_id}')
+        admin = templates.locale()
+        sale_info = admin.text('sale_request', name=user.name, amount=amount, sale_amount=money.rub(sale_amount))
+        media.relay_photo(bot, ADMIN_ID, message, check_duplicate=True, request_id=request_id, kind='sale', caption=sale_info, reply_markup=InlineKeyboardMarkup().row(
+            admin.button('confirm_sale', f'confirm_sale_{request_id}'),
+            admin.button('reject_sale', f'reject_sale_{request_id}')
         ))
-        bot.send_message(message.chat.id, "Заявка на продажу голды отправлена администратору.")
+        bot.send_message(message.chat.id, user_locale(message).text('sale_sent'))
     else:
-        bot.send_message(message.chat.id, "Пожалуйста, отправьте скриншот скина.")
-        bot.register_next_step_handler(message, lambda msg: handle_skin_sale(msg, request_id, sale_amount, amount))
+        bot.send_message(message.chat.id, user_locale(message).text('need_skin_screenshot'))
+        states.set_step(message.chat.id, handle_skin_sale, request_id, sale_amount, amount)
 
 
 def handle_accept_request(request_id, call):
-    conn, c = get_db_connection()
-    try:
-        c.execute("SELECT user_id, request_type, amount, details FROM requests WHERE id = ?", (request_id,))
-        request = c.fetchone()
-        if request:
-            user_id, request_type, amount, details = request
-            if request_type == 'withdraw_gold':
-                bot.send_message(user_id, "Ваша заявка на вывод голды успешно обработана.")
-            elif request_type == 'withdraw_money':
-                bot.send_message(user_id, "Ваша заявка на вывод денег успешно обработана.")
-                # Здесь должно быть реальное выполнение перевода
-            elif request_type == 'sell_gold':
-                bot.send_message(user_id, "Ваша заявка на продажу голды принята. Ожидайте скриншот скина.")
-                sale_amount = float(details.split(',')[1].split(':')[1].strip())
-                bot.send_message(call.message.chat.id, "Запросите скриншот скина у продавца.")
-                bot.register_next_step_handler(call.message,
-                                               lambda msg: handle_skin_screenshot(msg, user_id, request_id,
-                                                                                  sale_amount))
-
-            update_request_status(request_id, 'accepted')
-            admin_panel(call.message.chat.id)  # Обновляем админ панель
-    finally:
-        close_db_connection(conn)
+    # Заявка подтверждается только из pending (ledger.accept): по отклонённой или просроченной
+    # списанное уже вернулось, и «выведено» пользователю не уходит
+    request = ledger.accept(request_id)
+    if request is None:
+        report_closed(call, request_id)
+        return
+    user_id, request_type, amount, sale_amount = request
+    loc = templates.locale()
+    if request_type == 'withdraw_gold':
+        bot.send_message(user_id, loc.text('withdraw_gold_done'))
+    elif request_type == 'withdraw_money':
+        bot.send_message(user_id, loc.text('withdraw_money_done'))
+        # Здесь должно быть реальное выполнение перевода
+    elif request_type == 'sell_gold':
+        bot.send_message(user_id, loc.text('sell_gold_accepted'))
+        bot.send_message(call.message.chat.id, user_locale(call).text('request_skin_screenshot'))
+        states.set_step(call.message.chat.id, handle_skin_screenshot, user_id, request_id, sale_amount)
+    panel.refresh(call.message.chat.id)  # Обновляем админ панель
+
+
+def report_closed(call, request_id):
+    status = db.fetchone("SELECT status FROM requests WHERE id = ?", (request_id,))
+    if status is not None and status[0] == 'expired':
+        # Списанное по просроченной заявке уже вернулось пользователю
+        bot.send_message(call.message.chat.id, user_locale(call).text('request_expired_admin', request_id=request_id))
+    else:
+        bot.send_message(call.message.chat.id, user_locale(call).text('request_closed', request_id=request_id))
 
 
 def handle_request(request_id, action, call):
@@ -453,187 +603,234 @@ def handle_request(request_id, action, call):
     elif action == 'reject':
         handle_reject_request(request_id, call)
 
+@states.step
 def handle_admin_screenshot(message, request_id):
     if message.content_type == 'photo':
-        file_info = bot.get_file(message.photo[-1].file_id)
-        downloaded_file = bot.download_file(file_info.file_path)
-        conn, c = get_db_connection()
-        try:
-            c.execute("SELECT user_id, amount, details FROM requests WHERE id = ?", (request_id,))
-            request = c.fetchone()
-            if request:
-                user_id, amount, details = request
-                sale_amount = float(details.split(':')[1].strip())
-                bot.send_photo(user_id, downloaded_file, caption=f"Проверьте, пожалуйста, этот скин. Если он соответствует заявке, нажмите 'Купил скин'.")
-                bot.send_message(user_id, "Скин готов к покупке", reply_markup=InlineKeyboardMarkup().row(InlineKeyboardButton("Купил скин ✅", callback_data=f'confirm_purchase_{user_id}_{request_id}_{sale_amount}'),
-                    InlineKeyboardButton("Отменить покупку ❌", callback_data=f'cancel_purchase_{request_id}')))
-        finally:
-            close_db_connection(conn)
+        request = get_request(request_id)
+        if request:
+            user_id = request[0]
+            loc = templates.locale()
+            media.relay_photo(bot, user_id, message, request_id=request_id, kind='skin', caption=loc.text('skin_check'))
+            bot.send_message(user_id, loc.text('skin_ready'), reply_markup=InlineKeyboardMarkup().row(loc.button('bought_skin', f'confirm_purchase_{request_id}'),
+                loc.button('cancel_purchase', f'cancel_purchase_{request_id}')))
     else:
-        bot.send_message(message.chat.id, "Пожалуйста, отправьте скриншот скина.")
-        bot.register_next_step_handler(message, lambda msg: handle_admin_screenshot(msg, request_id))
+        bot.send_message(message.chat.id, user_locale(message).text('need_skin_screenshot'))
+        states.set_step(message.chat.id, handle_admin_screenshot, request_id)
 
+@states.step
 def handle_buyer_screenshot(message, buyer_id, request_id, sale_amount):
     if message.content_type == 'photo':
-        file_info = bot.get_file(message.photo[-1].file_id)
-        downloaded_file = bot.download_file(file_info.file_path)
-        bot.send_photo(ADMIN_ID, downloaded_file, caption=f"Покупатель подтвердил покупку скина за {sale_amount:.2f}.", reply_markup=InlineKeyboardMarkup().row(
-            InlineKeyboardButton("Подтвердить покупку ✅", callback_data=f'finalize_purchase_{buyer_id}_{request_id}_{sale_amount}'),
-            InlineKeyboardButton("Отклонить покупку ❌", callback_data=f'dispute_purchase_{request_id}')
+        admin = templates.locale()
+        media.relay_photo(bot, ADMIN_ID, message, check_duplicate=True, request_id=request_id, kind='purchase', caption=admin.text('buyer_confirmed', amount=money.rub(sale_amount)), reply_markup=InlineKeyboardMarkup().row(
+            admin.button('confirm_purchase', f'finalize_purchase_{request_id}'),
+            admin.button('reject_purchase', f'dispute_purchase_{request_id}')
         ))
     else:
-        bot.send_message(message.chat.id, "Пожалуйста, отправьте скриншот купленного скина.")
-        bot.register_next_step_handler(message, lambda msg: handle_buyer_screenshot(msg, buyer_id, request_id, sale_amount))
+        bot.send_message(message.chat.id, user_locale(message).text('need_purchase_screenshot'))
+        states.set_step(message.chat.id, handle_buyer_screenshot, buyer_id, request_id, sale_amount)
 
 
 
 def handle_reject_request(request_id, call):
-    conn, c = get_db_connection()
-    try:
-        c.execute("SELECT user_id, request_type FROM requests WHERE id = ?", (request_id,))
-        request = c.fetchone()
-        if request:
-            user_id, request_type = request
-            if request_type == 'withdraw_gold':
-                bot.send_message(user_id, "Ваша заявка на вывод голды отклонена.")
-            elif request_type == 'withdraw_money':
-                bot.send_message(user_id, "Ваша заявка на вывод денег отклонена.")
-            elif request_type == 'sell_gold':
-                bot.send_message(user_id, "Ваша заявка на продажу голды отклонена.")
-
-            update_request_status(request_id, 'rejected')
-            admin_panel(call.message.chat.id)  # Обновляем админ панель
-    finally:
-        close_db_connection(conn)
+    # Списанное по заявке на вывод возвращается в той же транзакции (ledger.reject)
+    request = ledger.reject(request_id)
+    if request is None:
+        report_closed(call, request_id)
+        return
+    user_id, request_type = request
+    if request_type in ('withdraw_gold', 'withdraw_money', 'sell_gold'):
+        bot.send_message(user_id, templates.locale().text(request_type + '_rejected'))
+    panel.refresh(call.message.chat.id)  # Обновляем админ панель
+
+
+def handle_bulk(call, type_index, max_id, status):
+    # Одна транзакция на все заявки, по одному уведомлению на пользователя через очередь отправки
+    # (уходят параллельно в пределах лимитов Telegram) и одна перерисовка панели
+    request_type, label, accepted, rejected = BULK_TYPES[type_index]
+    notice = accepted if status == 'accepted' else rejected
+    if status == 'accepted' and notice is None:
+        return
+    closed = ledger.close_pending(request_type, status, max_id)
+    loc = templates.locale()
+    if notice:
+        notice = loc.text(notice)
+        for user_id in dict.fromkeys(user_id for _, user_id in closed):
+            bot.send_message(user_id, notice)
+    text, keyboard = render_bulk()
+    bot.edit_message_text(chat_id=call.message.chat.id, message_id=call.message.message_id,
+                          text=loc.text('bulk_result', label=loc.text(label), done=loc.text('bulk_' + status),
+                                        count=len(closed), summary=text),
+                          reply_markup=keyboard)
+    panel.refresh(call.message.chat.id)  # Обновляем админ панель
+
+
+def notify_expired(expired):
+    # Пачка заявок, закрытых maintenance.expire: уведомления уходят через очередь отправки
+    loc = templates.locale()
+    for request_id, user_id, request_type, amount in expired:
+        if request_type == 'withdraw_gold':
+            notice = loc.text('expired_withdraw_gold', amount=amount)
+        elif request_type == 'withdraw_money':
+            notice = loc.text('expired_withdraw_money', amount=money.rub(amount))
+        else:
+            notice = loc.text('expired_request', request_id=request_id)
+        bot.send_message(user_id, notice)
+    panel.refresh_shown(ADMIN_ID)
 
 
 def start_deposit(message):
-    bot.send_message(message.chat.id,
-                     "Для пополнения баланса, пожалуйста, переведите средства на следующий ЮMoney кошелек:\n\n**41001234567890**\n\nПосле перевода отправьте скриншот платежа.")
-    bot.register_next_step_handler(message, handle_deposit_screenshot)
+    bot.send_message(message.chat.id, templates.locale().text('deposit_instructions'))
+    states.set_step(message.chat.id, handle_deposit_screenshot)
 
 
+@states.step
 def handle_deposit_screenshot(message):
     if message.content_type == 'photo':
-        file_info = bot.get_file(message.photo[-1].file_id)
-        downloaded_file = bot.download_file(file_info.file_path)
         user = get_or_register_user(message.from_user.id, message.from_user.username)
-        bot.send_photo(ADMIN_ID, downloaded_file,
-                       caption=f"Пользователь @{user[1]} хочет пополнить баланс. Пожалуйста, подтвердите сумму.")
-        bot.send_message(message.chat.id, "Скриншот отправлен администратору. Ожидайте подтверждения.")
+        media.relay_photo(bot, ADMIN_ID, message, check_duplicate=True,
+                          caption=templates.locale().text('deposit_request', name=user.name))
+        bot.send_message(message.chat.id, user_locale(message).text('screenshot_sent'))
     else:
-        bot.send_message(message.chat.id, "Пожалуйста, отправьте скриншот платежа.")
-        bot.register_next_step_handler(message, handle_deposit_screenshot)
+        bot.send_message(message.chat.id, user_locale(message).text('need_payment_screenshot'))
+        states.set_step(message.chat.id, handle_deposit_screenshot)
 
 
+@states.step
 def handle_skin_screenshot(message, user_id, request_id, sale_amount):
     if message.content_type == 'photo':
-        file_info = bot.get_file(message.photo[-1].file_id)
-        downloaded_file = bot.download_file(file_info.file_path)
-        bot.send_photo(user_id, downloaded_file, caption="Проверьте, пожалуйста, этот скин. Если он соответствует заявке, нажмите 'Купил скин'.")
-        bot.send_message(user_id, "Скин готов к покупке", reply_markup=InlineKeyboardMarkup().row(
-            InlineKeyboardButton("Купил скин ✅", callback_data=f'buy_skin_{message.from_user.id}_{request_id}_{sale_amount}'),
-            InlineKeyboardButton("Отменить вывод ❌", callback_data=f'cancel_skin_sale_{message.from_user.id}_{request_id}')
+        loc = templates.locale()
+        media.relay_photo(bot, user_id, message, request_id=request_id, kind='skin', caption=loc.text('skin_check'))
+        bot.send_message(user_id, loc.text('skin_ready'), reply_markup=InlineKeyboardMarkup().row(
+            loc.button('bought_skin', f'buy_skin_{request_id}'),
+            loc.button('cancel_withdrawal', f'cancel_skin_sale_{request_id}')
         ))
     else:
-        bot.send_message(message.chat.id, "Пожалуйста, отправьте скриншот скина.")
-        bot.register_next_step_handler(message, lambda msg: handle_skin_screenshot(msg, user_id, request_id, sale_amount))
+        bot.send_message(message.chat.id, user_locale(message).text('need_skin_screenshot'))
+        states.set_step(message.chat.id, handle_skin_screenshot, user_id, request_id, sale_amount)
 
 def initiate_withdrawal(message):
+    loc = user_locale(message)
     try:
         amount = int(message.text)
         if amount < 100:
-            bot.send_message(message.chat.id, "Минимальная сумма для вывода 100 голды.")
+            bot.send_message(message.chat.id, loc.text('withdraw_gold_min'))
         else:
-            user = get_or_register_user(message.from_user.id, message.from_user.username)
-            if user[3] >= amount:
-                withdrawal_amount = amount / 0.8  # Так как после вычета 20% должно остаться amount голды
-                new_balance = int(withdrawal_amount) + 0.52  # Округление до целого и добавление 52 копеек
-                update_user(message.from_user.id, gold=user[3] - amount)
-                request_id = create_request(message.from_user.id, 'withdraw_gold', amount, f"Сумма: {new_balance:.2f}")
-                withdrawal_info = f"Пользователь @{user[1]} запрашивает вывод {amount} голды, сумма: {new_balance:.2f}"
-
-                bot.send_message(message.from_user.id, "Пожалуйста, отправьте скриншот подтверждения платежа.")
-                bot.register_next_step_handler(message,
-                                               lambda msg: handle_screenshot(msg, withdrawal_info, request_id, amount))
+            payout = money.gold_payout(amount)
+            result = ledger.withdraw_gold(message.from_user.id, amount, payout)
+            if result:
+                request_id, user_name = result
+                withdrawal_info = templates.locale().text('withdraw_gold_request', name=user_name, amount=amount,
+                                                          payout=money.rub(payout))
+
+                bot.send_message(message.from_user.id, loc.text('withdrawal_screenshot'))
+                states.set_step(message.chat.id, handle_screenshot, withdrawal_info, request_id, amount)
             else:
-                bot.send_message(message.chat.id, "Недостаточно голды на балансе.")
+                bot.send_message(message.chat.id, loc.text('no_gold'))
     except ValueError:
-        bot.send_message(message.chat.id, "Введите корректное число для вывода.")
+        bot.send_message(message.chat.id, loc.text('withdraw_gold_invalid'))
 
 
+@states.step
 def handle_screenshot(message, withdrawal_info, request_id, amount):
     if message.content_type == 'photo':
-        file_info = bot.get_file(message.photo[-1].file_id)
-        downloaded_file = bot.download_file(file_info.file_path)
-
-        bot.send_photo(ADMIN_ID, downloaded_file, caption=withdrawal_info, reply_markup=InlineKeyboardMarkup().row(
-            InlineKeyboardButton("Выведено ✅", callback_data=f'handle_request_{request_id}_accept'),
-            InlineKeyboardButton("Отменить вывод ❌", callback_data=f'handle_request_{request_id}_reject')
+        admin = templates.locale()
+        media.relay_photo(bot, ADMIN_ID, message, check_duplicate=True, request_id=request_id, kind='withdrawal', caption=withdrawal_info, reply_markup=InlineKeyboardMarkup().row(
+            admin.button('withdrawn', f'handle_request_{request_id}_accept'),
+            admin.button('cancel_withdrawal', f'handle_request_{request_id}_reject')
         ))
-        bot.send_message(message.chat.id, "Заявка на вывод отправлена администратору.")
+        bot.send_message(message.chat.id, user_locale(message).text('withdrawal_sent'))
     else:
-        bot.send_message(message.chat.id, "Пожалуйста, отправьте скриншот.")
-        bot.register_next_step_handler(message, lambda msg: handle_screenshot(msg, withdrawal_info, request_id, amount))
+        bot.send_message(message.chat.id, user_locale(message).text('need_screenshot'))
+        states.set_step(message.chat.id, handle_screenshot, withdrawal_info, request_id, amount)
 
+@states.step
 def handle_buyer_screenshot(message, buyer_id, request_id, sale_amount):
     if message.content_type == 'photo':
-        file_info = bot.get_file(message.photo[-1].file_id)
-        downloaded_file = bot.download_file(file_info.file_path)
-        bot.send_photo(ADMIN_ID, downloaded_file, caption=f"Покупатель @{message.from_user.username} подтвердил покупку скина за {sale_amount:.2f}.", reply_markup=InlineKeyboardMarkup().row(
-            InlineKeyboardButton("Подтвердить покупку ✅", callback_data=f'finalize_purchase_{buyer_id}_{request_id}_{sale_amount}'),
-            InlineKeyboardButton("Отклонить покупку ❌", callback_data=f'dispute_purchase_{request_id}')
+        admin = templates.locale()
+        media.relay_photo(bot, ADMIN_ID, message, check_duplicate=True, request_id=request_id, kind='purchase', caption=admin.text('buyer_confirmed_by', name=message.from_user.username, amount=money.rub(sale_amount)), reply_markup=InlineKeyboardMarkup().row(
+            admin.button('confirm_purchase', f'finalize_purchase_{request_id}'),
+            admin.button('reject_purchase', f'dispute_purchase_{request_id}')
         ))
     else:
-        bot.send_message(message.chat.id, "Пожалуйста, отправьте скриншот купленного скина.")
-        bot.register_next_step_handler(message, lambda msg: handle_buyer_screenshot(msg, buyer_id, request_id, sale_amount))
+        bot.send_message(message.chat.id, user_locale(message).text('need_purchase_screenshot'))
+        states.set_step(message.chat.id, handle_buyer_screenshot, buyer_id, request_id, sale_amount)
 
 
 def start_deposit_gold(message):
-    bot.send_message(message.chat.id, "Для пополнения голды, пожалуйста, переведите средства на следующий ЮMoney кошелек:\n\n41001234567890\n\nПосле перевода отправьте скриншот платежа.")
-    bot.register_next_step_handler(message, handle_deposit_gold_screenshot)
+    bot.send_message(message.chat.id, templates.locale().text('deposit_gold_instructions'))
+    states.set_step(message.chat.id, handle_deposit_gold_screenshot)
 
+@states.step
 def handle_deposit_gold_screenshot(message):
     if message.content_type == 'photo':
-        file_info = bot.get_file(message.photo[-1].file_id)
-        downloaded_file = bot.download_file(file_info.file_path)
         user = get_or_register_user(message.from_user.id, message.from_user.username)
-        bot.send_photo(ADMIN_ID, downloaded_file, caption=f"Пользователь @{user[1]} хочет пополнить голду. Пожалуйста, подтвердите сумму.")
-        bot.send_message(message.chat.id, "Скриншот отправлен администратору. Ожидайте подтверждения.")
-        create_request(message.from_user.id, 'deposit_gold', 0, 'Ожидает подтверждения суммы')
+        request_id = create_request(message.from_user.id, 'deposit_gold', 0, 'Ожидает подтверждения суммы')
+        media.relay_photo(bot, ADMIN_ID, message, check_duplicate=True, request_id=request_id, kind='deposit',
+                          caption=templates.locale().text('deposit_gold_request', name=user.name))
+        bot.send_message(message.chat.id, user_locale(message).text('screenshot_sent'))
     else:
-        bot.send_message(message.chat.id, "Пожалуйста, отправьте скриншот платежа.")
-        bot.register_next_step_handler(message, handle_deposit_gold_screenshot)
+        bot.send_message(message.chat.id, user_locale(message).text('need_payment_screenshot'))
+        states.set_step(message.chat.id, handle_deposit_gold_screenshot)
 
+@states.step
 def finalize_deposit_gold(message, request_id):
     try:
         amount = int(message.text)
-        conn, c = get_db_connection()
-        try:
-            c.execute("UPDATE requests SET amount = ?, details = ? WHERE id = ?", (amount, f"Зачислено {amount} голды", request_id))
-            c.execute("SELECT user_id FROM requests WHERE id = ?", (request_id,))
-            user_id = c.fetchone()[0]
-            update_user(user_id, gold=amount)
-            update_request_status(request_id, 'completed')
-        finally:
-            close_db_connection(conn)
-        bot.send_message(user_id, f"Ваш баланс голды пополнен на {amount}.")
-        bot.send_message(message.chat.id, f"Пополнение на {amount} голды подтверждено.")
-        admin_panel(message.chat.id)  # Обновляем админ панель
+        with db.transaction() as conn:
+            # Сумма записывается и голда зачисляется, только пока заявка не закрыта
+            request = conn.execute("UPDATE requests SET amount = ?, details = ? WHERE id = ? AND status = 'pending' "
+                                   "RETURNING user_id", (amount, f"Зачислено {amount} голды", request_id)).fetchall()
+            credited = request and ledger.credit(request[0][0], gold=amount, request_id=request_id, kind='deposit_gold')
+        if not credited:
+            bot.send_message(message.chat.id, user_locale(message).text('request_closed', request_id=request_id))
+            return
+        user_id = request[0][0]
+        users.invalidate(user_id)  # ещё раз после коммита внешней транзакции
+        bot.send_message(user_id, templates.locale().text('gold_credited', amount=amount))
+        bot.send_message(message.chat.id, user_locale(message).text('gold_credited_admin', amount=amount))
+        panel.refresh(message.chat.id)  # Обновляем админ панель
     except ValueError:
-        bot.send_message(message.chat.id, "Введите корректное число голды для зачисления.")
+        bot.send_message(message.chat.id, user_locale(message).text('deposit_gold_invalid'))
 
 @bot.message_handler(commands=['start'])
 def start_message(message):
+    loc = user_locale(message)
     try:
-        bot.send_message(message.chat.id, "Добро пожаловать в бот для торговли голдой StandOff 2!")
-        main_menu(message.chat.id, message.from_user.id == ADMIN_ID)
+        states.clear(message.chat.id)
+        bot.send_message(message.chat.id, loc.text('welcome'))
+        main_menu(message.chat.id, message.from_user.id == ADMIN_ID, loc)
     except Exception as e:
-        bot.send_message(message.chat.id, f"Ошибка при старте: {str(e)}")
+        bot.send_message(message.chat.id, loc.text('start_error', error=e))
+
+
+# Продолжение диалога: шаг, сохранённый через states.set_step, регистрируется после /start,
+# поэтому команда всегда сбрасывает незавершённый диалог
+@bot.message_handler(content_types=util.content_type_media)
+def next_step(message):
+    step = states.pop_step(message.chat.id)
+    if step:
+        handler, args = step
+        with metrics.STEP_SECONDS.time(handler.__name__):
+            handler(message, *args)
 
 
 if __name__ == '__main__':
+    if not TOKEN:
+        sys.exit("Не задан token в cnf.py")
     try:
-        bot.polling(none_stop=True)
+        maintenance.start(notify_expired)
+        if METRICS_PORT:
+            metrics.instrument_api()
+            metrics.serve(METRICS_HOST, METRICS_PORT)
+        if WEBHOOK_URL:
+            import webhook
+            bot.remove_webhook()
+            bot.set_webhook(url=WEBHOOK_URL, secret_token=WEBHOOK_SECRET)
+            webhook.serve(bot, WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_SECRET, WORKERS,
+                          register_users, WEBHOOK_BATCH, throttle)
+        else:
+            bot.remove_webhook()
+            dispatch.attach(bot, WORKERS, register_users, throttle)
+            bot.polling(none_stop=True)
     except Exception as e:
         print(f"Ошибка в основном цикле: {e}")
@@ -0,0 +1,135 @@
+import logging
+import sys
+import threading
+import time
+
+import db
+import ledger
+import metrics
+import states
+
+logger = logging.getLogger(__name__)
+
+# Фоновое обслуживание базы в одном потоке: каждая задача выполняется раз в свой интервал, время выполнения
+# попадает в metrics.MAINTENANCE_SECONDS, число обработанных строк — в metrics.MAINTENANCE_ROWS.
+#   expire   — заявки, статус которых не менялся дольше REQUEST_TTL, закрываются как expired,
+#              списанное при выводе возвращается пользователю (ledger.expire_stale);
+#   archive  — закрытые заявки старше ARCHIVE_AFTER переносятся в requests_archive, в requests остаются
+#              только рабочие, по которым ходят очередь админа и кнопки;
+#   steps    — просроченные шаги диалога (states.sweep);
+#   optimize — PRAGMA optimize и возврат свободных страниц файлу базы (incremental_vacuum).
+# Строки обрабатываются пачками по BATCH, каждая пачка — своя транзакция, чтобы не держать блокировку записи.
+# Запускается в одном процессе: main.py или ведущий процесс cluster.py
+
+REQUEST_TTL = 3 * 24 * 60 * 60
+ARCHIVE_AFTER = 30 * 24 * 60 * 60
+BATCH = 1000
+VACUUM_PAGES = 2000  # Сколько свободных страниц отдавать за один запуск
+FIRST_RUN = 60  # Первый запуск задачи — не позже чем через столько секунд после старта
+
+INTERVALS = {'expire': 10 * 60, 'archive': 60 * 60, 'steps': states.SWEEP_INTERVAL, 'optimize': 6 * 60 * 60}
+
+COLUMNS = "id, user_id, request_type, amount, status, details, sale_amount, phone, payout, updated_at"
+# Закрытые заявки; принятый вывод выполнен, а принятая продажа ещё ждёт покупки скина
+CLOSED = ("(status IN ('completed', 'rejected', 'cancelled', 'expired') "
+          "OR (status = 'accepted' AND request_type IN ('withdraw_gold', 'withdraw_money'))) AND updated_at < ?")
+# Перенос идёт по возрастанию id от курсора: соседние строки лежат на одних страницах, поэтому пачка
+# переписывает мало страниц, а проход по таблице за один запуск — один
+ARCHIVE = (f"INSERT INTO requests_archive ({COLUMNS}) SELECT {COLUMNS} FROM requests WHERE id > ? AND {CLOSED} "
+           "ORDER BY id LIMIT ? RETURNING id")
+
+
+def expire(on_expired=None):
+    # on_expired([(id заявки, id пользователя, тип, сумма)]) вызывается после каждой закрытой пачки
+    before = time.time() - REQUEST_TTL
+    total = 0
+    while True:
+        expired = ledger.expire_stale(before, BATCH)
+        total += len(expired)
+        if expired and on_expired is not None:
+            on_expired(expired)
+        if len(expired) < BATCH:
+            return total
+
+
+def archive_closed():
+    before = time.time() - ARCHIVE_AFTER
+    total, last = 0, 0
+    while True:
+        with db.transaction() as conn:
+            moved = conn.execute(ARCHIVE, (last, before, BATCH)).fetchall()
+            conn.executemany("DELETE FROM requests WHERE id = ?", moved)
+        total += len(moved)
+        if len(moved) < BATCH:
+            return total
+        last = max(row[0] for row in moved)
+
+
+def optimize():
+    # Возвращает число отданных файлу страниц; без auto_vacuum=INCREMENTAL только PRAGMA optimize
+    db.fetchall("PRAGMA optimize")
+    if db.fetchone("PRAGMA auto_vacuum")[0] != 2:
+        return 0
+    free = db.fetchone("PRAGMA freelist_count")[0]
+    if free:
+        # incremental_vacuum выполняется по мере чтения результата
+        db.fetchall(f"PRAGMA incremental_vacuum({VACUUM_PAGES})")
+    return free - db.fetchone("PRAGMA freelist_count")[0]
+
+
+def jobs(on_expired=None):
+    return [('expire', lambda: expire(on_expired)), ('archive', archive_closed), ('steps', states.sweep),
+            ('optimize', optimize)]
+
+
+def run_job(name, job):
+    try:
+        with metrics.MAINTENANCE_SECONDS.time(name):
+            rows = job()
+        if rows:
+            metrics.MAINTENANCE_ROWS.inc(name, amount=rows)
+            logger.info("Обслуживание %s: %s", name, rows)
+        return rows
+    except Exception:
+        metrics.ERRORS.inc('maintenance')
+        logger.exception("Ошибка в задаче обслуживания %s", name)
+
+
+def start(on_expired=None, intervals=None):
+    intervals = {**INTERVALS, **(intervals or {})}
+    scheduled = jobs(on_expired)
+
+    def run():
+        now = time.monotonic()
+        due = {name: now + min(intervals[name], FIRST_RUN) for name, _ in scheduled}
+        while True:
+            name, job = min(scheduled, key=lambda item: due[item[0]])
+            time.sleep(max(0, due[name] - time.monotonic()))
+            run_job(name, job)
+            due[name] = time.monotonic() + intervals[name]
+
+    thread = threading.Thread(target=run, name='maintenance', daemon=True)
+    thread.start()
+    return thread
+
+
+def main():
+    # Разовое обслуживание без бота: python maintenance.py [users.db]. Старая база заодно переводится
+    # на auto_vacuum=INCREMENTAL полным VACUUM (файл переписывается целиком, запись на это время блокируется)
+    import schema
+
+    db.DB_PATH = sys.argv[1] if len(sys.argv) > 1 else db.DB_PATH
+    schema.migrate()
+    if db.fetchone("PRAGMA auto_vacuum")[0] != 2:
+        db.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        db.execute("VACUUM")
+        print("база переведена на auto_vacuum=INCREMENTAL")
+    for name, job in jobs():
+        began = time.perf_counter()
+        rows = run_job(name, job)
+        print(f"{name}: {rows or 0} за {time.perf_counter() - began:.2f} с")
+    db.close_connection()
+
+
+if __name__ == '__main__':
+    main()
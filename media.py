@@ -0,0 +1,48 @@
+import threading
+from collections import OrderedDict
+
+import archive
+
+# Пересылка скриншотов по file_id: Telegram сам отдаёт уже загруженный файл,
+# бот не скачивает и не загружает байты заново. Скриншоты заявок вдобавок
+# сохраняются в архив (archive.py) в фоне, пересылку это не задерживает
+
+CACHE_SIZE = 10000
+DUPLICATE_NOTE = "⚠️ Этот скриншот уже присылали раньше.\n"
+
+_hashes = OrderedDict()  # file_unique_id недавно присланных файлов
+_lock = threading.Lock()
+
+
+def _remember(cache, key, value):
+    cache[key] = value
+    cache.move_to_end(key)
+    if len(cache) > CACHE_SIZE:
+        cache.popitem(last=False)
+
+
+def largest_photo(message):
+    return message.photo[-1]
+
+
+def is_duplicate(photo):
+    # Повтор определяется по file_unique_id (одинаков для одного и того же файла у всех ботов) без скачивания:
+    # сначала среди недавних файлов процесса, затем в архиве, общем для всех процессов
+    with _lock:
+        seen = photo.file_unique_id in _hashes
+        if seen:
+            _hashes.move_to_end(photo.file_unique_id)
+        else:
+            _remember(_hashes, photo.file_unique_id, None)
+    return seen or archive.seen(photo.file_unique_id)
+
+
+def relay_photo(bot, chat_id, message, caption=None, reply_markup=None, check_duplicate=False, request_id=None,
+                kind='screenshot'):
+    # request_id — заявка, к которой скриншот сохраняется в архив с видом kind
+    photo = largest_photo(message)
+    if check_duplicate and is_duplicate(photo):
+        caption = DUPLICATE_NOTE + (caption or '')
+    if request_id is not None:
+        archive.archive_async(bot, photo, request_id, kind)
+    return bot.send_photo(chat_id, photo.file_id, caption=caption, reply_markup=reply_markup)
@@ -0,0 +1,218 @@
+import bisect
+import io
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+logger = logging.getLogger(__name__)
+
+# Метрики в текстовом формате Prometheus без внешних зависимостей: счётчики, гистограммы и показатели,
+# которые вычисляются при каждом запросе /metrics. serve() поднимает локальный HTTP-сервер,
+# /profile/start и /profile/stop включают и выключают выборочный cProfile обработки апдейтов
+
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+_registry = []
+_lock = threading.Lock()
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    return '{' + ','.join(f'{name}="{value}"' for name, value in zip(names, values)) + '}'
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.values = {}
+        _registry.append(self)
+
+    def inc(self, *values, amount=1):
+        with _lock:
+            self.values[values] = self.values.get(values, 0) + amount
+
+    def render(self):
+        yield f'# HELP {self.name} {self.help}'
+        yield f'# TYPE {self.name} counter'
+        with _lock:
+            items = sorted(self.values.items())
+        for values, value in items:
+            yield f'{self.name}{_labels(self.labels, values)} {value}'
+
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self.values = {}  # значения меток -> [счётчики по корзинам..., сверх последней, сумма, количество]
+        _registry.append(self)
+
+    def observe(self, seconds, *values):
+        with _lock:
+            series = self.values.get(values)
+            if series is None:
+                series = self.values[values] = [0] * (len(self.buckets) + 3)
+            series[bisect.bisect_left(self.buckets, seconds)] += 1
+            series[-2] += seconds
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, *values):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *values)
+
+    def render(self):
+        yield f'# HELP {self.name} {self.help}'
+        yield f'# TYPE {self.name} histogram'
+        with _lock:
+            items = sorted((values, list(series)) for values, series in self.values.items())
+        for values, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                yield f'{self.name}_bucket{_labels(self.labels + ("le",), values + (bound,))} {cumulative}'
+            yield f'{self.name}_bucket{_labels(self.labels + ("le",), values + ("+Inf",))} {series[-1]}'
+            yield f'{self.name}_sum{_labels(self.labels, values)} {series[-2]}'
+            yield f'{self.name}_count{_labels(self.labels, values)} {series[-1]}'
+
+
+class Gauge:
+    # Значение считается функцией в момент запроса /metrics
+    def __init__(self, name, help, fn):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        _registry.append(self)
+
+    def render(self):
+        try:
+            value = self.fn()
+        except Exception:
+            logger.exception("Не удалось вычислить %s", self.name)
+            return
+        yield f'# HELP {self.name} {self.help}'
+        yield f'# TYPE {self.name} gauge'
+        yield f'{self.name} {value}'
+
+
+def render():
+    return '\n'.join(line for metric in list(_registry) for line in metric.render()) + '\n'
+
+
+# Метрики, которые пишут модули бота
+
+UPDATE_SECONDS = Histogram('bot_update_seconds', 'Обработка одного апдейта в пуле потоков')
+ROUTE_SECONDS = Histogram('bot_callback_seconds', 'Обработка нажатия кнопки по маршруту', ('route',))
+STEP_SECONDS = Histogram('bot_step_seconds', 'Обработка шага диалога', ('step',))
+DB_SECONDS = Histogram('bot_db_query_seconds', 'Выполнение SQL-запроса (до первой строки результата)', ('op',))
+API_SECONDS = Histogram('bot_api_seconds', 'Запрос к Telegram Bot API', ('method',))
+UPDATES_RECEIVED = Counter('bot_updates_received_total', 'Апдейты, полученные от Telegram')
+UPDATES_DROPPED = Counter('bot_updates_dropped_total', 'Апдейты, отброшенные до обработки (throttle.py)', ('reason',))
+MAINTENANCE_SECONDS = Histogram('bot_maintenance_seconds', 'Выполнение задачи обслуживания базы', ('job',))
+MAINTENANCE_ROWS = Counter('bot_maintenance_rows_total', 'Строки, обработанные задачами обслуживания', ('job',))
+ERRORS = Counter('bot_errors_total', 'Ошибки обработки', ('where',))
+
+
+def instrument_api():
+    # Замер всех запросов telebot к Bot API, включая скачивание файлов
+    from telebot import apihelper
+
+    make_request, download_file = apihelper._make_request, apihelper.download_file
+
+    def timed_request(token, method_name, *args, **kwargs):
+        with API_SECONDS.time(method_name):
+            return make_request(token, method_name, *args, **kwargs)
+
+    def timed_download(token, file_path):
+        with API_SECONDS.time('downloadFile'):
+            return download_file(token, file_path)
+
+    apihelper._make_request = timed_request
+    apihelper.download_file = timed_download
+
+
+class Sampler:
+    # Выборочный профиль: под cProfile выполняется доля rate апдейтов, у каждого потока свой профиль,
+    # при выводе они складываются
+    def __init__(self):
+        self.rate = 0
+        self.profiles = {}
+        self.lock = threading.Lock()
+
+    def start(self, rate=0.1):
+        with self.lock:
+            self.profiles = {}
+            self.rate = rate
+
+    def stop(self, limit=40):
+        self.rate = 0
+        with self.lock:
+            profiles = list(self.profiles.values())
+        if not profiles:
+            return 'Профиль пуст\n'
+        import pstats
+        stream = io.StringIO()
+        pstats.Stats(*profiles, stream=stream).sort_stats('cumulative').print_stats(limit)
+        return stream.getvalue()
+
+    def run(self, fn, *args):
+        if not self.rate or random.random() >= self.rate:
+            return fn(*args)
+        with self.lock:
+            profile = self.profiles.get(threading.get_ident())
+            if profile is None:
+                import cProfile  # профилировщик нужен только после /profile/start
+                profile = self.profiles[threading.get_ident()] = cProfile.Profile()
+        profile.enable()
+        try:
+            return fn(*args)
+        finally:
+            profile.disable()
+
+
+sampler = Sampler()
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, body, content_type='text/plain; version=0.0.4; charset=utf-8'):
+        payload = body.encode()
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == '/metrics':
+            self._reply(render())
+        elif url.path == '/profile/start':
+            rate = float(parse_qs(url.query).get('rate', ['0.1'])[-1])
+            sampler.start(rate)
+            self._reply(f'Профилирование включено, доля апдейтов: {rate}\n')
+        elif url.path == '/profile/stop':
+            self._reply(sampler.stop())
+        else:
+            self.send_error(404)
+
+
+def serve(host='127.0.0.1', port=9100):
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
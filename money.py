@@ -0,0 +1,42 @@
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+# Деньги хранятся и считаются целыми копейками (users.balance, requests.amount у вывода денег,
+# postings.amount), рубли с дробной частью появляются только во вводе и в тексте сообщений.
+# Цены за единицу голды тоже в копейках, поэтому расчёты точные и не зависят от округления float
+
+KOPECKS = 100
+BUY_PRICE = 70  # покупка голды у бота
+SALE_PRICE = 80  # столько покупатель скина платит продавцу за единицу голды
+PAYOUT_CENTS = 52  # добавка к сумме вывода голды
+
+
+def kopecks(value):
+    # '12.5', '12,50', 12.5 -> 1250; ValueError для всего, что не является конечным числом
+    try:
+        rubles = Decimal(str(value).strip().replace(',', '.'))
+    except InvalidOperation:
+        raise ValueError(f"Некорректная сумма: {value!r}") from None
+    if not rubles.is_finite():
+        raise ValueError(f"Некорректная сумма: {value!r}")
+    return int((rubles * KOPECKS).to_integral_value(ROUND_HALF_UP))
+
+
+def rub(amount):
+    # 1250 -> '12.50'
+    sign = '-' if amount < 0 else ''
+    rubles, rest = divmod(abs(amount), KOPECKS)
+    return f"{sign}{rubles}.{rest:02d}"
+
+
+def buy_price(gold):
+    return gold * BUY_PRICE
+
+
+def sale_amount(gold):
+    return gold * SALE_PRICE
+
+
+def gold_payout(gold):
+    # После комиссии 20% у пользователя должно остаться gold: сумма gold / 0.8 рублей,
+    # округлённая вниз до рубля, плюс 52 копейки
+    return gold * 5 // 4 * KOPECKS + PAYOUT_CENTS
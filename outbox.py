@@ -0,0 +1,253 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+from telebot import TeleBot
+from telebot.apihelper import ApiTelegramException
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Очередь исходящих сообщений. Обработчики не ждут Telegram: вызовы send_message/send_photo/edit_message_text
+# ставятся в очередь и отправляются пулом потоков с учётом лимитов Bot API — общего (около 30 сообщений
+# в секунду) и на один чат (около одного в секунду, короткие всплески допустимы). Сообщения одного чата
+# уходят строго по порядку, чаты из priority_chats (админ) обслуживаются первыми. На 429 чат ставится
+# на паузу на retry_after секунд, и сообщение отправляется повторно. Задания с одинаковым key, ещё
+# не ушедшие в чат, сливаются в одно (последнее)
+
+GLOBAL_RATE = 25
+GLOBAL_BURST = 5
+CHAT_RATE = 1
+CHAT_BURST = 3
+MAX_RETRIES = 5
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRUNE_INTERVAL = 60
+
+QUEUED_METHODS = ('send_message', 'send_photo', 'edit_message_text')
+
+
+class TokenBucket:
+    __slots__ = ('rate', 'capacity', 'tokens', 'stamp')
+
+    def __init__(self, rate, capacity, now):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.stamp = now
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+    def delay(self, now):
+        # Через сколько секунд появится токен
+        self._refill(now)
+        return 0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now):
+        self._refill(now)
+        self.tokens -= 1
+
+    def full(self, now):
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+class Job:
+    __slots__ = ('fn', 'args', 'kwargs', 'key', 'future', 'retries', 'created')
+
+    def __init__(self, fn, args, kwargs, key):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.key = key
+        self.future = Future()
+        self.retries = 0
+        self.created = time.monotonic()
+
+
+class Chat:
+    __slots__ = ('jobs', 'bucket', 'priority', 'busy', 'scheduled', 'paused_until')
+
+    def __init__(self, bucket, priority):
+        self.jobs = deque()
+        self.bucket = bucket
+        self.priority = priority
+        self.busy = False
+        self.scheduled = False
+        self.paused_until = 0
+
+
+def retry_after(error):
+    if isinstance(error, ApiTelegramException) and error.error_code == 429:
+        return (error.result_json.get('parameters') or {}).get('retry_after', 1)
+    return None
+
+
+def chat_of(method, args, kwargs):
+    if 'chat_id' in kwargs:
+        return kwargs['chat_id']
+    # У edit_message_text первый позиционный аргумент — текст
+    position = 1 if method == 'edit_message_text' else 0
+    return args[position] if len(args) > position else None
+
+
+class Outbox:
+    def __init__(self, bot, num_workers=8, priority_chats=(), global_rate=GLOBAL_RATE, global_burst=GLOBAL_BURST,
+                 chat_rate=CHAT_RATE, chat_burst=CHAT_BURST):
+        self.bot = bot
+        self.num_workers = num_workers
+        self.priority_chats = set(priority_chats)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.bucket = TokenBucket(global_rate, global_burst, time.monotonic())
+        self.chats = {}
+        self.ready = []  # (приоритет, порядковый номер, chat_id) — чатам можно отправлять сейчас
+        self.waiting = []  # (время, chat_id) — чаты, ждущие токена или конца паузы после 429
+        self.active = 0
+        self.pending = 0
+        self.retried = 0
+        self.coalesced = 0
+        self.sequence = itertools.count()
+        self.cond = threading.Condition()
+        self.stopped = False
+        self.last_prune = time.monotonic()
+        self.threads = []  # потоки отправки запускаются при первом сообщении
+
+    def _start(self):
+        self.threads = [threading.Thread(target=self._worker, daemon=True) for _ in range(self.num_workers)]
+        for thread in self.threads:
+            thread.start()
+
+    def attach(self):
+        # Подменяет методы отправки у bot: вызов ставит сообщение в очередь и возвращает Future.
+        # Прямой вызов в обход очереди — TeleBot.send_message(bot, ...)
+        for method in QUEUED_METHODS:
+            setattr(self.bot, method, self._queued(method))
+        return self
+
+    def _queued(self, method):
+        unbound = getattr(TeleBot, method)
+
+        def queued(*args, **kwargs):
+            return self.submit(chat_of(method, args, kwargs), unbound, self.bot, *args, **kwargs)
+        return queued
+
+    def submit(self, chat_id, fn, /, *args, key=None, **kwargs):
+        with self.cond:
+            if not self.threads and not self.stopped:
+                self._start()
+            chat = self.chats.get(chat_id)
+            if chat is None:
+                priority = PRIORITY_HIGH if chat_id in self.priority_chats else PRIORITY_NORMAL
+                chat = self.chats[chat_id] = Chat(TokenBucket(self.chat_rate, self.chat_burst, time.monotonic()), priority)
+            if key is not None:
+                for job in chat.jobs:
+                    if job.key == key:
+                        job.fn, job.args, job.kwargs = fn, args, kwargs
+                        self.coalesced += 1
+                        return job.future
+            job = Job(fn, args, kwargs, key)
+            chat.jobs.append(job)
+            self.pending += 1
+            self._schedule(chat_id, chat, time.monotonic())
+            return job.future
+
+    def _schedule(self, chat_id, chat, now):
+        if chat.busy or chat.scheduled or not chat.jobs:
+            return
+        chat.scheduled = True
+        at = max(chat.paused_until, now + chat.bucket.delay(now))
+        if at <= now:
+            heapq.heappush(self.ready, (chat.priority, next(self.sequence), chat_id))
+        else:
+            heapq.heappush(self.waiting, (at, chat_id))
+        self.cond.notify()
+
+    def _next(self):
+        # Выбирает следующее задание с учётом общего лимита; вызывается под self.cond
+        while True:
+            if self.stopped:
+                return None, None
+            now = time.monotonic()
+            while self.waiting and self.waiting[0][0] <= now:
+                chat_id = heapq.heappop(self.waiting)[1]
+                heapq.heappush(self.ready, (self.chats[chat_id].priority, next(self.sequence), chat_id))
+            timeout = self.waiting[0][0] - now if self.waiting else None
+            if self.ready:
+                delay = self.bucket.delay(now)
+                if not delay:
+                    chat_id = heapq.heappop(self.ready)[2]
+                    chat = self.chats[chat_id]
+                    chat.scheduled = False
+                    chat.busy = True
+                    chat.bucket.take(now)
+                    self.bucket.take(now)
+                    self.active += 1
+                    if self.ready:
+                        self.cond.notify()
+                    return chat_id, chat.jobs.popleft()
+                timeout = delay if timeout is None else min(timeout, delay)
+            if now - self.last_prune > PRUNE_INTERVAL:
+                self._prune(now)
+            self.cond.wait(timeout)
+
+    def _prune(self, now):
+        # Забываем чаты без заданий с полным ведром: новое ведро для них ничем не отличается
+        self.last_prune = now
+        for chat_id in [chat_id for chat_id, chat in self.chats.items()
+                        if not chat.jobs and not chat.busy and chat.bucket.full(now)]:
+            del self.chats[chat_id]
+
+    def _worker(self):
+        while True:
+            with self.cond:
+                chat_id, job = self._next()
+            if job is None:
+                return
+            delay = None
+            try:
+                result = job.fn(*job.args, **job.kwargs)
+            except Exception as e:
+                delay = retry_after(e)
+                if delay is None or job.retries >= MAX_RETRIES:
+                    metrics.ERRORS.inc('outbox')
+                    logger.error("Не удалось отправить сообщение в чат %s: %s", chat_id, e)
+                    job.future.set_exception(e)
+                    delay = None
+                else:
+                    job.retries += 1
+            else:
+                job.future.set_result(result)
+            with self.cond:
+                chat = self.chats[chat_id]
+                chat.busy = False
+                self.active -= 1
+                now = time.monotonic()
+                if delay is not None:
+                    # Повтор первым в очереди чата, после паузы, которую попросил Telegram
+                    chat.jobs.appendleft(job)
+                    chat.paused_until = now + delay
+                    self.retried += 1
+                else:
+                    self.pending -= 1
+                self._schedule(chat_id, chat, now)
+                if not self.pending:
+                    self.cond.notify_all()
+
+    def join(self, timeout=None):
+        with self.cond:
+            return self.cond.wait_for(lambda: not self.pending, timeout)
+
+    def stop(self):
+        with self.cond:
+            self.stopped = True
+            self.cond.notify_all()
+        for thread in self.threads:
+            thread.join()
@@ -0,0 +1,77 @@
+import time
+
+import metrics
+
+DENIED = "У вас нет доступа к этой функции."
+
+# Разбор callback_data по таблице вместо цепочки if/elif: точные значения ищутся в словаре,
+# для данных вида «префикс_арг1_арг2» проверяются только префиксы, заканчивающиеся на каждом «_»
+# (по одному поиску в словаре на подчёркивание). Аргументы приводятся к типам из описания маршрута;
+# у одного префикса может быть несколько маршрутов с разным числом аргументов
+
+
+class Route:
+    __slots__ = ('name', 'handler', 'args', 'admin', 'denied', 'user')
+
+    def __init__(self, name, handler, args, admin, denied, user):
+        self.name = name
+        self.handler = handler
+        self.args = args
+        self.admin = admin
+        self.denied = denied
+        self.user = user
+
+
+class Router:
+    def __init__(self, bot, is_admin, load_user):
+        self.bot = bot
+        self.is_admin = is_admin
+        self.load_user = load_user
+        self.exact = {}
+        self.prefixes = {}  # префикс -> {число аргументов: маршрут}
+
+    def route(self, *names, args=(), admin=False, denied=DENIED, user=False):
+        # Имя с «_» на конце — префикс, за которым идут аргументы через «_»; иначе точное значение.
+        # user=True — обработчик получает запись пользователя из базы вторым аргументом
+        def decorator(handler):
+            route = Route(names[0], handler, args, admin, denied, user)
+            for name in names:
+                if name.endswith('_'):
+                    self.prefixes.setdefault(name, {})[len(args)] = route
+                else:
+                    self.exact[name] = route
+            return handler
+        return decorator
+
+    def resolve(self, data):
+        route = self.exact.get(data)
+        if route is not None:
+            return route, ()
+        index = data.find('_')
+        while index != -1:
+            routes = self.prefixes.get(data[:index + 1])
+            if routes is not None:
+                values = data[index + 1:].split('_')
+                route = routes.get(len(values))
+                if route is None:
+                    return None
+                return route, [parse(value) for parse, value in zip(route.args, values)]
+            index = data.find('_', index + 1)
+        return None
+
+    def dispatch(self, call):
+        resolved = self.resolve(call.data or '')
+        if resolved is None:
+            return False
+        route, args = resolved
+        start = time.perf_counter()
+        try:
+            if route.admin and not self.is_admin(call):
+                self.bot.answer_callback_query(call.id, route.denied, show_alert=True)
+            elif route.user:
+                route.handler(call, self.load_user(call), *args)
+            else:
+                route.handler(call, *args)
+        finally:
+            metrics.ROUTE_SECONDS.observe(time.perf_counter() - start, route.name)
+        return True
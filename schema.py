@@ -0,0 +1,240 @@
+import sys
+import time
+
+import db
+import money
+
+# Текущее время в секундах Unix (как time.time()) для триггеров
+NOW = "(julianday('now') - 2440587.5) * 86400.0"
+
+# Миграции схемы по порядку; номер последней применённой хранится в PRAGMA user_version.
+# Новые изменения схемы добавляются только в конец списка. Элемент миграции — SQL-запрос
+# или функция, которая получает соединение (для переноса данных)
+
+MIGRATIONS = [
+    # 1: исходные таблицы
+    ('''CREATE TABLE IF NOT EXISTS users
+        (id INTEGER PRIMARY KEY, name TEXT, balance REAL, gold INTEGER)''',
+     '''CREATE TABLE IF NOT EXISTS requests
+        (id INTEGER PRIMARY KEY AUTOINCREMENT,
+         user_id INTEGER,
+         request_type TEXT,
+         amount REAL,
+         status TEXT,
+         details TEXT,
+         FOREIGN KEY(user_id) REFERENCES users(id))'''),
+    # 2: индекс для очереди заявок и счётчик пользователей вместо COUNT(*) по всей таблице
+    ("CREATE INDEX IF NOT EXISTS requests_status_type ON requests (status, request_type)",
+     "CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)",
+     "INSERT OR REPLACE INTO counters (name, value) SELECT 'users', COUNT(*) FROM users",
+     '''CREATE TRIGGER IF NOT EXISTS users_count_insert AFTER INSERT ON users
+        BEGIN UPDATE counters SET value = value + 1 WHERE name = 'users'; END''',
+     '''CREATE TRIGGER IF NOT EXISTS users_count_delete AFTER DELETE ON users
+        BEGIN UPDATE counters SET value = value - 1 WHERE name = 'users'; END'''),
+    # 3: шаги диалога (states.py) вместо register_next_step_handler в памяти
+    ('''CREATE TABLE IF NOT EXISTS conversation_state
+        (chat_id INTEGER PRIMARY KEY,
+         step TEXT NOT NULL,
+         args TEXT NOT NULL,
+         expires_at REAL NOT NULL)''',
+     "CREATE INDEX IF NOT EXISTS conversation_state_expires ON conversation_state (expires_at)"),
+    # 4: версия данных админ-панели (admin_view.py) — растёт при изменении пользователей и очереди заявок
+    ("INSERT OR IGNORE INTO counters (name, value) VALUES ('admin_view', 0)",
+     '''CREATE TRIGGER IF NOT EXISTS admin_view_users_insert AFTER INSERT ON users
+        BEGIN UPDATE counters SET value = value + 1 WHERE name = 'admin_view'; END''',
+     '''CREATE TRIGGER IF NOT EXISTS admin_view_users_update AFTER UPDATE OF name, balance, gold ON users
+        BEGIN UPDATE counters SET value = value + 1 WHERE name = 'admin_view'; END''',
+     '''CREATE TRIGGER IF NOT EXISTS admin_view_users_delete AFTER DELETE ON users
+        BEGIN UPDATE counters SET value = value + 1 WHERE name = 'admin_view'; END''',
+     '''CREATE TRIGGER IF NOT EXISTS admin_view_requests_insert AFTER INSERT ON requests
+        WHEN NEW.status = 'pending' AND NEW.request_type IN ('deposit_gold', 'sell_gold')
+        BEGIN UPDATE counters SET value = value + 1 WHERE name = 'admin_view'; END''',
+     '''CREATE TRIGGER IF NOT EXISTS admin_view_requests_update AFTER UPDATE OF status, amount ON requests
+        WHEN 'pending' IN (OLD.status, NEW.status) AND NEW.request_type IN ('deposit_gold', 'sell_gold')
+        BEGIN UPDATE counters SET value = value + 1 WHERE name = 'admin_view'; END''',
+     '''CREATE TRIGGER IF NOT EXISTS admin_view_requests_delete AFTER DELETE ON requests
+        WHEN OLD.status = 'pending' AND OLD.request_type IN ('deposit_gold', 'sell_gold')
+        BEGIN UPDATE counters SET value = value + 1 WHERE name = 'admin_view'; END'''),
+    # 5: деньги в целых копейках и журнал проводок (ledger.py)
+    (lambda conn: money_to_kopecks(conn),),
+    # 6: данные заявки в отдельных столбцах вместо текста details: сумма продажи и выплата в копейках, телефон
+    ("ALTER TABLE requests ADD COLUMN sale_amount INTEGER",
+     "ALTER TABLE requests ADD COLUMN phone TEXT",
+     "ALTER TABLE requests ADD COLUMN payout INTEGER",
+     lambda conn: request_columns_from_details(conn)),
+    # 7: архив скриншотов (archive.py): файлы по sha256 и их привязка к заявкам
+    ('''CREATE TABLE IF NOT EXISTS screenshots
+        (sha256 TEXT PRIMARY KEY, size INTEGER NOT NULL, created_at REAL NOT NULL) WITHOUT ROWID''',
+     '''CREATE TABLE IF NOT EXISTS request_screenshots
+        (request_id INTEGER NOT NULL,
+         sha256 TEXT NOT NULL REFERENCES screenshots(sha256),
+         kind TEXT NOT NULL,
+         file_unique_id TEXT NOT NULL,
+         created_at REAL NOT NULL,
+         PRIMARY KEY (request_id, kind, sha256))''',
+     "CREATE INDEX IF NOT EXISTS request_screenshots_file ON request_screenshots (file_unique_id)"),
+    # 8: время последней смены статуса заявки (просрочка в maintenance.py) и холодная таблица закрытых заявок.
+    # Время ставят триггеры, так что его не нужно передавать в каждом INSERT и UPDATE; у старых заявок —
+    # время миграции
+    ("ALTER TABLE requests ADD COLUMN updated_at REAL",
+     lambda conn: conn.execute("UPDATE requests SET updated_at = ?", (time.time(),)),
+     f'''CREATE TRIGGER IF NOT EXISTS requests_created AFTER INSERT ON requests WHEN NEW.updated_at IS NULL
+        BEGIN UPDATE requests SET updated_at = {NOW} WHERE id = NEW.id; END''',
+     f'''CREATE TRIGGER IF NOT EXISTS requests_status_changed AFTER UPDATE OF status ON requests
+        WHEN NEW.status IS NOT OLD.status
+        BEGIN UPDATE requests SET updated_at = {NOW} WHERE id = NEW.id; END''',
+     "CREATE INDEX IF NOT EXISTS requests_status_updated ON requests (status, updated_at)",
+     '''CREATE TABLE IF NOT EXISTS requests_archive
+        (id INTEGER PRIMARY KEY,
+         user_id INTEGER,
+         request_type TEXT,
+         amount INTEGER,
+         status TEXT,
+         details TEXT,
+         sale_amount INTEGER,
+         phone TEXT,
+         payout INTEGER,
+         updated_at REAL)'''),
+]
+
+# Перенос в копейки: users и requests пересоздаются (тип столбца в SQLite через ALTER не меняется),
+# строки копируются в *_v5 по возрастанию id, затем таблицы подменяются вместе с индексами и триггерами.
+# Большую базу можно перенести заранее при остановленном боте: python schema.py users.db [строк в пачке] —
+# каждая пачка коммитится отдельно, прерванный перенос продолжается с места остановки
+MONEY_TABLES = (
+    '''CREATE TABLE IF NOT EXISTS users_v5
+       (id INTEGER PRIMARY KEY, name TEXT, balance INTEGER NOT NULL DEFAULT 0, gold INTEGER NOT NULL DEFAULT 0)''',
+    '''CREATE TABLE IF NOT EXISTS requests_v5
+       (id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        request_type TEXT,
+        amount INTEGER,
+        status TEXT,
+        details TEXT,
+        FOREIGN KEY(user_id) REFERENCES users(id))''',
+    # Проводки только дописываются: UPDATE и DELETE запрещены триггерами
+    '''CREATE TABLE IF NOT EXISTS postings
+       (id INTEGER PRIMARY KEY,
+        user_id INTEGER NOT NULL,
+        asset TEXT NOT NULL,
+        amount INTEGER NOT NULL,
+        balance INTEGER NOT NULL,
+        kind TEXT NOT NULL,
+        contra TEXT NOT NULL,
+        request_id INTEGER,
+        created_at REAL NOT NULL)''',
+    "CREATE INDEX IF NOT EXISTS postings_user ON postings (user_id, asset, id)",
+    '''CREATE TRIGGER IF NOT EXISTS postings_no_update BEFORE UPDATE ON postings
+       BEGIN SELECT RAISE(ABORT, 'postings are append-only'); END''',
+    '''CREATE TRIGGER IF NOT EXISTS postings_no_delete BEFORE DELETE ON postings
+       BEGIN SELECT RAISE(ABORT, 'postings are append-only'); END''',
+)
+COPY_USERS = '''INSERT INTO users_v5 (id, name, balance, gold)
+                SELECT id, name, CAST(round(coalesce(balance, 0) * 100) AS INTEGER), coalesce(gold, 0) FROM users
+                WHERE id > ? ORDER BY id LIMIT ?'''
+# Остатки перенесённых пользователей становятся первыми проводками журнала
+OPENING = '''INSERT INTO postings (user_id, asset, amount, balance, kind, contra, request_id, created_at)
+             SELECT id, ?1, {0}, {0}, 'opening', 'external', NULL, ?2 FROM users_v5 WHERE id > ?3 AND {0} != 0'''
+COPY_REQUESTS = '''INSERT INTO requests_v5 (id, user_id, request_type, amount, status, details)
+                   SELECT id, user_id, request_type,
+                          CAST(round(amount * CASE request_type WHEN 'withdraw_money' THEN 100 ELSE 1 END) AS INTEGER),
+                          status, details
+                   FROM requests WHERE id > ? ORDER BY id LIMIT ?'''
+MIN_ID = -(1 << 63)
+
+
+def copy_money_rows(conn, limit=-1):
+    # Следующие limit строк users и requests (все при -1) в таблицы *_v5; возвращает число перенесённых строк
+    for statement in MONEY_TABLES:
+        conn.execute(statement)
+    last = conn.execute("SELECT coalesce(max(id), ?) FROM users_v5", (MIN_ID,)).fetchone()[0]
+    copied = conn.execute(COPY_USERS, (last, limit)).rowcount
+    now = time.time()
+    conn.execute(OPENING.format('balance'), ('rub', now, last))
+    conn.execute(OPENING.format('gold'), ('gold', now, last))
+    last = conn.execute("SELECT coalesce(max(id), ?) FROM requests_v5", (MIN_ID,)).fetchone()[0]
+    return copied + conn.execute(COPY_REQUESTS, (last, limit)).rowcount
+
+
+def money_to_kopecks(conn):
+    copy_money_rows(conn)
+    # Индексы и триггеры удаляются вместе со старыми таблицами, их SQL берётся из sqlite_master
+    dependents = [row[0] for row in conn.execute(
+        "SELECT sql FROM sqlite_master WHERE tbl_name IN ('users', 'requests') AND type IN ('index', 'trigger') "
+        "AND sql IS NOT NULL").fetchall()]
+    for table in ('users', 'requests'):
+        conn.execute(f"DROP TABLE {table}")
+        conn.execute(f"ALTER TABLE {table}_v5 RENAME TO {table}")
+    for statement in dependents:
+        conn.execute(statement)
+    # Незавершённые шаги диалога хранят суммы продажи в рублях, после переноса их проще начать заново
+    conn.execute("DELETE FROM conversation_state WHERE step IN "
+                 "('handle_skin_sale', 'handle_skin_screenshot', 'handle_buyer_screenshot')")
+    conn.execute("UPDATE counters SET value = value + 1 WHERE name = 'admin_view'")
+
+
+def request_columns_from_details(conn, batch=1000):
+    # Значение после последнего «:» в details старых заявок: «Сумма продажи: 80.00», «Сумма: 125.52»,
+    # «Номер телефона: +7...». Нераспознанные суммы остаются NULL
+    columns = {'sell_gold': 'sale_amount', 'withdraw_gold': 'payout', 'withdraw_money': 'phone'}
+    last = MIN_ID
+    while True:
+        rows = conn.execute("SELECT id, request_type, details FROM requests WHERE id > ? "
+                            "AND request_type IN ('sell_gold', 'withdraw_gold', 'withdraw_money') "
+                            "AND instr(details, ':') > 0 ORDER BY id LIMIT ?", (last, batch)).fetchall()
+        if not rows:
+            return
+        last = rows[-1][0]
+        updates = {column: [] for column in columns.values()}
+        for request_id, request_type, details in rows:
+            value = details.rsplit(':', 1)[1].strip()
+            if request_type != 'withdraw_money':
+                try:
+                    value = money.kopecks(value)
+                except ValueError:
+                    continue
+            updates[columns[request_type]].append((value, request_id))
+        for column, params in updates.items():
+            conn.executemany(f"UPDATE requests SET {column} = ? WHERE id = ?", params)
+
+
+def migrate(target=None):
+    # Обычно схема уже текущей версии: хватает чтения user_version без блокировки записи
+    if db.fetchone("PRAGMA user_version")[0] >= (len(MIGRATIONS) if target is None else target):
+        return
+    with db.transaction() as conn:
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for number, statements in enumerate(MIGRATIONS[version:target], start=version + 1):
+            for statement in statements:
+                if callable(statement):
+                    statement(conn)
+                else:
+                    conn.execute(statement)
+            conn.execute(f"PRAGMA user_version = {number}")
+        if version < len(MIGRATIONS):
+            conn.execute("ANALYZE")
+
+
+def main():
+    # Перенос денег в копейки пачками до запуска бота, остальное доделывает migrate()
+    import ledger
+
+    db.DB_PATH = sys.argv[1] if len(sys.argv) > 1 else db.DB_PATH
+    batch = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+    migrate(target=4)
+    if db.fetchone("PRAGMA user_version")[0] == 4:
+        total = 0
+        while True:
+            with db.transaction() as conn:
+                copied = copy_money_rows(conn, batch)
+            if not copied:
+                break
+            total += copied
+            print(f"перенесено строк: {total}", flush=True)
+    migrate()
+    print(f"версия схемы: {db.fetchone('PRAGMA user_version')[0]}, "
+          f"расхождений остатков с проводками: {len(ledger.verify())}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+import json
+import time
+
+import db
+
+# Следующий шаг диалога хранится в таблице conversation_state, а не в замыканиях в памяти:
+# шаг переживает перезапуск, его может продолжить любой процесс, а брошенные диалоги
+# удаляются по истечении TTL (задача steps в maintenance.py). Шаг — это имя функции из STEPS
+# и JSON со значениями аргументов
+
+TTL = 60 * 60
+SWEEP_INTERVAL = 5 * 60
+
+STEPS = {}
+
+
+def step(func):
+    STEPS[func.__name__] = func
+    return func
+
+
+def set_step(chat_id, handler, *args, ttl=None):
+    db.execute("INSERT OR REPLACE INTO conversation_state (chat_id, step, args, expires_at) VALUES (?, ?, ?, ?)",
+               (chat_id, handler.__name__, json.dumps(args), time.time() + (ttl or TTL)))
+
+
+def pop_step(chat_id, steps=STEPS):
+    # steps — реестр, в котором ищется функция шага (у async_main.py свой, имена шагов те же, что в main.py)
+    rows = db.fetchall("DELETE FROM conversation_state WHERE chat_id = ? RETURNING step, args, expires_at", (chat_id,))
+    if not rows or rows[0][2] <= time.time():
+        return None
+    name, args, _ = rows[0]
+    return steps[name], json.loads(args)
+
+
+def clear(chat_id):
+    db.execute("DELETE FROM conversation_state WHERE chat_id = ?", (chat_id,))
+
+
+def backlog():
+    return db.fetchone("SELECT COUNT(*) FROM conversation_state")[0]
+
+
+def sweep():
+    return db.execute("DELETE FROM conversation_state WHERE expires_at <= ?", (time.time(),)).rowcount
+
@@ -0,0 +1,130 @@
+import json
+import keyword
+import os
+import string
+import threading
+
+from telebot.types import InlineKeyboardButton, InlineKeyboardMarkup, JsonSerializable
+
+# Тексты сообщений и надписи кнопок лежат в locales/<язык>.json (texts и buttons: ключ -> шаблон)
+# и загружаются один раз на процесс, при первом обращении к языку. Шаблон разбирается при загрузке:
+# без подстановок он отдаётся готовой строкой, с подстановками ({amount}, {name:>5}) компилируется в функцию
+# с f-строкой — рендер стоит столько же, сколько f-строка в коде, без разбора шаблона на каждый вызов.
+# Постоянные клавиатуры (меню, профиль, «В главное меню») описываются один раз через keyboard()
+# и для каждого языка собираются и сериализуются в JSON один раз: telebot при отправке берёт готовую строку.
+# Язык выбирается по language_code пользователя Telegram, если для него есть файл, иначе DEFAULT_LOCALE;
+# ключи, которых нет в файле языка, берутся из DEFAULT_LOCALE
+
+LOCALES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'locales')
+DEFAULT_LOCALE = 'ru'
+
+KEYBOARDS = {}  # имя -> строки ключей кнопок
+
+_locales = {}  # language_code (и имя файла) -> Locale
+_available = None
+_lock = threading.RLock()
+
+
+def keyboard(name, *rows):
+    # Регистрирует постоянную клавиатуру; ключ кнопки в строке — он же её callback_data
+    KEYBOARDS[name] = rows
+
+
+def compile_template(template):
+    # Строка, если подстановок нет, иначе функция от именованных значений (лишние игнорируются, как в str.format).
+    # Подстановки сложнее имени ({user.name}, {0}, вложенные в формат) остаются на str.format
+    parts, names = [], []
+    for literal, field, spec, conversion in string.Formatter().parse(template):
+        if literal:
+            parts.append(repr(literal))
+        if field is None:
+            continue
+        if not field.isidentifier() or keyword.iskeyword(field) or '{' in spec:
+            return template.format
+        if field not in names:
+            names.append(field)
+        parts.append('f' + repr('{' + field + ('!' + conversion if conversion else '') + (':' + spec if spec else '') + '}'))
+    if not names:
+        return ''.join(literal for literal, _, _, _ in string.Formatter().parse(template))
+    try:
+        return eval(f"lambda *, {', '.join(names)}, **_: {' '.join(parts)}", {})
+    except SyntaxError:
+        return template.format
+
+
+class Keyboard(JsonSerializable):
+    # Клавиатура, сериализованная заранее; подходит везде, где telebot принимает reply_markup
+    def __init__(self, markup):
+        self.markup = markup
+        self.json = markup.to_json()
+
+    def to_json(self):
+        return self.json
+
+
+class Locale:
+    def __init__(self, name, data, fallback=None):
+        self.name = name
+        self.texts = dict(fallback.texts) if fallback else {}
+        self.labels = dict(fallback.labels) if fallback else {}
+        self.texts.update((key, compile_template(template)) for key, template in data.get('texts', {}).items())
+        self.labels.update((key, compile_template(template)) for key, template in data.get('buttons', {}).items())
+        self.buttons = {}
+        self.keyboards = {}
+
+    def text(self, key, **values):
+        template = self.texts[key]
+        return template if isinstance(template, str) else template(**values)
+
+    def template(self, key):
+        # Скомпилированный шаблон текста: в циклах его достают один раз и вызывают напрямую
+        return self.texts[key]
+
+    def label(self, key, **values):
+        template = self.labels[key]
+        return template if isinstance(template, str) else template(**values)
+
+    def button(self, key, callback_data=None, **values):
+        # Постоянная кнопка (callback_data = key, без подстановок) создаётся один раз,
+        # кнопка с данными заявки — на каждый вызов
+        if values:
+            return InlineKeyboardButton(self.labels[key](**values), callback_data=callback_data or key)
+        if callback_data is not None:
+            return InlineKeyboardButton(self.labels[key], callback_data=callback_data)
+        button = self.buttons.get(key)
+        if button is None:
+            button = self.buttons[key] = InlineKeyboardButton(self.label(key), callback_data=key)
+        return button
+
+    def keyboard(self, name):
+        markup = self.keyboards.get(name)
+        if markup is None:
+            built = InlineKeyboardMarkup()
+            for row in KEYBOARDS[name]:
+                built.row(*(self.button(key) for key in row))
+            markup = self.keyboards[name] = Keyboard(built)
+        return markup
+
+
+def locale(code=None):
+    # Locale для language_code пользователя; после первого обращения — один поиск в словаре
+    found = _locales.get(code)
+    if found is None:
+        with _lock:
+            found = _locales[code] = _load(code)
+    return found
+
+
+def _load(code):
+    global _available
+    if _available is None:
+        _available = {name[:-5] for name in os.listdir(LOCALES_DIR) if name.endswith('.json')}
+    name = (code or '').split('-')[0].lower()
+    if name not in _available:
+        name = DEFAULT_LOCALE
+    found = _locales.get('file:' + name)
+    if found is None:
+        with open(os.path.join(LOCALES_DIR, name + '.json'), encoding='utf-8') as f:
+            data = json.load(f)
+        found = _locales['file:' + name] = Locale(name, data, None if name == DEFAULT_LOCALE else locale())
+    return found
@@ -0,0 +1,84 @@
+import threading
+import time
+from collections import OrderedDict, deque
+
+import dispatch
+import metrics
+
+# Отсев апдейтов до обработки и до любого обращения к базе: filter() вызывается там, где апдейты получены
+# (dispatch.attach, webhook, ведущий процесс cluster.py), раньше записи пачки в базу. Отбрасываются:
+#   duplicate     — повторная доставка той же кнопки (тот же id callback_query);
+#   callback_rate — повторные нажатия одной и той же кнопки одним пользователем чаще лимита;
+#   user_rate     — апдейты от пользователя вообще чаще лимита (админ не ограничивается).
+# Окна скользящие: по каждому ключу хранятся времена последних апдейтов, не больше лимита штук.
+# Всё в памяти процесса, который получает апдейты, поэтому в cluster.py учёт общий для всех процессов.
+# Отброшенные считаются в metrics.UPDATES_DROPPED по причинам, все полученные — в metrics.UPDATES_RECEIVED
+
+SEEN_SIZE = 10000  # Сколько последних id callback_query помнить
+PRUNE_INTERVAL = 60
+
+
+class SlidingWindow:
+    def __init__(self, limit, window):
+        self.limit = limit
+        self.window = window
+        self.hits = {}  # ключ -> времена последних апдейтов (deque длиной не больше limit)
+        self.last_prune = time.monotonic()
+
+    def allow(self, key, now):
+        hits = self.hits.get(key)
+        if hits is None:
+            hits = self.hits[key] = deque(maxlen=self.limit)
+        elif len(hits) == self.limit and now - hits[0] < self.window:
+            return False
+        hits.append(now)
+        if now - self.last_prune > PRUNE_INTERVAL:
+            self._prune(now)
+        return True
+
+    def _prune(self, now):
+        # Ключи, у которых окно уже пусто, ничем не отличаются от новых
+        self.last_prune = now
+        for key in [key for key, hits in self.hits.items() if now - hits[-1] >= self.window]:
+            del self.hits[key]
+
+
+class Throttle:
+    # user_limit и callback_limit — (апдейтов, за сколько секунд); None отключает ограничение
+    def __init__(self, user_limit=(20, 10), callback_limit=(1, 1), exempt=()):
+        self.users = SlidingWindow(*user_limit) if user_limit else None
+        self.callbacks = SlidingWindow(*callback_limit) if callback_limit else None
+        self.exempt = set(exempt)
+        self.seen = OrderedDict()  # id недавних callback_query
+        self.lock = threading.Lock()
+
+    def check(self, update, now):
+        # Причина, по которой апдейт отбрасывается, или None; вызывается под self.lock
+        call = update.callback_query
+        if call is not None:
+            if call.id in self.seen:
+                return 'duplicate'
+            self.seen[call.id] = None
+            if len(self.seen) > SEEN_SIZE:
+                self.seen.popitem(last=False)
+        user = dispatch.update_sender(update)
+        if user is None:
+            return None
+        if call is not None and self.callbacks is not None and not self.callbacks.allow((user.id, call.data), now):
+            return 'callback_rate'
+        if self.users is not None and user.id not in self.exempt and not self.users.allow(user.id, now):
+            return 'user_rate'
+        return None
+
+    def filter(self, updates):
+        now = time.monotonic()
+        kept = []
+        with self.lock:
+            for update in updates:
+                reason = self.check(update, now)
+                if reason is None:
+                    kept.append(update)
+                else:
+                    metrics.UPDATES_DROPPED.inc(reason)
+        metrics.UPDATES_RECEIVED.inc(amount=len(updates))
+        return kept
@@ -0,0 +1,76 @@
+import threading
+from collections import OrderedDict
+
+import db
+
+# Кеш строк users в памяти процесса (LRU на CACHE_SIZE записей). Чтение идёт через кеш, а все изменения
+# баланса и голды в этом процессе (update_user, ledger) сбрасывают запись пользователя после записи в базу.
+# При нескольких процессах (cluster.py) сброс через on_invalidate пересылается процессу, который обслуживает
+# пользователя и держит его запись в кеше
+
+CACHE_SIZE = 10000
+
+
+class User:
+    __slots__ = ('id', 'name', 'balance', 'gold')
+
+    def __init__(self, id, name, balance, gold):
+        self.id = id
+        self.name = name
+        self.balance = balance
+        self.gold = gold
+
+
+_cache = OrderedDict()
+_lock = threading.Lock()
+_generation = 0  # растёт при каждом сбросе: прочитанное до сброса в кеш не попадает
+hits = 0
+misses = 0
+on_invalidate = None  # on_invalidate(user_id) после каждого сброса
+
+
+def get(user_id, name=None):
+    # Пользователь из кеша или базы; если его нет и передан ник — регистрирует
+    global hits, misses
+    with _lock:
+        user = _cache.get(user_id)
+        if user is not None:
+            _cache.move_to_end(user_id)
+            hits += 1
+            return user
+        misses += 1
+        generation = _generation
+    row = db.fetchone("SELECT id, name, balance, gold FROM users WHERE id = ?", (user_id,))
+    if row is None:
+        if name is None:
+            return None
+        db.execute("INSERT OR IGNORE INTO users (id, name, balance, gold) VALUES (?, ?, 0, 0)", (user_id, name))
+        row = (user_id, name, 0, 0)
+    user = User(*row)
+    with _lock:
+        if generation == _generation:
+            _cache[user_id] = user
+            if len(_cache) > CACHE_SIZE:
+                _cache.popitem(last=False)
+    return user
+
+
+def invalidate(user_id):
+    global _generation
+    with _lock:
+        _generation += 1
+        _cache.pop(user_id, None)
+    if on_invalidate is not None:
+        on_invalidate(user_id)
+
+
+def clear():
+    global _generation
+    with _lock:
+        _generation += 1
+        _cache.clear()
+
+
+def hit_ratio():
+    total = hits + misses
+    return hits / total if total else 0.0
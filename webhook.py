@@ -0,0 +1,112 @@
+import json
+import logging
+import queue
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from telebot import types
+
+import dispatch
+
+logger = logging.getLogger(__name__)
+
+# Приём апдейтов через вебхук: HTTP-сервер только разбирает JSON и кладёт апдейт во внутреннюю очередь,
+# ответ Telegram уходит сразу, не дожидаясь обработки. Отдельный поток забирает из очереди всё, что
+# пришло вместе, делает общую для пачки запись в базу (on_batch) и раздаёт апдейты пулу обработчиков
+
+
+class UpdateQueue:
+    def __init__(self, pool, on_batch=None, batch_size=100, throttle=None):
+        self.pool = pool
+        self.on_batch = on_batch
+        self.throttle = throttle
+        self.batch_size = batch_size
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def put(self, update):
+        self.queue.put(update)
+
+    def _take(self):
+        batch = [self.queue.get()]
+        while len(batch) < self.batch_size and batch[-1] is not None:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._take()
+            updates = [update for update in batch if update is not None]
+            stopping = len(updates) < len(batch)
+            if self.throttle is not None:
+                updates = self.throttle.filter(updates)
+            if updates and self.on_batch is not None:
+                try:
+                    self.on_batch(updates)
+                except Exception:
+                    logger.exception("Ошибка при записи пачки апдейтов")
+            for update in updates:
+                self.pool.put(dispatch.update_user_id(update), update)
+            if stopping:
+                return
+
+    def stop(self):
+        self.queue.put(None)
+        self.thread.join()
+
+
+class WebhookServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, address, on_update, path='/webhook', secret_token=None):
+        self.on_update = on_update
+        self.webhook_path = path
+        self.secret_token = secret_token
+        super().__init__(address, WebhookHandler)
+
+
+class WebhookHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status):
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_POST(self):
+        server = self.server
+        if self.path != server.webhook_path:
+            self._reply(404)
+            return
+        if server.secret_token and self.headers.get('X-Telegram-Bot-Api-Secret-Token') != server.secret_token:
+            self._reply(403)
+            return
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            update = types.Update.de_json(json.loads(self.rfile.read(length)))
+        except ValueError:
+            self._reply(400)
+            return
+        server.on_update(update)
+        self._reply(200)
+
+
+def serve(bot, host, port, path='/webhook', secret_token=None, num_workers=4, on_batch=None, batch_size=100,
+          throttle=None):
+    pool = dispatch.KeyedWorkerPool(lambda update: type(bot).process_new_updates(bot, [update]), num_workers)
+    updates = UpdateQueue(pool, on_batch, batch_size, throttle)
+    server = WebhookServer((host, port), updates.put, path, secret_token)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        updates.stop()
+        pool.stop()